@@ -1,154 +1,264 @@
 # get_single_report_detailed.py
+import argparse
+import os
 import requests
+import http_client
 import pandas
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, time, timedelta
 from configs import BASE_URL, ACCESS_TOKEN
-from configs import PLANNED_START_TIME, PLANNED_END_TIME, PLANNED_WORK_DURATION_MINUTES, LUNCH_BREAK_MINUTES
+from configs import LUNCH_BREAK_MINUTES
+from configs import TRANSACTION_FETCH_MODE, RUN_PROFILE_FILE
+from instrumentation import PROFILE
+from metrics import compute_metrics
+from render import render_workbook
+from transactions import fetch_transactions_range, group_transactions_by_day, summarize_day
+from roster import load_roster
+from transaction_store import TransactionStore
 
-def get_user_input():
-    """Gets and validates user input for PIN, start date, and end date."""
-    while True:
-        try:
-            # pin_id = int(input("Enter the worker's PIN: "))
-            pin_id = 392
-            break
-        except ValueError:
-            print("Invalid input. Please enter a number for the PIN.")
+def fetch_day_summaries_daily(pin_id, start_date_str, end_date_str):
+    """Fetches the transactions one day at a time and returns {date_str: day summary}."""
+    day_summaries = {}
+    for day in pandas.date_range(start=start_date_str, end=end_date_str):
+        current_day_str = day.strftime('%Y-%m-%d')
+        next_day_str = (day + timedelta(days=1)).strftime('%Y-%m-%d')
+        print(f"Processing {current_day_str}...")
 
-    while True:
         try:
-            # start_date_str = input("Enter the start date (YYYY-MM-DD): ")
-            start_date_str = '2025-08-01'
-            datetime.strptime(start_date_str, '%Y-%m-%d')
-            break
-        except ValueError:
-            print("Invalid date format. Please use YYYY-MM-DD.")
+            # For each day, fetch ALL transactions using the corrected date logic
+            trans_url = (
+                f"{BASE_URL}/api/v2/transaction/person/{pin_id}?"
+                f"startDate={current_day_str}&endDate={next_day_str}&pageNo=1&pageSize=100&access_token={ACCESS_TOKEN}"
+            )
+            response = http_client.get(trans_url)
+            response.raise_for_status()
 
-    while True:
-        try:
-            # end_date_str = input("Enter the end date (YYYY-MM-DD): ")
-            end_date_str = '2025-08-28'
-            datetime.strptime(end_date_str, '%Y-%m-%d')
-            break
-        except ValueError:
-            print("Invalid date format. Please use YYYY-MM-DD.")
-            
-    return pin_id, start_date_str, end_date_str
+            trans_data = response.json().get('data', {})
+            if trans_data not in [None, {}, []]:
+                all_day_trans = trans_data.get('data', [])
+                if all_day_trans:
+                    day_summaries[current_day_str] = summarize_day(all_day_trans, trans_data.get('total', 0))
+        except requests.RequestException as e:
+            print(f"  -> An error occurred while fetching data for this day: {e}")
+        except (ValueError, KeyError) as e:
+            print(f"  -> Could not parse data for this day. Error: {e}")
+    return day_summaries
 
-def generate_report(pin_id, start_date_str, end_date_str):
-    """Fetches data day-by-day and generates the attendance report."""
-    report_data = []
-    user_info = {}
 
-    # 1. Get User's Name and Department
+def fetch_user_info(pin_id):
+    """Returns the employee's name and department, or None if it could not be fetched."""
     try:
         user_info_url = f"{BASE_URL}/api/person/get/{pin_id}?access_token={ACCESS_TOKEN}"
-        response = requests.get(user_info_url, timeout=10)
+        response = http_client.get(user_info_url)
         response.raise_for_status()
         user_data = response.json().get('data')
         if user_data:
-            user_info['name'] = user_data.get('name', '')
-            user_info['lastName'] = user_data.get('lastName', '')
-            user_info['deptName'] = user_data.get('deptName', 'N/A')
-        else:
-            print(f"Could not find user with PIN #{pin_id}. Exiting.")
-            return None, None
+            return {
+                'name': user_data.get('name', ''),
+                'lastName': user_data.get('lastName', ''),
+                'deptName': user_data.get('deptName', 'N/A'),
+            }
+        print(f"Could not find user with PIN #{pin_id}. Exiting.")
     except requests.RequestException as e:
         print(f"Error fetching user info for PIN #{pin_id}: {e}")
+    return None
+
+
+def generate_report(pin_id, start_date_str, end_date_str, store=None, user_info=None, entrance_count=False):
+    """Fetches the employee's transactions and generates the attendance report.
+
+    With a TransactionStore the transactions are read from the local store instead.
+    When `user_info` is already known (from the roster) the person lookup is skipped.
+    With `entrance_count` the day's total number of transactions (Number_of_entrance)
+    replaces the EntryIN/EntryOut counts.
+    """
+    report_data = []
+
+    # 1. Get User's Name and Department
+    user_info = user_info or fetch_user_info(pin_id)
+    if not user_info:
         return None, None
 
     print(f"Fetching data for: {user_info.get('name')} {user_info.get('lastName')}")
 
-    # 2. Create a date range to iterate through each day
-    date_range = pandas.date_range(start=start_date_str, end=end_date_str)
+    # 2. Collect the per-day figures from the store, one range query or day by day
+    if store is not None:
+        day_summaries = store.day_summaries(pin_id, start_date_str, end_date_str)
+    elif TRANSACTION_FETCH_MODE == "range":
+        try:
+            transactions = fetch_transactions_range(pin_id, start_date_str, end_date_str)
+        except requests.RequestException as e:
+            print(f"Error fetching transactions for PIN #{pin_id}: {e}")
+            return None, None
+        day_summaries = group_transactions_by_day(transactions, start_date_str, end_date_str)
+    else:
+        day_summaries = fetch_day_summaries_daily(pin_id, start_date_str, end_date_str)
 
-    for day in date_range:
-        current_day_str = day.strftime('%Y-%m-%d')
-        next_day_str = (day + timedelta(days=1)).strftime('%Y-%m-%d')
-        print(f"Processing {current_day_str}...")
+    # 3. Compute the metrics for every day with records at once
+    absent_days = len(pandas.date_range(start=start_date_str, end=end_date_str)) - len(day_summaries)
+    if absent_days:
+        print(f"  -> {absent_days} day(s) without records (Absent).")
+    if not day_summaries:
+        return report_data, user_info
 
-        try:
-            # 3. For each day, fetch ALL transactions using the corrected date logic
-            trans_url = (
-                f"{BASE_URL}/api/v2/transaction/person/{pin_id}?"
-                f"startDate={current_day_str}&endDate={next_day_str}&pageNo=1&pageSize=100&access_token={ACCESS_TOKEN}"
-            )
-            response = requests.get(trans_url, timeout=10)
-            response.raise_for_status()
-            
-            trans_data = response.json().get('data', {})
-            if trans_data not in [None, {}, []]:
-                all_day_trans = trans_data.get('data', [])
-                transaction_count = trans_data.get('total', 0)
-                
-                # --- Calculate EntryIN and EntryOut ---
-                entry_in_count = 0
-                entry_out_count = 0
-                for trans in all_day_trans:
-                    # Using .get() is safer in case the 'devName' key is missing
-                    device_name = trans.get('devName', '')
-                    print(device_name)
-                    if "Турникет-Вход" in device_name or "Enter tur" in device_name:
-                        entry_in_count += 1
-                    elif "Турникет-Выход" in device_name or "Exit tur" in device_name:
-                        entry_out_count += 1
-                
-                event_times = [t['eventTime'] for t in all_day_trans]
-                
-                first_in_str = min(event_times)
-                last_out_str = max(event_times)
-                
-                first_in_dt = datetime.strptime(first_in_str, '%Y-%m-%d %H:%M:%S')
-                last_out_dt = datetime.strptime(last_out_str, '%Y-%m-%d %H:%M:%S')
-                
-                planned_start_dt = datetime.combine(day.date(), PLANNED_START_TIME)
-                planned_end_dt = datetime.combine(day.date(), PLANNED_END_TIME)
-                
-                lateness_delta = max(first_in_dt - planned_start_dt, timedelta(0))
-                lateness_minutes = int(lateness_delta.total_seconds() / 60)
-                
-                overwork_delta = max(last_out_dt - planned_end_dt, timedelta(0))
-                overwork_minutes = int(overwork_delta.total_seconds() / 60)
-
-                report_data.append({
-                    "Date": current_day_str,
-                    "First_in": first_in_dt.strftime('%H:%M:%S'),
-                    "Last_out": last_out_dt.strftime('%H:%M:%S'),
-                    "EntryIN": entry_in_count,
-                    "EntryOut": entry_out_count,
-                    "otdel": user_info.get('deptName', 'N/A'),
-                    "day_of_the_week": day.strftime('%A'),
-                    "supposed_time(min)": PLANNED_WORK_DURATION_MINUTES,
-                    "late_for_work(min)": lateness_minutes,
-                    "overwork(min)": overwork_minutes
-                })
-            else:
-                print(f"  -> No records found (Absent).")
+    metrics = compute_metrics(pandas.DataFrame([
+        {
+            "ID": pin_id,
+            "Department": user_info.get('deptName', 'N/A'),
+            "Date": date_str,
+            "firstInTime": summary['first_in'],
+            "lastOutTime": summary['last_out'],
+            "EntryIN": summary['entry_in'],
+            "EntryOut": summary['entry_out'],
+            "Number_of_entrance": summary['total'],
+        }
+        for date_str, summary in sorted(day_summaries.items())
+    ]))
+    metrics = metrics[metrics['status'] == 'complete']
 
-        except requests.RequestException as e:
-            print(f"  -> An error occurred while fetching data for this day: {e}")
-        except (ValueError, KeyError) as e:
-            print(f"  -> Could not parse data for this day. Error: {e}")
+    report_df = pandas.DataFrame({
+        "Date": metrics['Date'],
+        "First_in": metrics['first_in'].dt.strftime('%H:%M:%S'),
+        "Last_out": metrics['last_out'].dt.strftime('%H:%M:%S'),
+        "EntryIN": metrics['EntryIN'],
+        "EntryOut": metrics['EntryOut'],
+        "otdel": user_info.get('deptName', 'N/A'),
+        "day_of_the_week": metrics['date'].dt.day_name(),
+        "supposed_time(min)": metrics['planned_minutes'],
+        "late_for_work(min)": (metrics['late'].dt.total_seconds() // 60).astype(int),
+        "overwork(min)": (metrics['overwork'].dt.total_seconds() // 60).astype(int),
+    })
+    if entrance_count:
+        report_df = report_df.drop(columns=["EntryIN", "EntryOut"])
+        report_df.insert(3, "Number_of_entrance", metrics['Number_of_entrance'])
+    report_data = report_df.to_dict('records')
 
     return report_data, user_info
 
 
-def main():
-    pin_id, start_date, end_date = get_user_input()
-    
-    report_data, user_info = generate_report(pin_id, start_date, end_date)
+def save_report(report_data, user_info, pin_id, start_date, end_date, output_dir='.'):
+    """Writes one employee's report as Report_<name>_<start>_to_<end>.xlsx and returns the path."""
+    report_df = pandas.DataFrame(report_data)
+
+    user_name = f"{user_info.get('name', 'user')}_{user_info.get('lastName', pin_id)}".strip('_')
+    output_filename = os.path.join(output_dir, f"Report_{user_name}_{start_date}_to_{end_date}.xlsx")
+
+    with PROFILE.stage('write'):
+        render_workbook({"Report": report_df}, output_filename)
+    return output_filename
+
+
+def _batch_worker(person, start_date, end_date, output_dir, from_store, entrance_count=False):
+    """Generates and saves one employee's report inside a worker process.
+
+    Returns (pin, output filename or None, the worker's run profile snapshot for this report).
+    """
+    PROFILE.reset()
+    pin_id = person['pin']
+    known_info = person if 'name' in person else None
+    if from_store:
+        with TransactionStore() as store:
+            report_data, user_info = generate_report(pin_id, start_date, end_date, store=store, user_info=known_info,
+                                                     entrance_count=entrance_count)
+    else:
+        report_data, user_info = generate_report(pin_id, start_date, end_date, user_info=known_info,
+                                                 entrance_count=entrance_count)
+    output_filename = None
+    if report_data:
+        output_filename = save_report(report_data, user_info, pin_id, start_date, end_date, output_dir)
+    return pin_id, output_filename, PROFILE.snapshot()
+
+
+def run_batch(people, start_date, end_date, output_dir='.', workers=None, from_store=False, entrance_count=False):
+    """Generates the reports of many employees in parallel worker processes.
+
+    `people` are roster entries (or dicts with at least a 'pin'). Each worker fetches
+    its employee's whole window with range queries and writes the file itself.
+    Returns {pin: output filename or None if no data}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_batch_worker, person, start_date, end_date, output_dir, from_store, entrance_count): person['pin']
+            for person in people
+        }
+        for future in as_completed(futures):
+            pin_id = futures[future]
+            try:
+                _, output_filename, profile = future.result()
+                PROFILE.merge(profile)
+            except Exception as e:
+                print(f"Report for PIN #{pin_id} failed: {e}")
+                output_filename = None
+            results[pin_id] = output_filename
+    return results
+
+
+def write_profile(path):
+    PROFILE.write(path)
+    print(PROFILE.summary())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generates the detailed attendance report for one or more employees.")
+    parser.add_argument("--from-store", action="store_true",
+                        help="Read the transactions from the local store (see transaction_store.py sync)")
+    parser.add_argument("--pin", action="append", dest="pins", help="Employee PIN (repeatable for a batch run)")
+    parser.add_argument("--dept", action="append", dest="dept_codes", help="Department code for a batch run (repeatable)")
+    parser.add_argument("--start", required=True, help="Start date (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, help="End date (YYYY-MM-DD)")
+    parser.add_argument("--entrance-count", action="store_true",
+                        help="Report the day's total number of transactions instead of the IN/OUT counts")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output-dir", default=".", help="Folder for the reports")
+    parser.add_argument("--profile", default=RUN_PROFILE_FILE,
+                        help="Where to write the run profile JSON (a CSV table is written next to it)")
+    args = parser.parse_args(argv)
+
+    if not (args.pins or args.dept_codes):
+        parser.error("give the employee with --pin (or --dept for a batch run)")
+    for value in (args.start, args.end):
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            parser.error(f"invalid date '{value}', use YYYY-MM-DD")
+    if args.start > args.end:
+        parser.error("--start must not be after --end")
+
+    if len(args.pins or []) > 1 or args.dept_codes:
+        if args.pins:
+            people = [{'pin': pin} for pin in args.pins]
+        else:
+            people = load_roster(args.dept_codes)
+        results = run_batch(people, args.start, args.end, args.output_dir, args.workers, args.from_store,
+                            args.entrance_count)
+        saved = [path for path in results.values() if path]
+        print(f"\nSaved {len(saved)} of {len(people)} reports to {args.output_dir}")
+        write_profile(args.profile)
+        return
+
+    pin_id, start_date, end_date = args.pins[0], args.start, args.end
+
+    if args.from_store:
+        with TransactionStore() as store:
+            report_data, user_info = generate_report(pin_id, start_date, end_date, store=store,
+                                                     entrance_count=args.entrance_count)
+    else:
+        report_data, user_info = generate_report(pin_id, start_date, end_date, entrance_count=args.entrance_count)
 
     if report_data:
         print(f"\nSuccessfully generated {len(report_data)} records.")
-        report_df = pandas.DataFrame(report_data)
-        
-        user_name = f"{user_info.get('name', 'user')}_{user_info.get('lastName', pin_id)}".strip('_')
-        output_filename = f"Report_{user_name}_{start_date}_to_{end_date}.xlsx"
-        
-        report_df.to_excel(output_filename, index=False)
+        os.makedirs(args.output_dir, exist_ok=True)
+        output_filename = save_report(report_data, user_info, pin_id, start_date, end_date, args.output_dir)
         print(f"Report successfully saved as: {output_filename}")
     else:
         print("No data was generated for the report.")
 
+    cache = http_client.shared_cache()
+    if cache is not None:
+        print(cache.summary())
+    write_profile(args.profile)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
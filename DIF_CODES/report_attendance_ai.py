@@ -1,157 +1,106 @@
+import argparse
+import asyncio
 import requests
 import pandas
-from datetime import datetime, time, timedelta
+from datetime import date, timedelta
+from configs import NUMBER_OF_DAYS
+from fetch_engine import AsyncFetcher
+from metrics import compute_metrics, format_timedelta
+from pairing import pair_punches, split_at_midnight
+from punches import PunchBatch, fetch_punches_range_async
+from roster import load_roster
 
-# --- Configuration ---
-BASE_URL = "http://192.168.7.39:8098"
-ACCESS_TOKEN = "4ECD44C895F358C5DB39BC69C29B1006"
-NUMBER_OF_DAYS = 30  # How many recent days of data to fetch per worker
-MAX_WORKERS = 505    # The script will check for workers from PIN 1 up to this number
 
-# --- Schedule Configuration ---
-PLANNED_START_TIME = time(8, 30)
-PLANNED_END_TIME = time(18, 30)
-PLANNED_WORK_DURATION_MINUTES = 540
+async def fetch_all_punches(people, start_date_str, end_date_str):
+    """Fetches the full, paginated punch history of every employee in the window as one PunchBatch."""
+    async def fetch(person):
+        try:
+            return await fetch_punches_range_async(fetcher, person['pin'], start_date_str, end_date_str)
+        except requests.RequestException as e:
+            print(f"Could not fetch transactions for PIN #{person['pin']}. Error: {e}")
+        except ValueError as e:
+            print(f"Could not parse the transactions of PIN #{person['pin']}. Error: {e}")
+        return PunchBatch.empty()
 
-# --- Main Script ---
-all_records = []
+    async with AsyncFetcher() as fetcher:
+        return PunchBatch.concat(await asyncio.gather(*(fetch(person) for person in people)))
 
-print("Starting to fetch attendance data...")
 
-for pin_id in range(1, MAX_WORKERS):
-    user_info = {}
-    # 1. Get the employee's basic information
-    try:
-        user_info_url = f"{BASE_URL}/api/person/get/{pin_id}?access_token={ACCESS_TOKEN}"
-        response = requests.get(user_info_url, timeout=10)
-        if response.status_code == 200:
-            user_data = response.json().get('data', {})
-            if user_data:
-                user_info['name'] = user_data.get('name', '')
-                user_info['lastName'] = user_data.get('lastName', '')
-                user_info['deptName'] = user_data.get('deptName', 'N/A')
-            else:
-                print(f"PIN #{pin_id} exists but returned no data. Skipping.")
-                continue
-        else:
-            print(f"Could not find user with PIN #{pin_id}. Skipping.")
-            continue
-    except requests.RequestException as e:
-        print(f"Error fetching user info for PIN #{pin_id}: {e}. Skipping.")
-        continue
-
-    # 2. Get the list of days the employee was active
-    first_last_url = (
-        f"{BASE_URL}/api/v2/transaction/firstInAndLastOut/{pin_id}?"
-        f"pageNo=1&pageSize={NUMBER_OF_DAYS}&access_token={ACCESS_TOKEN}"
+def build_timeline_report(people, punches):
+    """Builds one row per employee and day with the IN/OUT timeline of that day from a PunchBatch."""
+    people_df = pandas.DataFrame(people)
+    people_df['FIO'] = (people_df['name'] + ' ' + people_df['lastName']).str.strip()
+    # The punches carry integer PINs; roster PINs that are not numbers cannot have any
+    people_df['pin_key'] = pandas.to_numeric(people_df['pin'], errors='coerce')
+
+    # 1. Pair the punches of the whole organization at once, one period per day piece
+    periods = split_at_midnight(pair_punches(punches))
+    periods['label'] = (
+        periods['start'].dt.strftime('%H:%M').fillna('?') + ' - ' + periods['end'].dt.strftime('%H:%M').fillna('?')
+    )
+    timelines = periods.groupby(['pin', 'date']).agg(
+        timeline=('label', ' -> '.join),
+        worked=('duration', 'sum'),
     )
+
+    # 2. First/last punch and count per day, then lateness and overwork for all days at once
+    days = punches.daily().rename(columns={'first': 'firstInTime', 'last': 'lastOutTime'})
+    days['lastOutTime'] = days['lastOutTime'].where(days['count'] > 1)
+    days = days.set_index(['pin', 'date']).join(timelines).reset_index()
+    days['ID'] = days['pin']
+    days['Department'] = days['pin'].map(people_df.set_index('pin_key')['deptName'])
+    days = compute_metrics(days.drop(columns='date'))
+
+    days['Late'] = format_timedelta(days['late']).fillna("N/A")
+    days['Overwork'] = format_timedelta(days['overwork']).fillna("N/A")
+    days['minutes'] = (days['worked'].dt.total_seconds() // 60).fillna(0).astype(int)
+
+    # 3. Attach the employee info, keeping the roster order; employees without punches get one row
+    report = people_df.merge(days.drop(columns=['Department']), left_on='pin_key', right_on='ID',
+                             how='left', sort=False, suffixes=('', '_punches'))
+    no_records = report['date'].isna()
+
+    report_df = pandas.DataFrame({
+        "ID": report['pin'],
+        "FIO": report['FIO'],
+        "Department": report['deptName'],
+        "Date": report['date'].dt.strftime('%Y-%m-%d').fillna("N/A"),
+        "Day of the week": report['date'].dt.day_name().fillna("N/A"),
+        "Actual attendance": report['timeline'].where(~no_records, "No records found"),
+        "Actual Time (minutes)": report['minutes'].fillna(0).astype(int),
+        "Transaction count": report['count'].fillna(0).astype(int),
+        "Late": report['Late'].where(~no_records, "N/A"),
+        "Overwork": report['Overwork'].where(~no_records, "N/A"),
+    })
+    return report_df
+
+
+def main(argv=None):
+    argparse.ArgumentParser(
+        description=f"Generates the daily IN/OUT timeline report of the last {NUMBER_OF_DAYS} days for all employees."
+    ).parse_args(argv)
+    print("Starting to fetch attendance data...")
     try:
-        response = requests.get(first_last_url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-    
-        if data.get('data' , {}) is None:
-            continue
-        
-        active_days_records = data.get('data', {}).get('data', [])
+        people = load_roster()
+    except (requests.RequestException, ValueError) as e:
+        print(f"Could not load the roster: {e}")
+        return
 
-        try:
-            if not active_days_records:
-                print(f"No attendance records found for PIN #{pin_id}.")
-                all_records.append({
-                    "ID": pin_id, "FIO": f"{user_info.get('name', '')} {user_info.get('lastName', '')}".strip(),
-                    "Department": user_info.get('deptName', 'N/A'), "Date": "N/A", "Day of the week": "N/A",
-                    "Actual attendance": "No records found", "Actual Time (minutes)": 0, "Transaction count": 0,
-                    "Late": "N/A", "Overwork": "N/A"
-                })
-                continue
-        except AttributeError:
-            print(f"Unexpected data format for PIN #{pin_id}. Skipping.")
-            continue
-
-        print(f"Processing PIN #{pin_id}. Found {len(active_days_records)} active days.")
-        
-        # 3. For each active day, get all transactions and build the timeline
-        for day_record in active_days_records:
-            attendance_date_str = day_record.get('firstInTime', '').split(' ')[0]
-            if not attendance_date_str:
-                continue
-
-            # Fetch all transactions for this specific day
-            trans_url = (
-                f"{BASE_URL}/api/v2/transaction/person/{pin_id}?"
-                f"startDate={attendance_date_str}&endDate={attendance_date_str}&pageSize=100&access_token={ACCESS_TOKEN}"
-            )
-            
-            timeline_parts = []
-            total_duration = timedelta(0)
-            transaction_count = 0
-            
-            try:
-                trans_response = requests.get(trans_url, timeout=10)
-                trans_response.raise_for_status()
-                trans_data = trans_response.json()
-                
-                transactions = trans_data.get('data', {}).get('data', [])
-                transaction_count = trans_data.get('data', {}).get('total', 0)
-
-                if transactions:
-                    # Sort transactions by time to ensure correct order
-                    transactions.sort(key=lambda x: x['eventTime'])
-                    
-                    # Pair up transactions (IN/OUT, IN/OUT, ...)
-                    for i in range(0, len(transactions) - 1, 2):
-                        start_trans = transactions[i]
-                        end_trans = transactions[i+1]
-                        
-                        start_dt = datetime.strptime(start_trans['eventTime'], '%Y-%m-%d %H:%M:%S')
-                        end_dt = datetime.strptime(end_trans['eventTime'], '%Y-%m-%d %H:%M:%S')
-                        
-                        # Add the formatted time pair to our list
-                        timeline_parts.append(f"{start_dt.strftime('%H:%M')} - {end_dt.strftime('%H:%M')}")
-                        # Add the duration of this pair to the total
-                        total_duration += (end_dt - start_dt)
-            
-            except requests.RequestException as e:
-                print(f"Could not fetch transaction details for PIN #{pin_id} on {attendance_date_str}. Error: {e}")
-
-            # --- Final Calculations for the day ---
-            timeline_str = " -> ".join(timeline_parts) if timeline_parts else "Incomplete Data"
-            
-            first_in_dt = datetime.strptime(transactions[0]['eventTime'], '%Y-%m-%d %H:%M:%S') if transactions else None
-            last_out_dt = datetime.strptime(transactions[-1]['eventTime'], '%Y-%m-%d %H:%M:%S') if len(transactions) > 1 else None
-
-            attendance_date = first_in_dt.date()
-            planned_start_dt = datetime.combine(attendance_date, PLANNED_START_TIME)
-            planned_end_dt = datetime.combine(attendance_date, PLANNED_END_TIME)
-            
-            lateness = max(first_in_dt - planned_start_dt, timedelta(0)) if first_in_dt else "N/A"
-            overwork = max(last_out_dt - planned_end_dt, timedelta(0)) if last_out_dt else "N/A"
-
-            all_records.append({
-                "ID": pin_id,
-                "FIO": f"{user_info.get('name', '')} {user_info.get('lastName', '')}".strip(),
-                "Department": user_info.get('deptName', 'N/A'),
-                "Date": attendance_date_str,
-                "Day of the week": datetime.strptime(attendance_date_str, '%Y-%m-%d').strftime('%A'),
-                "Actual attendance": timeline_str,
-                "Actual Time (minutes)": int(total_duration.total_seconds() / 60),
-                "Transaction count": transaction_count,
-                "Late": str(lateness),
-                "Overwork": str(overwork)
-            })
-
-    except requests.RequestException as e:
-        print(f"An error occurred while processing attendance for PIN #{pin_id}: {e}")
-    except (ValueError, KeyError, IndexError):
-        print(f"Could not parse attendance data for PIN #{pin_id}. Skipping.")
-
-# --- Save to Excel ---
-if all_records:
-    print(f"\nProcessed all workers. Total records created: {len(all_records)}.")
-    report_df = pandas.DataFrame(all_records)
-    output_filename = "daily_timeline_attendance_report_with_ai.xlsx"
-    report_df.to_excel(output_filename, index=False)
-    print(f"Report successfully saved as {output_filename}")
-else:
-    print("No data was collected. The report was not generated.")
\ No newline at end of file
+    end_date = date.today()
+    start_date = end_date - timedelta(days=NUMBER_OF_DAYS - 1)
+    punches = asyncio.run(fetch_all_punches(people, start_date.isoformat(), end_date.isoformat()))
+    print(f"Fetched {len(punches)} transactions for {len(people)} employees ({punches.nbytes / 1024:.0f} KiB).")
+
+    # --- Save to Excel ---
+    if people:
+        report_df = build_timeline_report(people, punches)
+        print(f"\nProcessed all workers. Total records created: {len(report_df)}.")
+        output_filename = "daily_timeline_attendance_report_with_ai.xlsx"
+        report_df.to_excel(output_filename, index=False)
+        print(f"Report successfully saved as {output_filename}")
+    else:
+        print("No data was collected. The report was not generated.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Scans the punches of the whole organization for anomalies payroll has to look at.
+
+    python anomalies.py --days 30 --output anomalies.xlsx
+
+Every rule is a vectorized pass over one sorted PunchBatch (see ANOMALY_RULES), so a
+month of the whole organization is checked in a single sort plus a few array scans.
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+
+import numpy
+import pandas
+import requests
+
+from configs import NUMBER_OF_DAYS, MAX_PERIOD_HOURS, ANOMALY_MAX_DAY_HOURS, ANOMALY_DUPLICATE_SECONDS
+from fetch_engine import AsyncFetcher
+from instrumentation import PROFILE
+from punches import IN, OUT, UNKNOWN, PunchBatch, fetch_punches_range_async
+from render import render_workbook
+from roster import load_roster
+from transaction_store import TransactionStore
+
+ANOMALY_RULES = {
+    "MISSING_IN": "OUT punch without an IN before it",
+    "MISSING_OUT": "IN punch without an OUT after it",
+    "LONG_PERIOD": f"IN and OUT more than {MAX_PERIOD_HOURS} hours apart",
+    "LONG_DAY": f"First and last punch of the day more than {ANOMALY_MAX_DAY_HOURS} hours apart",
+    "DUPLICATE_PUNCH": f"Same device punched again within {ANOMALY_DUPLICATE_SECONDS} seconds",
+    "COUNT_MISMATCH": "Fetched punches disagree with the total the API reported",
+}
+
+ANOMALY_COLUMNS = ['ID', 'Date', 'Time', 'Code', 'Description', 'Detail']
+
+
+def _hours(seconds):
+    return pandas.Series(seconds / 3600).round(1).astype(str).to_numpy() + ' h'
+
+
+def _clock(seconds):
+    return pandas.Series(seconds.astype('datetime64[s]')).dt.strftime('%H:%M:%S').to_numpy()
+
+
+def _anomalies(code, pins, times, detail):
+    moments = pandas.Series(times.astype('datetime64[s]'))
+    return pandas.DataFrame({
+        'ID': pins,
+        'Date': moments.dt.strftime('%Y-%m-%d'),
+        'Time': moments.dt.strftime('%H:%M:%S'),
+        'Code': code,
+        'Description': ANOMALY_RULES[code],
+        'Detail': detail,
+    }, columns=ANOMALY_COLUMNS)
+
+
+def _direction_anomalies(batch, start, now):
+    """MISSING_IN, MISSING_OUT and LONG_PERIOD over the turnstile punches of a sorted batch."""
+    turnstile = batch.take(batch.direction != UNKNOWN)
+    pin, t, d = turnstile.pin, turnstile.event_time, turnstile.direction
+    if not len(pin):
+        return []
+    max_period = MAX_PERIOD_HOURS * 3600
+    first = numpy.r_[True, pin[1:] != pin[:-1]]
+    last = numpy.r_[pin[1:] != pin[:-1], True]
+    prev_d = numpy.r_[UNKNOWN, d[:-1]]
+    next_d = numpy.r_[d[1:], UNKNOWN]
+    next_t = numpy.r_[t[1:], 0]
+
+    # An OUT at the very start of the window may close a period that began before it,
+    # and a trailing IN may belong to someone who is still inside
+    leading_ok = t - start <= max_period if start is not None else numpy.zeros(len(t), bool)
+    missing_in = (d == OUT) & ((~first & (prev_d == OUT)) | (first & ~leading_ok))
+    missing_out = (d == IN) & ((~last & (next_d == IN)) | (last & (now - t > max_period)))
+    long_period = (d == IN) & ~last & (next_d == OUT) & (next_t - t > max_period)
+
+    pieces = []
+    if missing_in.any():
+        pieces.append(_anomalies("MISSING_IN", pin[missing_in], t[missing_in],
+                                 numpy.where(first[missing_in], "First punch in the window is an OUT",
+                                             "Follows another OUT")))
+    if missing_out.any():
+        pieces.append(_anomalies("MISSING_OUT", pin[missing_out], t[missing_out],
+                                 numpy.where(last[missing_out], "Last punch in the window is an IN",
+                                             "Followed by another IN")))
+    if long_period.any():
+        gap = next_t[long_period] - t[long_period]
+        pieces.append(_anomalies("LONG_PERIOD", pin[long_period], t[long_period],
+                                 "OUT at " + _clock(next_t[long_period]) + ", " + _hours(gap) + " later"))
+    return pieces
+
+
+def _duplicate_anomalies(batch):
+    pin, t, device = batch.pin, batch.event_time, batch.device
+    repeat = numpy.r_[False, (pin[1:] == pin[:-1]) & (device[1:] == device[:-1]) &
+                      (t[1:] - t[:-1] <= ANOMALY_DUPLICATE_SECONDS)]
+    if not repeat.any():
+        return []
+    devices = numpy.array(batch.devices, dtype=object)[device[repeat]]
+    gap = t[repeat] - numpy.r_[0, t[:-1]][repeat]
+    return [_anomalies("DUPLICATE_PUNCH", pin[repeat], t[repeat],
+                       pandas.Series(gap).astype(str).to_numpy() + " s after the previous punch on " + devices)]
+
+
+def _long_day_anomalies(batch):
+    days = batch.daily()
+    span = (days['last'] - days['first']).dt.total_seconds().to_numpy()
+    long_day = span > ANOMALY_MAX_DAY_HOURS * 3600
+    if not long_day.any():
+        return []
+    first = days['first'].to_numpy()[long_day].astype('datetime64[s]').astype('int64')
+    last = days['last'].to_numpy()[long_day].astype('datetime64[s]').astype('int64')
+    return [_anomalies("LONG_DAY", days['pin'].to_numpy()[long_day], first,
+                       "Last punch at " + _clock(last) + ", " + _hours(span[long_day]) + " after the first")]
+
+
+def _count_anomalies(totals):
+    mismatched = {pin: counts for pin, counts in totals.items() if counts[0] != counts[1]}
+    if not mismatched:
+        return []
+    anomalies = _anomalies("COUNT_MISMATCH", numpy.array(list(mismatched), dtype='int64'),
+                           numpy.zeros(len(mismatched), 'int64'),
+                           [f"API reported {reported}, fetched {fetched}" for reported, fetched in mismatched.values()])
+    anomalies[['Date', 'Time']] = "N/A"
+    return [anomalies]
+
+
+def detect_anomalies(punches, start=None, totals=None, now=None):
+    """Returns one row per anomaly found in the PunchBatch, ordered by PIN and time (columns ANOMALY_COLUMNS).
+
+    `start` ('YYYY-MM-DD') is the first day of the fetched window, so an OUT right after it
+    is not reported as missing its IN; a trailing IN is only reported once `now` is more
+    than MAX_PERIOD_HOURS later. `totals` maps a PIN to (total the API reported, punches
+    fetched), as collected by fetch_punches_range_async().
+    """
+    now = numpy.datetime64(now or datetime.now(), 's').astype('int64')
+    start = numpy.datetime64(start, 's').astype('int64') if start else None
+    batch = punches.sorted()
+    pieces = _count_anomalies(totals or {})
+    if len(batch):
+        pieces = (_direction_anomalies(batch, start, now) + _duplicate_anomalies(batch)
+                  + _long_day_anomalies(batch) + pieces)
+    if not pieces:
+        return pandas.DataFrame(columns=ANOMALY_COLUMNS).astype({'ID': 'int64'})
+    return pandas.concat(pieces).sort_values(['ID', 'Date', 'Time'], kind='stable').reset_index(drop=True)
+
+
+def anomaly_sheet(anomalies, people):
+    """Adds the employee's name and department from the roster to the anomalies."""
+    people_df = pandas.DataFrame(
+        [(int(p['pin']), f"{p.get('name', '')} {p.get('lastName', '')}".strip(), p.get('deptName', 'N/A'))
+         for p in people if isinstance(p, dict) and str(p['pin']).isdigit()],
+        columns=['ID', 'FIO', 'Department'],
+    )
+    sheet = anomalies.merge(people_df, on='ID', how='left')
+    sheet[['FIO', 'Department']] = sheet[['FIO', 'Department']].fillna("N/A")
+    return sheet[['ID', 'FIO', 'Department'] + ANOMALY_COLUMNS[1:]]
+
+
+async def fetch_organization_punches(people, start_date_str, end_date_str, fetcher=None):
+    """Fetches the punches of every employee in the window.
+
+    Returns (PunchBatch, totals per PIN for detect_anomalies(), PINs that failed).
+    """
+    if fetcher is None:
+        async with AsyncFetcher() as fetcher:
+            return await fetch_organization_punches(people, start_date_str, end_date_str, fetcher)
+
+    totals = {}
+    failed = []
+
+    async def fetch(person):
+        pin_id = person['pin'] if isinstance(person, dict) else person
+        try:
+            return await fetch_punches_range_async(fetcher, pin_id, start_date_str, end_date_str, totals=totals)
+        except requests.RequestException as e:
+            print(f"Could not fetch transactions for PIN #{pin_id}. Error: {e}")
+        except ValueError as e:
+            print(f"Could not parse the transactions of PIN #{pin_id}. Error: {e}")
+        failed.append(pin_id)
+        return PunchBatch.empty()
+
+    batches = await asyncio.gather(*(fetch(person) for person in people))
+    return PunchBatch.concat(batches), totals, failed
+
+
+def store_punches(store, people, start_date_str, end_date_str):
+    """Reads the punches of every employee in the window from a TransactionStore."""
+    pins = [person['pin'] if isinstance(person, dict) else person for person in people] or store.pins()
+    return PunchBatch.concat([
+        PunchBatch.from_transactions(store.get_transactions(pin_id, start_date_str, end_date_str), pin=pin_id)
+        for pin_id in pins if str(pin_id).isdigit()
+    ])
+
+
+def find_anomalies(people, start_date_str, end_date_str, store=None):
+    """Fetches (or reads from the store) the window's punches and returns the anomalies sheet."""
+    if store is not None:
+        punches, totals = store_punches(store, people, start_date_str, end_date_str), None
+    else:
+        punches, totals, failed = asyncio.run(fetch_organization_punches(people, start_date_str, end_date_str))
+        if failed:
+            print(f"{len(failed)} PINs could not be checked for anomalies: {', '.join(str(pin) for pin in failed)}")
+    with PROFILE.stage('anomalies'):
+        return anomaly_sheet(detect_anomalies(punches, start_date_str, totals), people)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lists the attendance anomalies of the whole organization.")
+    parser.add_argument("--days", type=int, default=NUMBER_OF_DAYS, help="Days to check, ending today")
+    parser.add_argument("--dept", action="append", dest="dept_codes", help="Only include this department code (repeatable)")
+    parser.add_argument("--from-store", action="store_true", help="Read the punches from the local transaction store")
+    parser.add_argument("--output", default="anomalies.xlsx", help="Workbook to write")
+    args = parser.parse_args(argv)
+
+    end_date = date.today()
+    start_date = end_date - timedelta(days=args.days - 1)
+    try:
+        people = load_roster(args.dept_codes)
+    except (requests.RequestException, ValueError) as e:
+        print(f"Could not load the roster: {e}")
+        if not args.from_store:
+            return
+        people = []
+
+    if args.from_store:
+        with TransactionStore() as store:
+            sheet = find_anomalies(people, start_date.isoformat(), end_date.isoformat(), store)
+    else:
+        sheet = find_anomalies(people, start_date.isoformat(), end_date.isoformat())
+
+    render_workbook({"Anomalies": sheet}, args.output)
+    print(f"Found {len(sheet)} anomalies: "
+          + ", ".join(f"{code} {count}" for code, count in sheet['Code'].value_counts().items()))
+    print(f"Anomalies saved as {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""One command line for all the attendance tools.
+
+    python attendance_report_generator.py first-in 392
+    python attendance_report_generator.py sweep --dept D01 --output report.xlsx
+    python attendance_report_generator.py pin-report --pin 392 --start 2025-08-01 --end 2025-08-28
+    python attendance_report_generator.py <command> --help
+
+The modules form three layers the commands share:
+
+- fetch: configs, http_client, fetch_engine, roster, transactions, punches, transaction_store
+- compute: metrics, pairing, schedule, summary, anomalies, presence_index, trends
+- render: report_writer, render
+
+Only the module of the chosen command is imported, so pandas, NumPy and the Excel
+writers are loaded when a command needs them and not to answer a quick lookup.
+"""
+import argparse
+import importlib
+import os
+import sys
+from datetime import date
+
+# command: (module, description); the module's main(argv) gets the remaining arguments
+COMMANDS = {
+    "sweep": ("report_attendance", "Monthly report for all employees (or departments)"),
+    "pin-report": ("info_by_pin_and_date", "Detailed report for one employee and date range, or a batch of them"),
+    "timeline": ("report_attendance_ai", "Daily IN/OUT timeline report for all employees"),
+    "anomalies": ("anomalies", "List the attendance anomalies of the organization"),
+    "summary": ("summary", "Department and organization summaries of a finished report"),
+    "render": ("render", "Render a finished report per department"),
+    "sync": ("transaction_store", "Maintain the local transaction store"),
+    "serve": ("service", "Run the report service"),
+    "occupancy": ("occupancy", "Track who is in the building right now"),
+    "presence": ("presence_index", "Who was on site at a time or during a time window"),
+    "trends": ("trends", "Update the attendance aggregates and export trend charts"),
+}
+
+# Scripts that are not at the top level of the repository
+SCRIPT_DIRS = ("DIF_CODES",)
+
+
+def first_in(pin_id, day):
+    """Returns the PIN's first-in/last-out record of the day ('YYYY-MM-DD'), or None without punches."""
+    from transactions import fetch_first_in_last_out
+
+    # One record per day with punches, newest first: the newest N records reach back at least N days
+    days_back = (date.today() - date.fromisoformat(day)).days
+    if days_back < 0:
+        return None
+    for record in fetch_first_in_last_out(pin_id, page_size=days_back + 1):
+        moment = record.get('firstInTime') or record.get('lastOutTime') or ''
+        if moment.startswith(day):
+            return record
+    return None
+
+
+def _first_in_command(argv):
+    import requests
+
+    parser = argparse.ArgumentParser(prog="first-in", description="Prints an employee's first-in and last-out of a day.")
+    parser.add_argument("pin", help="Employee PIN")
+    parser.add_argument("--date", default=date.today().isoformat(), help="Day to look up (default: today)")
+    args = parser.parse_args(argv)
+
+    try:
+        record = first_in(args.pin, args.date)
+    except requests.RequestException as e:
+        print(f"Could not fetch the records of PIN #{args.pin}: {e}")
+        return 1
+    if record is None:
+        print(f"PIN #{args.pin} has no punches on {args.date}.")
+        return 0
+    print(f"PIN #{args.pin} on {args.date}: first in {record.get('firstInTime') or 'N/A'}, "
+          f"last out {record.get('lastOutTime') or 'N/A'}")
+    return 0
+
+
+def run_command(command, argv):
+    """Imports the command's module and runs its main() with the arguments."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    for folder in SCRIPT_DIRS:
+        path = os.path.join(here, folder)
+        if path not in sys.path:
+            sys.path.append(path)
+    module_name, _ = COMMANDS[command]
+    return importlib.import_module(module_name).main(argv)
+
+
+def main(argv=None):
+    descriptions = {"first-in": "Quick lookup of an employee's first-in and last-out of a day"}
+    descriptions.update((command, description) for command, (_, description) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        description="Attendance report tools.",
+        epilog="commands:\n" + "\n".join(f"  {command:<12}{text}" for command, text in descriptions.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=descriptions, metavar="command", help="See the list below")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments of the command (see <command> --help)")
+    args = parser.parse_args(argv)
+
+    if args.command == "first-in":
+        return _first_in_command(args.args)
+    return run_command(args.command, args.args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""Local stand-in for the attendance device server, used by the benchmarks.
+
+Serves synthetic employees and punches on the endpoints the scripts use:
+/api/person/get/{pin}, /api/person/getPersonList, /api/v2/transaction/firstInAndLastOut/{pin}
+and /api/v2/transaction/person/{pin}. The data is derived from (pin, date), so every run and
+every date window sees the same punches. GET /__stats returns the request counters and
+GET /__reset clears them.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+DEPARTMENTS = 8
+HISTORY_DAYS = 120
+ENTRY_DEVICE = "Турникет-Вход"
+EXIT_DEVICE = "Турникет-Выход"
+
+
+def person(pin):
+    dept = pin % DEPARTMENTS
+    return {
+        'pin': str(pin),
+        'name': f"Name{pin}",
+        'lastName': f"Lastname{pin}",
+        'deptCode': f"D{dept:02d}",
+        'deptName': f"Department {dept}",
+    }
+
+
+def day_punches(pin, day):
+    """Returns the synthetic punches of one employee on one day, oldest first."""
+    rng = random.Random(f"{pin}:{day.isoformat()}")
+    if rng.random() < 0.1:
+        return [] # Absent
+    arrive = datetime.combine(day, datetime.min.time()) + timedelta(minutes=rng.randint(480, 570))
+    leave = arrive + timedelta(minutes=rng.randint(480, 660))
+    punches = [(arrive, ENTRY_DEVICE)]
+    if rng.random() < 0.5:
+        lunch = arrive + timedelta(minutes=rng.randint(180, 240))
+        punches += [(lunch, EXIT_DEVICE), (lunch + timedelta(minutes=rng.randint(30, 60)), ENTRY_DEVICE)]
+    punches.append((leave, EXIT_DEVICE))
+    if rng.random() < 0.05:
+        punches.pop(rng.randrange(len(punches))) # A missed tap
+    return [
+        {'pin': str(pin), 'eventTime': moment.strftime('%Y-%m-%d %H:%M:%S'), 'devName': device}
+        for moment, device in punches
+    ]
+
+
+@lru_cache(maxsize=4096)
+def first_last_records(pin, today):
+    """The firstInAndLastOut records of the employee over HISTORY_DAYS, newest first."""
+    records = []
+    for offset in range(HISTORY_DAYS):
+        punches = day_punches(pin, today - timedelta(days=offset))
+        if punches:
+            records.append({
+                'firstInTime': punches[0]['eventTime'],
+                'lastOutTime': punches[-1]['eventTime'] if len(punches) > 1 else None,
+            })
+    return records
+
+
+class MockState:
+    def __init__(self, employees, latency_ms=0, error_rate=0.0):
+        self.employees = employees
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.errors = 0
+            self.bytes_sent = 0
+            self.by_endpoint = {}
+
+    def count(self, endpoint, size, error=False):
+        with self.lock:
+            self.requests += 1
+            self.errors += error
+            self.bytes_sent += size
+            self.by_endpoint[endpoint] = self.by_endpoint.get(endpoint, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'bytes_sent': self.bytes_sent,
+                'by_endpoint': dict(self.by_endpoint),
+            }
+
+
+def _page(items, query, default_size=100):
+    page_no = int(query.get('pageNo', [1])[0])
+    page_size = int(query.get('pageSize', [default_size])[0])
+    return {'total': len(items), 'data': items[(page_no - 1) * page_size:page_no * page_size]}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    state = None # Set by create_server()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, endpoint, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        if endpoint:
+            self.state.count(endpoint, len(payload), error=status >= 500)
+
+    def _simulate_network(self, endpoint):
+        """Sleeps for the configured latency; returns True if this request should fail."""
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if self.state.error_rate and random.random() < self.state.error_rate:
+            self._send(endpoint, 503, None)
+            return True
+        return False
+
+    def _pin(self, path):
+        last = path.rstrip('/').rsplit('/', 1)[-1]
+        return int(last) if last.isdigit() else None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/__stats':
+            return self._send(None, 200, self.state.stats())
+        if url.path == '/__reset':
+            self.state.reset()
+            return self._send(None, 200, {'ok': True})
+
+        pin = self._pin(url.path)
+        known = pin is not None and 1 <= pin <= self.state.employees
+        if url.path.startswith('/api/person/get/'):
+            endpoint = 'person/get'
+            if not self._simulate_network(endpoint):
+                self._send(endpoint, 200, {'code': 0, 'data': person(pin) if known else None})
+        elif url.path.startswith('/api/v2/transaction/firstInAndLastOut/'):
+            endpoint = 'transaction/firstInAndLastOut'
+            if not self._simulate_network(endpoint):
+                records = first_last_records(pin, date.today()) if known else []
+                self._send(endpoint, 200, {'code': 0, 'data': _page(records, query)})
+        elif url.path.startswith('/api/v2/transaction/person/'):
+            endpoint = 'transaction/person'
+            if not self._simulate_network(endpoint):
+                punches = self._transactions(pin, query) if known else []
+                self._send(endpoint, 200, {'code': 0, 'data': _page(punches, query)})
+        else:
+            self._send('unknown', 404, {'code': 404, 'message': 'Not found'})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if url.path != '/api/person/getPersonList':
+            return self._send('unknown', 404, {'code': 404, 'message': 'Not found'})
+
+        endpoint = 'person/getPersonList'
+        if self._simulate_network(endpoint):
+            return
+        people = [person(pin) for pin in range(1, self.state.employees + 1)]
+        if body.get('pins'):
+            pins = set(body['pins'].split(','))
+            people = [p for p in people if p['pin'] in pins]
+        if body.get('deptCodes'):
+            dept_codes = set(body['deptCodes'].split(','))
+            people = [p for p in people if p['deptCode'] in dept_codes]
+        query = {'pageNo': [body.get('pageNo', 1)], 'pageSize': [body.get('pageSize', 100)]}
+        self._send(endpoint, 200, {'code': 0, 'data': _page(people, query)})
+
+    def _transactions(self, pin, query):
+        start = date.fromisoformat(query['startDate'][0])
+        end = date.fromisoformat(query['endDate'][0])
+        if end <= start:
+            end = start + timedelta(days=1)
+        punches = []
+        day = start
+        while day < end:
+            punches.extend(day_punches(pin, day))
+            day += timedelta(days=1)
+        return punches
+
+
+def create_server(host='127.0.0.1', port=0, employees=500, latency_ms=0, error_rate=0.0):
+    """Returns a ThreadingHTTPServer (not yet serving); port 0 picks a free port."""
+    handler = type('BoundMockHandler', (MockHandler,), {'state': MockState(employees, latency_ms, error_rate)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = handler.state
+    return server
+
+
+def start_in_thread(**kwargs):
+    """Starts a mock server in a background thread and returns it together with its base URL."""
+    server = create_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the mock attendance server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--employees", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=20, help="Delay added to every API response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of API requests answered with 503")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.employees, args.latency_ms, args.error_rate)
+    print(f"Mock attendance server on http://{args.host}:{args.port} with {args.employees} employees")
+    print(f"Point the scripts at it with ATTENDANCE_BASE_URL=http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
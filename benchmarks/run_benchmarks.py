@@ -0,0 +1,112 @@
+"""Measures the report scripts against the local mock server.
+
+For every employee count a fresh mock server is started and each target runs in its
+own subprocess and scratch directory. Reported per run: wall time, API requests issued,
+requests/sec and the child's peak RSS.
+
+    python benchmarks/run_benchmarks.py --employees 50,200,500 --latency-ms 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import date, timedelta
+
+from mock_server import start_in_thread
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PIN_REPORT_DRIVER = """
+import sys
+sys.path.insert(0, {dif_codes!r})
+from info_by_pin_and_date import generate_report
+for pin_id in range(1, {employees} + 1):
+    generate_report(pin_id, {start!r}, {end!r})
+"""
+
+
+def target_command(target, employees, days):
+    if target == 'sweep':
+        return [sys.executable, os.path.join(REPO_ROOT, 'report_attendance.py'), '--output', 'report.xlsx']
+    if target == 'pin-report':
+        end = date.today()
+        code = PIN_REPORT_DRIVER.format(
+            dif_codes=os.path.join(REPO_ROOT, 'DIF_CODES'), employees=employees,
+            start=(end - timedelta(days=days - 1)).isoformat(), end=end.isoformat(),
+        )
+        return [sys.executable, '-c', code]
+    raise ValueError(f"Unknown benchmark target '{target}'")
+
+
+def _get_json(url):
+    with urllib.request.urlopen(url) as response:
+        return json.load(response)
+
+
+def run_target(target, base_url, employees, days):
+    """Runs one target in a scratch directory and returns its measurements."""
+    _get_json(f"{base_url}/__reset")
+    env = dict(os.environ, ATTENDANCE_BASE_URL=base_url, PYTHONPATH=REPO_ROOT)
+    with tempfile.TemporaryDirectory() as workdir:
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            target_command(target, employees, days), cwd=workdir, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        stderr = process.stderr.read()
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - started
+    stats = _get_json(f"{base_url}/__stats")
+    return {
+        'target': target,
+        'employees': employees,
+        'exit_code': os.waitstatus_to_exitcode(status),
+        'wall_seconds': round(wall, 3),
+        'requests': stats['requests'],
+        'requests_per_second': round(stats['requests'] / wall, 1) if wall else 0,
+        'server_errors': stats['errors'],
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'stderr': stderr.decode('utf-8', 'replace')[-2000:],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the report scripts against the mock server.")
+    parser.add_argument("--employees", default="50,200,500", help="Comma-separated employee counts")
+    parser.add_argument("--targets", default="sweep,pin-report", help="Comma-separated targets: sweep, pin-report")
+    parser.add_argument("--days", type=int, default=30, help="Date window of the per-PIN reports")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Mock server response delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of mock requests answered with 503")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'target':<12}{'employees':>10}{'wall s':>10}{'requests':>10}{'req/s':>10}{'peak MB':>10}")
+    for employees in [int(n) for n in args.employees.split(',')]:
+        server, base_url = start_in_thread(
+            employees=employees, latency_ms=args.latency_ms, error_rate=args.error_rate
+        )
+        try:
+            for target in args.targets.split(','):
+                result = run_target(target, base_url, employees, args.days)
+                results.append(result)
+                print(f"{target:<12}{employees:>10}{result['wall_seconds']:>10}{result['requests']:>10}"
+                      f"{result['requests_per_second']:>10}{result['peak_rss_mb']:>10}")
+                if result['exit_code']:
+                    print(f"  -> exited with {result['exit_code']}:\n{result['stderr']}")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved as {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import json
+import os
+
+from configs import CHECKPOINT_FILE
+
+
+class SweepCheckpoint:
+    """Append-only record of the PINs a sweep has finished, together with their raw rows.
+
+    Every finished PIN is written as one JSON line and flushed right away, so after a
+    crash `resume=True` picks up the already finished PINs (and their rows) and only
+    the remaining ones have to be fetched again.
+    """
+
+    def __init__(self, path=CHECKPOINT_FILE, resume=False):
+        self.path = path
+        self.completed = {}
+        if resume and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # A line cut short by the crash
+                    self.completed[str(entry['pin'])] = entry['rows']
+            print(f"Resuming: {len(self.completed)} PINs already done.")
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    def rows_for(self, pin_id):
+        """Returns the stored rows of a finished PIN, or None if it still has to be fetched."""
+        return self.completed.get(str(pin_id))
+
+    def record(self, pin_id, rows):
+        self.completed[str(pin_id)] = rows
+        self._file.write(json.dumps({'pin': pin_id, 'rows': rows}, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        """Closes and deletes the checkpoint once a sweep has finished without failures."""
+        self.close()
+        os.remove(self.path)
@@ -1,7 +1,9 @@
+import os
 from datetime import time
 
 # Main configuration file for attendance reporting script.
-BASE_URL = "http://192.168.7.39:8098"
+# ATTENDANCE_BASE_URL lets the benchmarks point the scripts at the local mock server.
+BASE_URL = os.environ.get("ATTENDANCE_BASE_URL", "http://192.168.7.39:8098")
 ACCESS_TOKEN = "4ECD44C895F358C5DB39BC69C29B1006"
 NUMBER_OF_DAYS = 30 # How many recent days of data to fetch per worker
 MAX_WORKERS = 505   # The script will check for workers from PIN 1 up to this number
@@ -14,3 +16,96 @@ PLANNED_END_TIME = time(18, 30)
 # Assuming a 10-hour schedule with a 1-hour lunch break = 9 hours of work.
 PLANNED_WORK_DURATION_MINUTES = 540
 LUNCH_BREAK_MINUTES = 60
+
+# Shifts, holidays and shift assignments (see schedules.example.json). Without this file
+# everybody works the single shift above, every day.
+SCHEDULE_FILE = "schedules.json"
+
+# --- Sites ---
+# Further device servers (branches), each with its own URL, token, limits and PIN namespace
+# (see sites.example.json). Without this file only BASE_URL above is used.
+SITES_FILE = "sites.json"
+
+# --- Fetch Engine Configuration ---
+CONCURRENCY_LIMIT = 16     # How many API requests may be in flight at the same time
+REQUEST_TIMEOUT = 10       # Seconds to wait for a single API response
+DEFAULT_REQUESTS_PER_SECOND = 25
+# Per-host overrides of the request rate, e.g. {"192.168.7.39:8098": 10}
+REQUESTS_PER_SECOND_PER_HOST = {}
+
+# --- Transaction Fetch Configuration ---
+# "range" fetches an employee's whole reporting window in one paginated query and
+# derives the per-day figures locally; "daily" makes one request per day.
+TRANSACTION_FETCH_MODE = "range"
+TRANSACTION_PAGE_SIZE = 1000
+
+# --- Roster Configuration ---
+# Bulk personnel endpoint (2.14.6 / 2.14.12 in used_apis.txt), queried page by page.
+PERSON_LIST_PATH = "/api/person/getPersonList"
+ROSTER_PAGE_SIZE = 500
+ROSTER_CACHE_FILE = "roster_cache.json"
+ROSTER_CACHE_TTL_SECONDS = 6 * 60 * 60
+
+# --- Local Transaction Store ---
+TRANSACTION_STORE_FILE = "transactions.sqlite3"
+REPORT_ROWS_FILE = "report_rows.sqlite3" # Report rows of earlier runs, for report_attendance.py --incremental
+REPORT_SETTLE_DAYS = 1 # A day's rows are final once it is this many days old
+PRESENCE_INDEX_FILE = "presence_index.npz" # Presence periods built from the store, see presence_index.py
+
+# --- Report Output ---
+REPORT_OUTPUT_FILE = "monthly_attendance_report_with_calculations.xlsx"
+REPORT_BATCH_ROWS = 1000   # Rows buffered before they are computed and written out
+REPORT_EXCEL_ENGINE = "auto" # "openpyxl", "xlsxwriter" or "auto" (xlsxwriter when installed)
+RENDER_WORKERS = None # Processes rendering the per-department files (None = CPU count)
+
+# --- Retries and Checkpointing ---
+MAX_RETRIES = 4              # Extra attempts for a request that failed or got a 429/5xx answer
+RETRY_BACKOFF_SECONDS = 0.5  # First backoff delay, doubled on every further attempt
+RETRY_BACKOFF_MAX_SECONDS = 30
+CHECKPOINT_FILE = "sweep_checkpoint.jsonl"
+
+# --- Run Profile ---
+RUN_PROFILE_FILE = "run_profile.json" # A run_profile.csv with the per-endpoint table is written next to it
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000) # Upper bounds of the latency histogram
+LATENCY_SAMPLE_SIZE = 1000 # Latencies kept per endpoint for the percentiles (a uniform sample of all requests)
+
+# --- IN/OUT Pairing ---
+MAX_PERIOD_HOURS = 20   # An IN and OUT further apart than this are not treated as one period
+
+# --- HTTP Response Cache ---
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_FILE = "http_cache.sqlite3"
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Least recently used responses are evicted above this
+# Seconds a cached response stays fresh per endpoint kind; None means it never expires.
+HTTP_CACHE_TTL_SECONDS = {
+    "person": 6 * 60 * 60,
+    "firstInAndLastOut": 5 * 60,
+    "transactions_recent": 5 * 60,   # Windows that still include recent days
+    "transactions_final": None,      # Windows that ended HTTP_CACHE_SETTLE_DAYS or more ago
+}
+HTTP_CACHE_SETTLE_DAYS = 1  # Days after which the punches of a day are considered final
+
+# --- Report Service ---
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8099
+SERVICE_WORKERS = 2             # Reports generated at the same time; they share one fetcher and its rate limits
+SERVICE_QUEUE_SIZE = 20         # Jobs waiting beyond this are refused with 503
+SERVICE_OUTPUT_DIR = "service_reports"
+SERVICE_RESULT_TTL_SECONDS = 5 * 60  # An identical request within this time gets the finished report again
+SERVICE_MAX_JOBS = 200          # Finished jobs remembered for /jobs (the files stay on disk)
+
+# --- Anomaly Detection ---
+ANOMALY_MAX_DAY_HOURS = 16       # A day whose first and last punch are further apart is flagged
+ANOMALY_DUPLICATE_SECONDS = 60   # Two punches on the same device within this time are flagged
+
+# --- Occupancy Tracker ---
+OCCUPANCY_POLL_SECONDS = 15   # Time between the starts of two polls of the new transactions
+# PINs polled per poll (one request each). Half the rate limit's budget for one interval, so a poll
+# finishes well within it; larger rosters are polled in turns, a full round taking several polls.
+OCCUPANCY_PINS_PER_POLL = OCCUPANCY_POLL_SECONDS * DEFAULT_REQUESTS_PER_SECOND // 2
+OCCUPANCY_HOST = "127.0.0.1"
+OCCUPANCY_PORT = 8100
+
+# --- Trend Aggregates ---
+AGGREGATES_FILE = "aggregates.sqlite3" # Daily, weekly and monthly aggregates, see trends.py
+TREND_HISTORY_DAYS = 365 # Days aggregated by the first update
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from configs import CONCURRENCY_LIMIT, REQUEST_TIMEOUT, MAX_RETRIES
+from configs import DEFAULT_REQUESTS_PER_SECOND, REQUESTS_PER_SECOND_PER_HOST
+from http_client import RETRY_STATUS_CODES, backoff_delay, shared_cache
+from instrumentation import PROFILE
+
+
+class HostRateLimiter:
+    """Spaces out requests so that each host never sees more than its configured rate."""
+
+    def __init__(self, default_rate=DEFAULT_REQUESTS_PER_SECOND, per_host=None):
+        self.default_rate = default_rate
+        self.per_host = per_host if per_host is not None else REQUESTS_PER_SECOND_PER_HOST
+        self._next_slot = {}
+        self._locks = {}
+
+    def _interval(self, host):
+        rate = self.per_host.get(host, self.default_rate)
+        return 1.0 / rate if rate else 0.0
+
+    async def wait(self, host):
+        interval = self._interval(host)
+        if not interval:
+            return
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            next_slot = self._next_slot.get(host, now)
+            if next_slot > now:
+                await asyncio.sleep(next_slot - now)
+                now = next_slot
+            self._next_slot[host] = now + interval
+
+
+class AsyncFetcher:
+    """Runs blocking `requests` calls from asyncio with a shared keep-alive connection pool.
+
+    At most `concurrency` requests are in flight at once, and every request first
+    waits for its slot in the per-host rate limiter. Connection errors, timeouts
+    and 429/5xx answers are retried with exponential backoff and jitter. Responses
+    go through the shared on-disk ResponseCache (see http_client.py) unless
+    `use_cache` is False, as for live polling. With a `site` (see sites.py) every
+    URL is sent to that site's server instead of configs.BASE_URL.
+    """
+
+    def __init__(self, concurrency=CONCURRENCY_LIMIT, timeout=REQUEST_TIMEOUT, rate_limiter=None,
+                 max_retries=MAX_RETRIES, cache=None, use_cache=True, site=None):
+        self.site = site
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.cache = (cache or shared_cache()) if use_cache else None
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fetch")
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _get_once(self, url, headers, retry=False):
+        host = urlsplit(url).netloc
+        async with self._semaphore:
+            throttled = time.perf_counter()
+            await self.rate_limiter.wait(host)
+            PROFILE.add_time('rate_limit_wait', time.perf_counter() - throttled)
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            try:
+                response = await loop.run_in_executor(
+                    self._executor, partial(self.session.get, url, timeout=self.timeout, headers=headers)
+                )
+            except requests.RequestException:
+                PROFILE.record_request(url, None, time.perf_counter() - started, retry=retry)
+                raise
+            PROFILE.record_request(url, response.status_code, time.perf_counter() - started,
+                                   len(response.content), retry=retry)
+            return response
+
+    async def get(self, url):
+        """Performs a GET request and returns the `requests.Response`."""
+        if self.site is not None:
+            url = self.site.url(url)
+        if self.cache is None:
+            return await self._get_with_retry(url)
+        cached, validators = self.cache.lookup(url)
+        if cached is not None:
+            PROFILE.record_cache_hit(url)
+            return cached
+        response = await self._get_with_retry(url, validators or None)
+        if response.status_code == 304 and validators:
+            return self.cache.revalidate(url)
+        self.cache.store(url, response)
+        return response
+
+    async def _get_with_retry(self, url, headers=None):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._get_once(url, headers, retry=attempt > 0)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    return response
+            # Back off outside the semaphore so other requests can use the slot meanwhile
+            await asyncio.sleep(backoff_delay(attempt))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
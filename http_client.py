@@ -0,0 +1,83 @@
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from configs import REQUEST_TIMEOUT, HTTP_CACHE_ENABLED
+from configs import MAX_RETRIES, RETRY_BACKOFF_SECONDS, RETRY_BACKOFF_MAX_SECONDS
+from instrumentation import PROFILE
+from response_cache import ResponseCache
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_session = None
+_cache = None
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_SECONDS * 2 ** attempt))
+
+
+def _send_with_retry(send, url, max_retries):
+    for attempt in range(max_retries + 1):
+        started = time.perf_counter()
+        try:
+            response = send()
+        except (requests.ConnectionError, requests.Timeout):
+            PROFILE.record_request(url, None, time.perf_counter() - started, retry=attempt > 0)
+            if attempt == max_retries:
+                raise
+        else:
+            PROFILE.record_request(url, response.status_code, time.perf_counter() - started,
+                                   len(response.content), retry=attempt > 0)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                return response
+        time.sleep(backoff_delay(attempt))
+
+
+def get_with_retry(url, session=requests, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES, headers=None):
+    """Blocking GET that retries connection errors, timeouts and 429/5xx answers with backoff."""
+    return _send_with_retry(lambda: session.get(url, timeout=timeout, headers=headers), url, max_retries)
+
+
+def post_with_retry(url, json=None, session=requests, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES):
+    """Same as get_with_retry() for a POST with a JSON body."""
+    return _send_with_retry(lambda: session.post(url, json=json, timeout=timeout), url, max_retries)
+
+
+def shared_session():
+    """The keep-alive session shared by every blocking request of the process."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def shared_cache():
+    """The process-wide ResponseCache, or None when HTTP_CACHE_ENABLED is off."""
+    global _cache
+    if _cache is None and HTTP_CACHE_ENABLED:
+        _cache = ResponseCache()
+    return _cache
+
+
+def get(url, cache=None):
+    """GET through the shared session, served from the response cache where possible."""
+    cache = cache or shared_cache()
+    if cache is None:
+        return get_with_retry(url, session=shared_session())
+
+    cached, validators = cache.lookup(url)
+    if cached is not None:
+        PROFILE.record_cache_hit(url)
+        return cached
+    response = get_with_retry(url, session=shared_session(), headers=validators or None)
+    if response.status_code == 304 and validators:
+        return cache.revalidate(url)
+    cache.store(url, response)
+    return response
@@ -0,0 +1,191 @@
+import csv
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from configs import LATENCY_BUCKETS_MS, LATENCY_SAMPLE_SIZE
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint_name(url):
+    """Groups URLs by endpoint: '/api/person/get/392?...' becomes '/api/person/get/{id}'."""
+    return _ID_SEGMENT.sub('/{id}', urlsplit(url).path)
+
+
+def _new_endpoint():
+    return {
+        'requests': 0,
+        'cache_hits': 0,
+        'retries': 0,
+        'errors': 0,
+        'status_codes': {},
+        'bytes': 0,
+        'latency_total': 0.0,
+        'latency_max': 0.0,
+        'histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        'latencies': [],
+    }
+
+
+def _sample_latency(stats, seconds):
+    # Reservoir sampling: every request so far has the same chance to be among the kept ones
+    latencies = stats['latencies']
+    if len(latencies) < LATENCY_SAMPLE_SIZE:
+        latencies.append(seconds)
+    else:
+        slot = random.randrange(stats['requests'])
+        if slot < LATENCY_SAMPLE_SIZE:
+            latencies[slot] = seconds
+
+
+def _percentile(values, share):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+class RunProfile:
+    """Collects where the time of one run goes: per-endpoint request figures and stage timings.
+
+    Requests are recorded by the fetch layer (fetch_engine.py, http_client.py); code blocks
+    are timed with `with PROFILE.stage('parse'):`. The latency percentiles come from a
+    sample of at most LATENCY_SAMPLE_SIZE requests per endpoint, so the profile of a
+    long-running process stays small. Stage times are wall clock time of the
+    calling thread, while 'network' and 'rate_limit_wait' are summed over all concurrent
+    requests, so with concurrent fetching they can exceed the run's wall time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self.endpoints = {}
+            self.stages = {}
+
+    def _endpoint(self, url):
+        return self.endpoints.setdefault(endpoint_name(url), _new_endpoint())
+
+    def record_request(self, url, status, seconds, size=0, retry=False):
+        """Records one HTTP round trip; `status` is None when it failed without an answer."""
+        with self._lock:
+            stats = self._endpoint(url)
+            stats['requests'] += 1
+            stats['retries'] += retry
+            stats['bytes'] += size
+            stats['latency_total'] += seconds
+            stats['latency_max'] = max(stats['latency_max'], seconds)
+            _sample_latency(stats, seconds)
+            bucket = sum(seconds * 1000 > bound for bound in LATENCY_BUCKETS_MS)
+            stats['histogram'][bucket] += 1
+            key = str(status) if status is not None else 'error'
+            stats['status_codes'][key] = stats['status_codes'].get(key, 0) + 1
+            if status is None or status >= 400:
+                stats['errors'] += 1
+        self.add_time('network', seconds)
+
+    def record_cache_hit(self, url):
+        with self._lock:
+            self._endpoint(url)['cache_hits'] += 1
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def snapshot(self):
+        """Returns the raw figures as plain data, e.g. to send them back from a worker process."""
+        with self._lock:
+            return json.loads(json.dumps({'endpoints': self.endpoints, 'stages': self.stages}))
+
+    def merge(self, snapshot):
+        """Adds the figures of another profile's snapshot (e.g. of a batch worker) to this one."""
+        with self._lock:
+            for name, other in snapshot['endpoints'].items():
+                stats = self.endpoints.setdefault(name, _new_endpoint())
+                for field in ('requests', 'cache_hits', 'retries', 'errors', 'bytes', 'latency_total'):
+                    stats[field] += other[field]
+                stats['latency_max'] = max(stats['latency_max'], other['latency_max'])
+                latencies = stats['latencies'] + other['latencies']
+                if len(latencies) > LATENCY_SAMPLE_SIZE:
+                    latencies = random.sample(latencies, LATENCY_SAMPLE_SIZE)
+                stats['latencies'] = latencies
+                stats['histogram'] = [a + b for a, b in zip(stats['histogram'], other['histogram'])]
+                for status, count in other['status_codes'].items():
+                    stats['status_codes'][status] = stats['status_codes'].get(status, 0) + count
+            for name, seconds in snapshot['stages'].items():
+                self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def report(self):
+        """Returns the run profile: wall time, stage totals and per-endpoint statistics."""
+        with self._lock:
+            buckets = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+            endpoints = {}
+            for name, stats in sorted(self.endpoints.items()):
+                latencies = stats['latencies']
+                endpoints[name] = {
+                    'requests': stats['requests'],
+                    'cache_hits': stats['cache_hits'],
+                    'retries': stats['retries'],
+                    'errors': stats['errors'],
+                    'status_codes': stats['status_codes'],
+                    'bytes': stats['bytes'],
+                    'latency_total_seconds': round(stats['latency_total'], 3),
+                    'latency_mean_ms': round(1000 * stats['latency_total'] / stats['requests'], 1) if latencies else None,
+                    'latency_p50_ms': round(1000 * _percentile(latencies, 0.5), 1) if latencies else None,
+                    'latency_p95_ms': round(1000 * _percentile(latencies, 0.95), 1) if latencies else None,
+                    'latency_max_ms': round(1000 * stats['latency_max'], 1),
+                    'histogram': dict(zip(buckets, stats['histogram'])),
+                }
+            return {
+                'wall_seconds': round(time.perf_counter() - self.started, 3),
+                'stages_seconds': {name: round(seconds, 3) for name, seconds in sorted(self.stages.items())},
+                'endpoints': endpoints,
+            }
+
+    def write(self, json_path):
+        """Writes the profile as JSON and the per-endpoint table as CSV next to it."""
+        report = self.report()
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+        csv_path = f"{os.path.splitext(json_path)[0]}.csv"
+        columns = ['requests', 'cache_hits', 'retries', 'errors', 'bytes',
+                   'latency_mean_ms', 'latency_p50_ms', 'latency_p95_ms', 'latency_max_ms']
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['kind', 'name'] + columns + ['status_codes', 'seconds'])
+            for name, stats in report['endpoints'].items():
+                status_codes = ' '.join(f"{status}:{count}" for status, count in sorted(stats['status_codes'].items()))
+                writer.writerow(['endpoint', name] + [stats[column] for column in columns]
+                                + [status_codes, stats['latency_total_seconds']])
+            for name, seconds in report['stages_seconds'].items():
+                writer.writerow(['stage', name] + [''] * (len(columns) + 1) + [seconds])
+        return csv_path
+
+    def summary(self):
+        report = self.report()
+        requests = sum(stats['requests'] for stats in report['endpoints'].values())
+        cache_hits = sum(stats['cache_hits'] for stats in report['endpoints'].values())
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in report['stages_seconds'].items())
+        return (f"Run profile: {report['wall_seconds']:.2f}s wall, {requests} requests, {cache_hits} cache hits; "
+                f"{stages or 'no stages timed'}.")
+
+
+PROFILE = RunProfile()
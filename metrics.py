@@ -0,0 +1,183 @@
+import numpy
+import pandas
+
+from schedule import load_schedule
+
+REPORT_COLUMNS = [
+    "ID", "FIO", "Department", "Date", "Day of the week", "Schedule", "Planned time",
+    "Actual attendance", "Actual Time", "Transaction count", "Late", "Overwork", "difference",
+]
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+PLAN_COLUMNS = ["shift", "planned_start", "planned_end", "planned_minutes", "schedule"]
+
+
+def format_timedelta(series):
+    """Formats a timedelta Series the way str(datetime.timedelta) does, e.g. '0:11:00' or '1 day, 2:03:04'."""
+    whole = series.dt.total_seconds().fillna(0).astype('int64')
+    days, rest = whole // 86400, whole % 86400
+    text = (
+        (rest // 3600).astype(str) + ':'
+        + (rest % 3600 // 60).astype(str).str.zfill(2) + ':'
+        + (rest % 60).astype(str).str.zfill(2)
+    )
+    prefix = days.astype(str) + numpy.where(days.abs() == 1, ' day, ', ' days, ')
+    text = text.where(days == 0, prefix + text)
+    return text.where(series.notna())
+
+
+def _window_distance(moment, planned):
+    """How far each moment lies outside its planned [start, end] window; infinite without a window."""
+    before = (planned['planned_start'] - moment).dt.total_seconds().to_numpy()
+    after = (moment - planned['planned_end']).dt.total_seconds().to_numpy()
+    return numpy.nan_to_num(numpy.fmax(numpy.fmax(before, after), 0), nan=numpy.inf)
+
+
+def assign_to_shifts(df, schedule):
+    """Regroups the calendar-day rows of employees on overnight shifts into one row per shift.
+
+    A night shift's arrival is the last punch of one day and its departure the first
+    punch of the next, so every first-in and last-out time is given to the nearer of
+    two planned windows: the shift starting on its own day or the one that started the
+    day before. Each shift row takes the earliest of its times as first-in, the latest
+    as last-out and the other columns from the row of its first-in; its date is the
+    day the shift starts. Punches between a day's first and last one are not in the
+    rows, so a day whose two times go to different shifts adds only those two to the
+    transaction counts. Other rows are kept as they are.
+    """
+    overnight = schedule.overnight_shifts()
+    if not overnight or df.empty:
+        return df
+    ids = df['ID'] if 'ID' in df else pandas.Series('', index=df.index)
+    departments = df['Department'] if 'Department' in df else None
+    night = schedule.shift_for(ids, departments).isin(overnight) & df['date'].notna()
+    if not night.any():
+        return df
+
+    # Keep the rows in their order: every shift row goes where the row of its first-in was
+    df = df.assign(_position=numpy.arange(len(df)))
+    rows = df[night].reset_index(drop=True)
+    moments = pandas.concat([
+        pandas.DataFrame({'row': rows.index, 'moment': rows['first_in']}),
+        pandas.DataFrame({'row': rows.index, 'moment': rows['last_out']}),
+    ], ignore_index=True).dropna(subset=['moment'])
+    moment_rows = rows.iloc[moments['row']].set_index(moments.index)
+    moment_ids = moment_rows['ID'] if 'ID' in rows else pandas.Series('', index=moments.index)
+    moment_departments = moment_rows['Department'] if departments is not None else None
+    own_day = moments['moment'].dt.normalize()
+    previous_day = own_day - pandas.Timedelta(days=1)
+    own = _window_distance(moments['moment'], schedule.plan(moment_ids, moment_departments, own_day))
+    previous = _window_distance(moments['moment'], schedule.plan(moment_ids, moment_departments, previous_day))
+    moments['date'] = own_day.where(own <= previous, previous_day)
+    moments['ID'] = moment_ids.astype(str)
+
+    moments = moments.sort_values(['ID', 'date', 'moment'], kind='stable')
+    shifts = moments.groupby(['ID', 'date'], sort=False)
+    shift_rows = rows.iloc[shifts['row'].first().to_numpy()].reset_index(drop=True)
+    shift_rows['date'] = shifts['date'].first().to_numpy()
+    shift_rows['first_in'] = shifts['moment'].min().to_numpy()
+    shift_rows['last_out'] = shifts['moment'].max().where(shifts['moment'].count() > 1).to_numpy()
+
+    split = moments.groupby('row')['date'].transform('nunique') > 1
+    first_of_row = ~moments['row'].duplicated()
+    for column in ('Transaction count', 'count'):
+        if column in rows:
+            counts = pandas.to_numeric(rows[column], errors='coerce').to_numpy()[moments['row']]
+            # A row whose two times stay in one shift adds its whole count, once
+            added = numpy.where(split | numpy.isnan(counts), 1, numpy.where(first_of_row, counts, 0))
+            added = pandas.Series(added, index=moments.index)
+            shift_rows[column] = added.groupby([moments['ID'], moments['date']], sort=False).sum().to_numpy().astype('int64')
+
+    merged = pandas.concat([df[~night], shift_rows], ignore_index=True)
+    return merged.sort_values(['_position', 'date'], kind='stable').drop(columns='_position').reset_index(drop=True)
+
+
+def compute_metrics(raw, schedule=None, by_shift=True):
+    """Computes the daily metrics for all first-in/last-out rows at once.
+
+    `raw` needs the columns firstInTime and lastOutTime (strings or None), and ID and
+    Department when the schedule assigns shifts by employee or department. A row with
+    neither time stands for an employee without any records. The planned interval of
+    each row is joined in from the schedule's precomputed calendar (schedule.py; by
+    default the schedule file or the configs.py shift). Adds the columns first_in,
+    last_out, date, status ('complete', 'incomplete' or 'no_records'), shift,
+    planned_start, planned_end, planned_minutes, schedule, actual, late and overwork
+    (timedeltas) and difference_minutes. On days off and holidays all time worked
+    counts as overwork.
+
+    Rows of employees on overnight shifts are first regrouped into one row per shift
+    (see assign_to_shifts()); `by_shift=False` skips that for rows that already are
+    one per shift, such as those read back from a report.
+    """
+    schedule = schedule or load_schedule()
+    df = raw.copy()
+    df['first_in'] = pandas.to_datetime(df['firstInTime'], format=TIME_FORMAT, errors='coerce')
+    df['last_out'] = pandas.to_datetime(df['lastOutTime'], format=TIME_FORMAT, errors='coerce')
+    df['date'] = df['first_in'].fillna(df['last_out']).dt.normalize()
+    if by_shift:
+        df = assign_to_shifts(df, schedule)
+
+    has_in, has_out = df['first_in'].notna(), df['last_out'].notna()
+    df['status'] = numpy.select(
+        [has_in & has_out, has_in | has_out], ['complete', 'incomplete'], default='no_records'
+    )
+
+    ids = df['ID'] if 'ID' in df else pandas.Series('', index=df.index)
+    departments = df['Department'] if 'Department' in df else None
+    planned = schedule.plan(ids, departments, df['date'])
+    for column in PLAN_COLUMNS:
+        df[column] = planned[column]
+    df['planned_minutes'] = df['planned_minutes'].fillna(0).astype('int64')
+
+    zero = pandas.Timedelta(0)
+    day_off = df['planned_start'].isna() & df['date'].notna()
+    df['actual'] = df['last_out'] - df['first_in']
+    df['late'] = (df['first_in'] - df['planned_start']).clip(lower=zero).mask(day_off & has_in, zero)
+    df['overwork'] = (df['last_out'] - df['planned_end']).clip(lower=zero).mask(day_off, df['actual'])
+    df['difference_minutes'] = df['actual'].dt.total_seconds() / 60 - df['planned_minutes']
+    return df
+
+
+def format_report(metrics):
+    """Turns compute_metrics() output into the report's display columns."""
+    complete = metrics['status'] == 'complete'
+    incomplete = metrics['status'] == 'incomplete'
+    no_records = metrics['status'] == 'no_records'
+
+    def pick(complete_values, incomplete_value, no_records_value):
+        values = pandas.Series(complete_values, index=metrics.index, dtype=object)
+        values = values.where(~incomplete, incomplete_value)
+        return values.where(~no_records, no_records_value)
+
+    attendance = metrics['first_in'].dt.strftime('%H:%M:%S') + ' - ' + metrics['last_out'].dt.strftime('%H:%M:%S')
+    difference = metrics['difference_minutes'].round().fillna(0).astype('int64').astype(str) + ' min'
+
+    report = pandas.DataFrame({
+        "ID": metrics['ID'],
+        "FIO": metrics['FIO'],
+        "Department": metrics['Department'],
+        "Date": pick(metrics['date'].dt.strftime('%Y-%m-%d'), metrics['date'].dt.strftime('%Y-%m-%d'), "N/A"),
+        "Day of the week": pick(metrics['date'].dt.day_name(), metrics['date'].dt.day_name(), "N/A"),
+        "Schedule": pick(metrics['schedule'], metrics['schedule'], "N/A"),
+        "Planned time": pick(metrics['planned_minutes'], metrics['planned_minutes'], "N/A"),
+        "Actual attendance": pick(attendance, "Incomplete Data", "No records found"),
+        "Actual Time": pick(format_timedelta(metrics['actual']), "Incomplete Data", "No records found"),
+        "Transaction count": pick(metrics['Transaction count'], "N/A", 0),
+        "Late": pick(format_timedelta(metrics['late']), "Incomplete Data", "N/A"),
+        "Overwork": pick(format_timedelta(metrics['overwork']), "Incomplete Data", "N/A"),
+        "difference": pick(difference.where(complete), "Incomplete Data", "N/A"),
+    })
+    return report[REPORT_COLUMNS]
+
+
+def build_report(raw_rows, on_metrics=None):
+    """Builds the final report DataFrame from the raw rows collected by the sweep.
+
+    `on_metrics`, if given, also receives the compute_metrics() frame, e.g. to
+    collect the summaries without computing the metrics twice.
+    """
+    metrics = compute_metrics(pandas.DataFrame(raw_rows))
+    if on_metrics is not None:
+        on_metrics(metrics)
+    return format_report(metrics)
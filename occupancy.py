@@ -0,0 +1,234 @@
+"""Live occupancy: who is in the building right now, and the headcount per department.
+
+    python occupancy.py --interval 15 --port 8100
+
+    GET /occupancy              headcount, per-department counts and everybody inside
+    GET /occupancy/departments  only the counts
+
+The tracker polls the employees' transactions since their newest punch already seen
+(the high-water mark) and applies each new turnstile punch to the in-memory state in
+O(1): an IN puts the employee inside, an OUT takes them out again. The API has one
+transaction feed per PIN, so a poll reads at most OCCUPANCY_PINS_PER_POLL of them and
+larger rosters are polled in turns.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from configs import MAX_PERIOD_HOURS, OCCUPANCY_POLL_SECONDS, OCCUPANCY_PINS_PER_POLL, OCCUPANCY_HOST, OCCUPANCY_PORT
+from fetch_engine import AsyncFetcher
+from instrumentation import PROFILE
+from roster import load_roster
+from transactions import fetch_transactions_range_async, transaction_direction
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class OccupancyTracker:
+    """The presence state of every employee and the headcount of every department.
+
+    apply() handles one punch in constant time; the punches of one PIN have to
+    arrive oldest first, older or repeated ones (same eventTime and device) are ignored. Punches on devices
+    that are not turnstiles only update when the employee was last seen.
+    """
+
+    def __init__(self, people):
+        self.people = {str(person['pin']): person for person in people}
+        self.inside = {}        # PIN -> eventTime of the IN that brought them inside
+        self.last_seen = {}     # PIN -> (eventTime, devName) of their newest punch
+        self.high_water = {}    # PIN -> newest eventTime applied
+        self.at_high_water = {} # PIN -> devices of the punches applied at that eventTime
+        self.headcount = Counter()
+        self.events = 0
+        self.updated = None
+        self._pins = list(self.people)
+        self._next = 0 # Index in _pins of the first PIN of the next poll
+        self._lock = threading.Lock()
+
+    def next_pins(self, count):
+        """The next `count` PINs to poll, taking turns through the roster."""
+        count = min(count, len(self._pins))
+        pins = [self._pins[(self._next + i) % len(self._pins)] for i in range(count)]
+        self._next = (self._next + count) % len(self._pins) if self._pins else 0
+        return pins
+
+    def department(self, pin):
+        return self.people.get(pin, {}).get('deptName', 'N/A')
+
+    def name(self, pin):
+        person = self.people.get(pin, {})
+        return f"{person.get('name', '')} {person.get('lastName', '')}".strip()
+
+    def apply(self, pin, event_time, device_name):
+        """Applies one punch; returns False for a punch older than the PIN's last one or already applied."""
+        pin = str(pin)
+        with self._lock:
+            high_water = self.high_water.get(pin, '')
+            if event_time < high_water:
+                return False
+            if event_time == high_water:
+                # Two devices can report a punch in the same second; only the same device repeats one
+                if device_name in self.at_high_water[pin]:
+                    return False
+                self.at_high_water[pin].add(device_name)
+            else:
+                self.high_water[pin] = event_time
+                self.at_high_water[pin] = {device_name}
+            self.last_seen[pin] = (event_time, device_name)
+            self.events += 1
+            direction = transaction_direction(device_name)
+            if direction == 'in' and pin not in self.inside:
+                self.inside[pin] = event_time
+                self.headcount[self.department(pin)] += 1
+            elif direction == 'out' and pin in self.inside:
+                del self.inside[pin]
+                self.headcount[self.department(pin)] -= 1
+            return True
+
+    def expire(self, now=None):
+        """Takes out everybody whose IN is older than MAX_PERIOD_HOURS: they left without tapping out."""
+        cutoff = ((now or datetime.now()) - timedelta(hours=MAX_PERIOD_HOURS)).strftime(TIME_FORMAT)
+        with self._lock:
+            for pin in [pin for pin, since in self.inside.items() if since < cutoff]:
+                del self.inside[pin]
+                self.headcount[self.department(pin)] -= 1
+
+    def counts(self):
+        with self._lock:
+            return {
+                'as_of': self.updated,
+                'inside': len(self.inside),
+                'departments': {dept: count for dept, count in sorted(self.headcount.items()) if count},
+            }
+
+    def snapshot(self):
+        """The counts plus everybody inside, with their department and the time they came in."""
+        with self._lock:
+            people = [
+                {
+                    'pin': pin,
+                    'name': self.name(pin),
+                    'department': self.department(pin),
+                    'since': since,
+                    'last_device': self.last_seen[pin][1],
+                }
+                for pin, since in sorted(self.inside.items(), key=lambda item: item[1])
+            ]
+        return {**self.counts(), 'events': self.events, 'people': people}
+
+
+async def _poll_pin(fetcher, tracker, pin, today):
+    # The API filters by day, so re-read the high-water day and skip what was already applied
+    high_water = tracker.high_water.get(pin)
+    start = high_water.split(' ')[0] if high_water else (
+        datetime.now() - timedelta(hours=MAX_PERIOD_HOURS)).date().isoformat()
+    try:
+        transactions = await fetch_transactions_range_async(fetcher, pin, start, today)
+    except requests.RequestException as e:
+        print(f"Could not poll the transactions of PIN #{pin}: {e}")
+        return 0
+    punches = sorted((t['eventTime'], t.get('devName', '')) for t in transactions if t.get('eventTime'))
+    return sum(tracker.apply(pin, event_time, device_name) for event_time, device_name in punches)
+
+
+async def poll(fetcher, tracker, pins_per_poll=OCCUPANCY_PINS_PER_POLL):
+    """Applies the new punches of the next `pins_per_poll` PINs; returns how many there were."""
+    today = date.today().isoformat()
+    pins = tracker.next_pins(pins_per_poll)
+    applied = await asyncio.gather(*(_poll_pin(fetcher, tracker, pin, today) for pin in pins))
+    tracker.expire()
+    tracker.updated = datetime.now().strftime(TIME_FORMAT)
+    return sum(applied)
+
+
+async def track(tracker, interval=OCCUPANCY_POLL_SECONDS, pins_per_poll=OCCUPANCY_PINS_PER_POLL):
+    """Polls every `interval` seconds, printing the headcount after every poll.
+
+    A poll that takes longer than the interval is reported, and the next one starts right away.
+    """
+    # Live data must not come from the response cache
+    async with AsyncFetcher(use_cache=False) as fetcher:
+        while True:
+            # Profile one poll at a time, so the figures do not pile up while tracking
+            PROFILE.reset()
+            started = time.perf_counter()
+            new_punches = await poll(fetcher, tracker, pins_per_poll)
+            took = time.perf_counter() - started
+            counts = tracker.counts()
+            print(f"{counts['as_of']}: {counts['inside']} inside, {new_punches} new punches (poll took {took:.2f}s)")
+            if took > interval:
+                print(f"Warning: the poll took {took:.1f}s, longer than the {interval:g}s interval; the counts lag "
+                      f"behind. Raise --interval or lower --pins-per-poll.")
+            await asyncio.sleep(max(0.0, interval - took))
+
+
+class OccupancyHandler(BaseHTTPRequestHandler):
+    tracker = None # Set by create_server()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/')
+        if path == '/occupancy':
+            status, body = 200, self.tracker.snapshot()
+        elif path == '/occupancy/departments':
+            status, body = 200, self.tracker.counts()
+        else:
+            status, body = 404, {'error': 'Not found'}
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def create_server(tracker, host=OCCUPANCY_HOST, port=OCCUPANCY_PORT):
+    handler = type('BoundOccupancyHandler', (OccupancyHandler,), {'tracker': tracker})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tracks who is in the building right now.")
+    parser.add_argument("--dept", action="append", dest="dept_codes", help="Only track this department code (repeatable)")
+    parser.add_argument("--interval", type=float, default=OCCUPANCY_POLL_SECONDS, help="Seconds between polls")
+    parser.add_argument("--pins-per-poll", type=int, default=OCCUPANCY_PINS_PER_POLL,
+                        help="Employees polled per poll, one request each; keep it below interval x request rate")
+    parser.add_argument("--host", default=OCCUPANCY_HOST)
+    parser.add_argument("--port", type=int, default=OCCUPANCY_PORT)
+    args = parser.parse_args(argv)
+    if args.pins_per_poll < 1:
+        parser.error("--pins-per-poll must be at least 1")
+
+    try:
+        people = load_roster(args.dept_codes)
+    except (requests.RequestException, ValueError) as e:
+        print(f"Could not load the roster: {e}")
+        return
+    tracker = OccupancyTracker(people)
+    server = create_server(tracker, args.host, args.port)
+    threading.Thread(target=server.serve_forever, name="occupancy-http", daemon=True).start()
+    rounds = -(-len(people) // args.pins_per_poll)
+    print(f"Tracking {len(people)} employees, {min(args.pins_per_poll, len(people))} per poll "
+          f"(everybody every {rounds * args.interval:g}s), snapshots on http://{args.host}:{args.port}/occupancy")
+    try:
+        asyncio.run(track(tracker, args.interval, args.pins_per_poll))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import numpy
+import pandas
+
+from configs import MAX_PERIOD_HOURS
+from punches import IN, OUT, UNKNOWN
+from transactions import transaction_direction
+
+PERIOD_COLUMNS = ['pin', 'start', 'end', 'status']
+
+
+def transactions_frame(transactions):
+    """Builds the pin/event_time/direction frame the pairing engine works on from API transactions."""
+    df = pandas.DataFrame(
+        [(t.get('pin'), t['eventTime'], t.get('devName', '')) for t in transactions],
+        columns=['pin', 'event_time', 'dev_name'],
+    )
+    df['event_time'] = pandas.to_datetime(df['event_time'], format='%Y-%m-%d %H:%M:%S')
+    df['direction'] = df['dev_name'].map(transaction_direction)
+    return df
+
+
+def _pair(pins, times, directions, max_period):
+    """The pairing state machine over plain lists, see pair_transactions().
+
+    `times` are epoch seconds and `directions` punches.IN/OUT/UNKNOWN codes. Returns the
+    periods as lists (pins, starts, ends, statuses) with None for a missing start or end.
+    """
+    out_pins, starts, ends, statuses = [], [], [], []
+
+    def emit(pin, start, end, status):
+        out_pins.append(pin)
+        starts.append(start)
+        ends.append(end)
+        statuses.append(status)
+
+    current_pin = None
+    open_start = None
+    for pin, event_time, direction in zip(pins, times, directions):
+        if pin != current_pin:
+            if open_start is not None:
+                emit(current_pin, open_start, None, 'missing_out')
+            current_pin, open_start = pin, None
+
+        if direction == UNKNOWN:
+            direction = OUT if open_start is not None else IN
+
+        if direction == IN:
+            if open_start is not None:
+                emit(pin, open_start, None, 'missing_out')
+            open_start = event_time
+        elif open_start is None:
+            emit(pin, None, event_time, 'missing_in')
+        elif event_time - open_start > max_period:
+            emit(pin, open_start, None, 'missing_out')
+            emit(pin, None, event_time, 'missing_in')
+            open_start = None
+        else:
+            emit(pin, open_start, event_time, 'paired')
+            open_start = None
+
+    if open_start is not None:
+        emit(current_pin, open_start, None, 'missing_out')
+    return out_pins, starts, ends, statuses
+
+
+def _periods_frame(pins, starts, ends, statuses):
+    def to_datetime(seconds):
+        values = numpy.array([numpy.nan if s is None else s for s in seconds], dtype='float64')
+        return pandas.to_datetime(values, unit='s')
+
+    return pandas.DataFrame({
+        'pin': pins,
+        'start': to_datetime(starts),
+        'end': to_datetime(ends),
+        'status': statuses,
+    }, columns=PERIOD_COLUMNS)
+
+
+def pair_punches(batch, max_period_hours=MAX_PERIOD_HOURS):
+    """Pairs the IN/OUT punches of a PunchBatch into presence periods, see pair_transactions()."""
+    batch = batch.sorted()
+    periods = _pair(batch.pin.tolist(), batch.event_time.tolist(), batch.direction.tolist(),
+                    int(max_period_hours * 3600))
+    return _periods_frame(*periods)
+
+
+def pair_transactions(df, max_period_hours=MAX_PERIOD_HOURS):
+    """Pairs IN/OUT punches into presence periods for every PIN in one linear pass.
+
+    `df` needs the columns pin, event_time and direction ('in', 'out' or None for
+    devices that are not turnstiles). The punches are sorted once, then a state
+    machine walks them:
+
+    - IN opens a period; an IN while a period is already open closes the old one
+      as 'missing_out' (the employee left without tapping).
+    - OUT closes the open period as 'paired'; an OUT with nothing open becomes a
+      'missing_in' period.
+    - A punch without a known direction alternates: it closes an open period and
+      opens one otherwise, like the old pairing did.
+    - An OUT more than `max_period_hours` after its IN is treated as two
+      unrelated punches, so one forgotten tap does not produce a multi-day shift.
+
+    Periods may cross midnight; see split_at_midnight(). Returns a DataFrame with
+    the columns pin, start, end (NaT where missing) and status. pair_punches() does
+    the same for a PunchBatch without going through a DataFrame.
+    """
+    ordered = df.sort_values(['pin', 'event_time'], kind='stable')
+    times = ordered['event_time'].to_numpy().astype('datetime64[s]').astype('int64')
+    directions = ordered['direction'].map({'in': IN, 'out': OUT}).fillna(UNKNOWN).astype('int8')
+    periods = _pair(ordered['pin'].tolist(), times.tolist(), directions.tolist(), int(max_period_hours * 3600))
+    return _periods_frame(*periods)
+
+
+def split_at_midnight(periods):
+    """Splits paired periods that cross midnight into one piece per calendar day.
+
+    Adds a `date` column (the day each piece belongs to, taken from whichever end is
+    known for unpaired periods) and a `duration` column (NaT for unpaired periods).
+    """
+    periods = periods.copy()
+    periods['date'] = periods['start'].fillna(periods['end']).dt.normalize()
+    paired = periods['status'] == 'paired'
+    crossing = paired & (periods['end'].dt.normalize() > periods['date'])
+
+    pieces = [periods[~crossing]]
+    remaining = periods[crossing]
+    while not remaining.empty:
+        next_midnight = remaining['date'] + pandas.Timedelta(days=1)
+        head = remaining.assign(end=next_midnight)
+        tail = remaining.assign(start=next_midnight, date=next_midnight)
+        pieces.append(head)
+        one_day = pandas.Timedelta(days=1)
+        remaining = tail[tail['end'] > tail['start'] + one_day]
+        pieces.append(tail[(tail['end'] > tail['start']) & (tail['end'] <= tail['start'] + one_day)])
+
+    result = pandas.concat(pieces)
+    result['_order'] = result['start'].fillna(result['end'])
+    result = result.sort_values(['pin', 'date', '_order'], kind='stable').drop(columns='_order')
+    result['duration'] = (result['end'] - result['start']).where(result['status'] == 'paired')
+    return result.reset_index(drop=True)
@@ -0,0 +1,275 @@
+"""Index of who was on site when, built from the punches in the local transaction store.
+
+    python presence_index.py update
+    python presence_index.py at "2025-08-14 19:30"
+    python presence_index.py between "2025-08-14 19:00" "2025-08-14 22:00" --output present.csv
+
+The paired IN/OUT periods (see pairing.py) are split at midnight, so every piece belongs to
+exactly one day, and kept as one sorted array per day partition. A query binary-searches
+its day partition, whatever the size of the organization and the length of the history.
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+
+import numpy
+import pandas
+import requests
+
+from configs import PRESENCE_INDEX_FILE
+from pairing import pair_punches, split_at_midnight
+from punches import SECONDS_PER_DAY, PunchBatch
+from roster import load_roster
+from transaction_store import TransactionStore
+
+PRESENCE_COLUMNS = ['ID', 'FIO', 'Department', 'From', 'To', 'Minutes']
+
+
+def to_seconds(moment):
+    """'YYYY-MM-DD HH:MM[:SS]' (or a datetime) as seconds since 1970-01-01 of the same wall-clock time.
+
+    Numbers are taken to be such seconds already.
+    """
+    if isinstance(moment, (int, numpy.integer)):
+        return int(moment)
+    return int(numpy.datetime64(pandas.Timestamp(moment).to_datetime64(), 's').astype('int64'))
+
+
+class PresenceIndex:
+    """Presence periods of the whole organization as arrays sorted by (day, start).
+
+    - pin, start, end: one entry per period piece, times as epoch seconds; [start, end)
+    - day: the day number (seconds // 86400) of the piece, which also makes up the partitions
+    - ends: the end times sorted within each day partition, for counting
+    - longest: the longest piece of each day present in `days`
+    - store_rowid: the newest transaction store row the index has seen
+
+    Only paired periods are indexed: a punch without its partner says nothing about
+    how long the employee stayed.
+    """
+
+    def __init__(self, pin, start, end, store_rowid=0):
+        self.store_rowid = store_rowid
+        order = numpy.lexsort((start, start // SECONDS_PER_DAY))
+        self.pin = pin[order]
+        self.start = start[order]
+        self.end = end[order]
+        self.day = self.start // SECONDS_PER_DAY
+        self.ends = self.end[numpy.lexsort((self.end, self.day))]
+        self.days, first = numpy.unique(self.day, return_index=True)
+        self.longest = numpy.maximum.reduceat(self.end - self.start, first) if len(first) else numpy.empty(0, 'int64')
+
+    @classmethod
+    def empty(cls):
+        return cls(numpy.empty(0, 'int64'), numpy.empty(0, 'int64'), numpy.empty(0, 'int64'))
+
+    @classmethod
+    def from_punches(cls, punches):
+        """Pairs the punches of a PunchBatch and indexes the paired pieces."""
+        periods = split_at_midnight(pair_punches(punches))
+        periods = periods[(periods['status'] == 'paired') & (periods['end'] > periods['start'])]
+        return cls(
+            periods['pin'].to_numpy('int64'),
+            periods['start'].to_numpy().astype('datetime64[s]').astype('int64'),
+            periods['end'].to_numpy().astype('datetime64[s]').astype('int64'),
+        )
+
+    @classmethod
+    def load(cls, path=PRESENCE_INDEX_FILE):
+        if not os.path.exists(path):
+            return cls.empty()
+        with numpy.load(path) as data:
+            if 'store_rowid' not in data:
+                # Written before the index tracked the store's rows: build it again
+                return cls.empty()
+            return cls(data['pin'], data['start'], data['end'], int(data['store_rowid']))
+
+    def save(self, path=PRESENCE_INDEX_FILE):
+        with open(path, 'wb') as f:
+            numpy.savez(f, pin=self.pin, start=self.start, end=self.end, store_rowid=self.store_rowid)
+
+    def __len__(self):
+        return len(self.pin)
+
+    def last_day(self):
+        """The newest indexed day as 'YYYY-MM-DD', or None for an empty index."""
+        if not len(self.days):
+            return None
+        return str((self.days[-1] * SECONDS_PER_DAY).astype('datetime64[s]').astype('datetime64[D]'))
+
+    def updated(self, store):
+        """Returns the index with the punches added to the store since it was built.
+
+        Every PIN with new transactions is paired again from the day before its oldest new
+        one on (a new OUT may close a period that began that day, as periods are shorter
+        than MAX_PERIOD_HOURS); its older periods and the other PINs' are kept. New
+        punches for an older day (a PIN whose sync failed and was retried later) are
+        picked up like those of today.
+        """
+        changed, newest = store.changes_since(self.store_rowid)
+        if newest < self.store_rowid:
+            # A different or rebuilt store: start from scratch
+            return PresenceIndex.empty().updated(store)
+        changed = {
+            int(pin): (datetime.fromisoformat(event_time.split(' ')[0]) - timedelta(days=1)).date().isoformat()
+            for pin, event_time in changed.items() if pin.isdigit()
+        }
+        if not changed:
+            return PresenceIndex(self.pin, self.start, self.end, newest)
+
+        changed_pins = numpy.array(sorted(changed), 'int64')
+        first_days = numpy.array([to_seconds(changed[pin]) // SECONDS_PER_DAY for pin in changed_pins], 'int64')
+
+        def repaired(pins, days):
+            # From its PIN's first day to pair again on, a piece is replaced by the fresh pairing
+            slot = numpy.minimum(numpy.searchsorted(changed_pins, pins), len(changed_pins) - 1)
+            return (changed_pins[slot] == pins) & (days >= first_days[slot])
+
+        # Read one day more, so a period that crosses into the first new day gets its IN
+        punches = PunchBatch.concat([
+            PunchBatch.from_transactions(store.get_transactions(
+                pin, (datetime.fromisoformat(day) - timedelta(days=1)).date().isoformat()), pin=pin)
+            for pin, day in changed.items()
+        ])
+        fresh = PresenceIndex.from_punches(punches)
+        keep, fresh_keep = ~repaired(self.pin, self.day), repaired(fresh.pin, fresh.day)
+        return PresenceIndex(
+            numpy.concatenate([self.pin[keep], fresh.pin[fresh_keep]]),
+            numpy.concatenate([self.start[keep], fresh.start[fresh_keep]]),
+            numpy.concatenate([self.end[keep], fresh.end[fresh_keep]]),
+            newest,
+        )
+
+    def _partition(self, day):
+        """Returns (lo, hi, longest piece) of the day's partition."""
+        lo, hi = numpy.searchsorted(self.day, [day, day + 1])
+        slot = numpy.searchsorted(self.days, day)
+        longest = self.longest[slot] if slot < len(self.days) and self.days[slot] == day else 0
+        return lo, hi, longest
+
+    def count_at(self, moment):
+        """How many people were on site at the moment: two binary searches."""
+        t = to_seconds(moment)
+        lo, hi, _ = self._partition(t // SECONDS_PER_DAY)
+        started = numpy.searchsorted(self.start[lo:hi], t, 'right')
+        ended = numpy.searchsorted(self.ends[lo:hi], t, 'right')
+        return int(started - ended)
+
+    def overlapping(self, start, end):
+        """Returns the positions of the pieces that overlap [start, end) (epoch seconds)."""
+        hits = []
+        for day in range(start // SECONDS_PER_DAY, (end - 1) // SECONDS_PER_DAY + 1):
+            lo, hi, longest = self._partition(day)
+            # A piece overlapping the window starts at most `longest` before it
+            first = lo + numpy.searchsorted(self.start[lo:hi], start - longest, 'left')
+            last = lo + numpy.searchsorted(self.start[lo:hi], end, 'left')
+            candidates = numpy.arange(first, last)
+            hits.append(candidates[self.end[candidates] > start])
+        return numpy.concatenate(hits) if hits else numpy.empty(0, 'int64')
+
+    def present_between(self, start, end):
+        """One row per person on site at any time in [start, end): pin, first, last, minutes overlapped."""
+        start, end = to_seconds(start), to_seconds(end)
+        hits = self.overlapping(start, end)
+        overlap = numpy.minimum(self.end[hits], end) - numpy.maximum(self.start[hits], start)
+        frame = pandas.DataFrame({
+            'pin': self.pin[hits],
+            'from': self.start[hits].astype('datetime64[s]'),
+            'to': self.end[hits].astype('datetime64[s]'),
+            'seconds': overlap,
+        })
+        people = frame.groupby('pin', sort=True).agg(first=('from', 'min'), last=('to', 'max'), seconds=('seconds', 'sum'))
+        people['minutes'] = people.pop('seconds') // 60
+        return people.reset_index()
+
+    def present_at(self, moment):
+        """Same as present_between() for a single moment."""
+        t = to_seconds(moment)
+        return self.present_between(t, t + 1)
+
+
+def presence_sheet(present, people):
+    """Adds the names and departments from the roster to present_between()'s result."""
+    names = {int(p['pin']): p for p in people if str(p['pin']).isdigit()}
+    return pandas.DataFrame({
+        'ID': present['pin'],
+        'FIO': [f"{names.get(pin, {}).get('name', '')} {names.get(pin, {}).get('lastName', '')}".strip() or "N/A"
+                for pin in present['pin']],
+        'Department': [names.get(pin, {}).get('deptName', 'N/A') for pin in present['pin']],
+        'From': present['first'].dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'To': present['last'].dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'Minutes': present['minutes'],
+    }, columns=PRESENCE_COLUMNS)
+
+
+def update_index(path=PRESENCE_INDEX_FILE, rebuild=False):
+    """Brings the saved index up to date with the transaction store and returns it."""
+    index = PresenceIndex.empty() if rebuild else PresenceIndex.load(path)
+    with TransactionStore() as store:
+        index = index.updated(store)
+    index.save(path)
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answers who was on site at a time or during a time window.")
+    parser.add_argument("--index", default=PRESENCE_INDEX_FILE, help="Index file")
+    parser.add_argument("--no-update", action="store_true",
+                        help="Query the saved index without first adding the new punches from the store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    update_parser = subparsers.add_parser("update", help="Add the new punches of the transaction store to the index")
+    update_parser.add_argument("--rebuild", action="store_true", help="Build the index from scratch")
+    at_parser = subparsers.add_parser("at", help="Who was on site at this moment")
+    at_parser.add_argument("moment", help="'YYYY-MM-DD HH:MM'")
+    between_parser = subparsers.add_parser("between", help="Who was on site at any time in this window")
+    between_parser.add_argument("start", help="'YYYY-MM-DD HH:MM'")
+    between_parser.add_argument("end", help="'YYYY-MM-DD HH:MM'")
+    for query_parser in (at_parser, between_parser):
+        query_parser.add_argument("--output", help="Also save the list as csv or xlsx")
+    args = parser.parse_args(argv)
+    moments = {"update": [], "at": [getattr(args, "moment", None)],
+               "between": [getattr(args, "start", None), getattr(args, "end", None)]}[args.command]
+    for moment in moments:
+        try:
+            to_seconds(moment)
+        except ValueError:
+            parser.error(f"invalid time '{moment}', use 'YYYY-MM-DD HH:MM'")
+
+    if args.command == "update" or not args.no_update:
+        index = update_index(args.index, rebuild=args.command == "update" and args.rebuild)
+        print(f"Indexed {len(index)} presence periods through {index.last_day() or 'no day yet'}.")
+    else:
+        index = PresenceIndex.load(args.index)
+    if args.command == "update":
+        return
+
+    if args.command == "at":
+        present = index.present_at(args.moment)
+        window = f"at {args.moment}"
+    else:
+        if to_seconds(args.end) <= to_seconds(args.start):
+            parser.error("the end of the window must be after its start")
+        present = index.present_between(args.start, args.end)
+        window = f"between {args.start} and {args.end}"
+    try:
+        people = load_roster()
+    except (requests.RequestException, ValueError) as e:
+        print(f"Could not load the roster: {e}. Showing PINs only.")
+        people = []
+    sheet = presence_sheet(present, people)
+    if args.command == "at":
+        sheet = sheet.drop(columns='Minutes')
+
+    print(f"{len(sheet)} people on site {window}:")
+    if len(sheet):
+        print(sheet.to_string(index=False))
+    if args.output:
+        if args.output.endswith('.csv'):
+            sheet.to_csv(args.output, index=False)
+        else:
+            sheet.to_excel(args.output, index=False)
+        print(f"Saved as {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from configs import REPORT_EXCEL_ENGINE, RENDER_WORKERS
+from instrumentation import PROFILE
+from report_writer import excel_writer_class
+from summary import read_report
+
+MAX_SHEET_NAME = 31 # Excel's limit
+
+
+def _safe_name(name, limit=None):
+    """Turns a department name into something usable as a file or sheet name."""
+    name = re.sub(r'[\\/:*?"<>|\[\]]+', '_', str(name)).strip() or 'N_A'
+    return name[:limit] if limit else name
+
+
+def _unique_name(name, used, limit=None):
+    """Returns the name, or the name with a numeric suffix when it is taken, and marks it as used.
+
+    Names are compared case-insensitively, like Excel sheet names and many file systems do.
+    """
+    candidate, number = name, 1
+    while candidate.lower() in used:
+        number += 1
+        suffix = f"_{number}"
+        candidate = f"{name[:limit - len(suffix)] if limit else name}{suffix}"
+    used.add(candidate.lower())
+    return candidate
+
+
+def render_workbook(sheets, path, engine=REPORT_EXCEL_ENGINE):
+    """Writes {sheet name: report DataFrame} as one styled workbook and returns the path.
+
+    The first DataFrame always goes to the "Report" sheet.
+    """
+    writer = excel_writer_class(engine)(path)
+    with writer:
+        for index, (sheet_name, df) in enumerate(sheets.items()):
+            if index == 0:
+                writer.write(df)
+            else:
+                writer.write_sheet(sheet_name, df)
+    return path
+
+
+def render_department_sheets(report_df, path, engine=REPORT_EXCEL_ENGINE):
+    """Writes one workbook with the whole report first and then one sheet per department.
+
+    A single workbook can only be written by one process, so this runs sequentially;
+    use render_department_files() to spread the work over the CPU cores.
+    """
+    sheets = {"Report": report_df}
+    used = {"report"}
+    for department, rows in report_df.groupby('Department', sort=True):
+        sheets[_unique_name(_safe_name(department, MAX_SHEET_NAME), used, MAX_SHEET_NAME)] = rows
+    with PROFILE.stage('render'):
+        return render_workbook(sheets, path, engine)
+
+
+def render_department_files(report_df, output_dir, engine=REPORT_EXCEL_ENGINE, workers=RENDER_WORKERS):
+    """Writes every department's rows as its own styled workbook, in parallel worker processes.
+
+    Departments whose names give the same file name get a numeric suffix.
+    Returns {department: file path}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    used = set()
+    with PROFILE.stage('render'), ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for department, rows in report_df.groupby('Department', sort=True):
+            path = os.path.join(output_dir, f"{_unique_name(_safe_name(department), used)}.xlsx")
+            futures[pool.submit(render_workbook, {"Report": rows}, path, engine)] = department
+        for future in as_completed(futures):
+            department = futures[future]
+            try:
+                paths[department] = future.result()
+            except Exception as e:
+                print(f"Rendering the report of {department} failed: {e}")
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Renders a report as styled per-department workbooks.")
+    parser.add_argument("report", help="Report file written by report_attendance.py (xlsx, csv or parquet)")
+    parser.add_argument("--split", choices=["files", "sheets"], default="files",
+                        help="One workbook per department (in parallel) or one workbook with a sheet per department")
+    parser.add_argument("--output", help="Output folder (files) or workbook (sheets)")
+    parser.add_argument("--engine", choices=["auto", "openpyxl", "xlsxwriter"], default=REPORT_EXCEL_ENGINE,
+                        help="Excel writer to use")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    report_df = read_report(args.report)
+    root = os.path.splitext(args.report)[0]
+    if args.split == "files":
+        output_dir = args.output or f"{root}_departments"
+        paths = render_department_files(report_df, output_dir, args.engine, args.workers)
+        print(f"Rendered {len(paths)} department reports into {output_dir}")
+    else:
+        output = args.output or f"{root}_by_department.xlsx"
+        render_department_sheets(report_df, output, args.engine)
+        print(f"Rendered the report with one sheet per department as {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,156 +1,468 @@
+import argparse
+import asyncio
+import os
 import requests
-import pandas
-from datetime import datetime, timedelta
+from collections import deque
+from datetime import date, timedelta
+from functools import partial
 from configs import BASE_URL, ACCESS_TOKEN, MAX_WORKERS, NUMBER_OF_DAYS
-from configs import PLANNED_START_TIME, PLANNED_END_TIME, PLANNED_WORK_DURATION_MINUTES
+from configs import TRANSACTION_FETCH_MODE, CONCURRENCY_LIMIT, REPORT_OUTPUT_FILE, RUN_PROFILE_FILE
+from configs import REPORT_EXCEL_ENGINE
+from anomalies import find_anomalies
+from checkpoint import SweepCheckpoint
+from fetch_engine import AsyncFetcher
+from http_client import shared_cache
+from instrumentation import PROFILE
+from metrics import build_report
+from punches import fetch_punches_range_async
+from render import render_department_files, render_department_sheets
+from report_rows import ReportRowStore, row_day
+from report_writer import BatchedReport, open_report_writer
+from roster import load_roster, pin_sort_key
+from sites import DEFAULT_SITE, load_sites, merge_rows
+from summary import SummaryCollector, read_report
+from transaction_store import TransactionStore
+from transactions import first_last_url
 
-all_records = []
 
-for pin_id in range(1, MAX_WORKERS):
-    user_info = {}
-    # 1. First, get the employee's basic information
-    try:
-        user_info_url = f"{BASE_URL}/api/person/get/{pin_id}?access_token={ACCESS_TOKEN}"
-        response = requests.get(user_info_url, timeout=10)
-        if response.status_code == 200:
-            user_data = response.json().get('data', {})
-            if user_data: # Check if data is not None or empty
-                user_info['name'] = user_data.get('name', '')
-                user_info['lastName'] = user_data.get('lastName', '')
-                user_info['deptName'] = user_data.get('deptName', 'N/A')
-            else:
-                print(f"PIN #{pin_id} exists but returned no data. Skipping.")
-                continue
-        else:
-            print(f"Could not find user with PIN #{pin_id}. Skipping.")
-            continue
-    except requests.RequestException as e:
-        print(f"Error fetching user info for PIN #{pin_id}: {e}. Skipping.")
-        continue
-
-    # 2. Now, get the attendance records for this employee
-    first_last_url = (
-        f"{BASE_URL}/api/v2/transaction/firstInAndLastOut/{pin_id}?"
-        f"pageNo=1&pageSize={NUMBER_OF_DAYS}&access_token={ACCESS_TOKEN}"
+async def fetch_transaction_count(fetcher, pin_id, date_str):
+    """Returns the number of transactions the PIN made on the given day."""
+    trans_url = (
+        f"{BASE_URL}/api/v2/transaction/person/{pin_id}?"
+        f"startDate={date_str}&endDate={date_str}&access_token={ACCESS_TOKEN}"
     )
-    try:
-        response = requests.get(first_last_url, timeout=10)
-        response.raise_for_status()
+    trans_response = await fetcher.get(trans_url)
+    trans_response.raise_for_status()
+    with PROFILE.stage('parse'):
+        data_dict = trans_response.json().get('data')
+    if isinstance(data_dict, dict):
+        return data_dict.get('total', 0)
+    return 0
+
+
+async def fetch_transaction_counts(fetcher, pin_id, dates):
+    """Returns the transaction count for each of the given days, in the same order."""
+    if not dates:
+        return []
+    if TRANSACTION_FETCH_MODE == "daily":
+        return await asyncio.gather(*(fetch_transaction_count(fetcher, pin_id, date_str) for date_str in dates))
+
+    # One paginated range query for the whole window instead of one request per day
+    punches = await fetch_punches_range_async(fetcher, pin_id, min(dates), max(dates))
+    with PROFILE.stage('parse'):
+        days = punches.daily()
+        counts = dict(zip(days['date'].dt.strftime('%Y-%m-%d'), days['count'].tolist()))
+    return [counts.get(date_str, 0) for date_str in dates]
+
+
+async def fetch_user_info(fetcher, pin_id):
+    """Returns the employee's name and department, or None if there is no such employee."""
+    user_info_url = f"{BASE_URL}/api/person/get/{pin_id}?access_token={ACCESS_TOKEN}"
+    response = await fetcher.get(user_info_url)
+    if response.status_code != 200:
+        print(f"Could not find user with PIN #{pin_id}. Skipping.")
+        return None
+    with PROFILE.stage('parse'):
+        user_data = response.json().get('data', {})
+    if not user_data: # Check if data is not None or empty
+        print(f"PIN #{pin_id} exists but returned no data. Skipping.")
+        return None
+    return {
+        'name': user_data.get('name', ''),
+        'lastName': user_data.get('lastName', ''),
+        'deptName': user_data.get('deptName', 'N/A'),
+    }
+
+
+def complete_days(daily_records):
+    """Returns the dates of the records that have both a first-in and a last-out time."""
+    return [
+        record['firstInTime'].split(' ')[0]
+        for record in daily_records
+        if record.get('firstInTime') and record.get('lastOutTime')
+    ]
+
+
+def build_rows(pin_id, user_info, daily_records, transaction_counts):
+    """Turns one employee's first-in/last-out records into raw report rows.
+
+    `transaction_counts` holds the count for each day in complete_days(daily_records),
+    in the same order. The metrics themselves are computed for all rows at once by
+    metrics.build_report().
+    """
+    employee = {
+        "ID": pin_id,
+        "FIO": f"{user_info.get('name', '')} {user_info.get('lastName', '')}".strip(),
+        "Department": user_info.get('deptName', 'N/A'),
+    }
+    # An employee with NO attendance records at all still gets one row
+    if not daily_records:
+        return [{**employee, "firstInTime": None, "lastOutTime": None, "Transaction count": 0}]
+
+    transaction_counts = iter(transaction_counts)
+    records = []
+    for record in daily_records:
+        first_in_str = record.get('firstInTime')
+        last_out_str = record.get('lastOutTime')
+        if not first_in_str and not last_out_str:
+            raise ValueError(f"record without any timestamps: {record}")
+        records.append({
+            **employee,
+            "firstInTime": first_in_str,
+            "lastOutTime": last_out_str,
+            "Transaction count": next(transaction_counts) if first_in_str and last_out_str else "N/A",
+        })
+    return records
+
+
+async def fetch_daily_records(fetcher, pin_id, page_size=NUMBER_OF_DAYS):
+    """Returns the PIN's newest `page_size` first-in/last-out records, newest first."""
+    response = await fetcher.get(first_last_url(pin_id, page_size))
+    response.raise_for_status()
+    with PROFILE.stage('parse'):
         data = response.json()
-        
-        daily_records = data.get('data', {}).get('data', [])
+    return data.get('data', {}).get('data', [])
+
 
-        # 3. Handle case where the employee has NO attendance records at all
+async def process_pin(fetcher, pin_id, person=None):
+    """Fetches everything for one PIN and returns its report rows.
+
+    Returns an empty list if there is no such employee and None if the PIN failed
+    (network or parse errors that persisted through the retries). When the roster
+    already supplied the employee's `person` info, the per-PIN /api/person/get
+    lookup is skipped.
+    """
+    try:
+        # 1. First, get the employee's basic information
+        user_info = person or await fetch_user_info(fetcher, pin_id)
+        if not user_info:
+            return []
+
+        # 2. Now, get the attendance records for this employee
+        daily_records = await fetch_daily_records(fetcher, pin_id)
         if not daily_records:
             print(f"No attendance records found for PIN #{pin_id}.")
-            all_records.append({
-                "ID": pin_id,
-                "FIO": f"{user_info.get('name', '')} {user_info.get('lastName', '')}".strip(),
-                "Department": user_info.get('deptName', 'N/A'),
-                "Date": "N/A",
-                "Day of the week": "N/A",
-                "Schedule": "N/A",
-                "Planned time": "N/A",
-                "Actual attendance": "No records found",
-                "Actual Time": "No records found",
-                "Transaction count": 0,
-                "Late": "N/A",
-                "Overwork": "N/A",
-                "difference": "N/A"
-            })
-            continue
+            return build_rows(pin_id, user_info, daily_records, [])
 
         print(f"Processing PIN #{pin_id}. Found {len(daily_records)} daily records.")
-        
-        # 4. Process each daily record found
-        for record in daily_records:
-            first_in_str = record.get('firstInTime')
-            last_out_str = record.get('lastOutTime')
-
-            # 5. Handle case where a specific day has INCOMPLETE data
-            if not first_in_str or not last_out_str:
-                # Try to get the date from whichever timestamp is available
-                date_source_str = first_in_str or last_out_str
-                attendance_date_str = date_source_str.split(' ')[0]
-                day_of_week = datetime.strptime(attendance_date_str, '%Y-%m-%d').strftime('%A')
-                
-                all_records.append({
-                    "ID": pin_id,
-                    "FIO": f"{user_info.get('name', '')} {user_info.get('lastName', '')}".strip(),
-                    "Department": user_info.get('deptName', 'N/A'),
-                    "Date": attendance_date_str,
-                    "Day of the week": day_of_week,
-                    "Schedule": f"{PLANNED_START_TIME.strftime('%H:%M')} - {PLANNED_END_TIME.strftime('%H:%M')}",
-                    "Planned time": PLANNED_WORK_DURATION_MINUTES,
-                    "Actual attendance": "Incomplete Data",
-                    "Actual Time": "Incomplete Data",
-                    "Transaction count": "N/A",
-                    "Late": "Incomplete Data",
-                    "Overwork": "Incomplete Data",
-                    "difference": "Incomplete Data"
-                })
-                continue # Move to the next day's record
-
-            # 6. Process a normal, complete daily record
-            first_in_dt = datetime.strptime(first_in_str, '%Y-%m-%d %H:%M:%S')
-            last_out_dt = datetime.strptime(last_out_str, '%Y-%m-%d %H:%M:%S')
-            
-            attendance_date = first_in_dt.date()
-            planned_start_dt = datetime.combine(attendance_date, PLANNED_START_TIME)
-            planned_end_dt = datetime.combine(attendance_date, PLANNED_END_TIME)
-
-            actual_duration = last_out_dt - first_in_dt
-            actual_duration_minutes = actual_duration.total_seconds() / 60
-            
-            lateness = max(first_in_dt - planned_start_dt, timedelta(0))
-            overwork = max(last_out_dt - planned_end_dt, timedelta(0))
-            difference_minutes = actual_duration_minutes - PLANNED_WORK_DURATION_MINUTES
-            
-            date_str = attendance_date.strftime('%Y-%m-%d')
-            day_of_week = first_in_dt.strftime('%A')
-            
-            transaction_count = 0
-            trans_url = (
-                f"{BASE_URL}/api/v2/transaction/person/{pin_id}?"
-                f"startDate={date_str}&endDate={date_str}&access_token={ACCESS_TOKEN}"
-            )
-            try:
-                trans_response = requests.get(trans_url, timeout=10)
-                trans_response.raise_for_status()
-                trans_data = trans_response.json()
-                data_dict = trans_data.get('data')
-                if isinstance(data_dict, dict):
-                    transaction_count = data_dict.get('total', 0)
-            except requests.RequestException as e:
-                print(f"Could not fetch transaction count for PIN #{pin_id} on {date_str}. Error: {e}")
-
-            all_records.append({
-                "ID": pin_id,
-                "FIO": f"{user_info.get('name', '')} {user_info.get('lastName', '')}".strip(),
-                "Department": user_info.get('deptName', 'N/A'),
-                "Date": date_str,
-                "Day of the week": day_of_week,
-                "Schedule": f"{PLANNED_START_TIME.strftime('%H:%M')} - {PLANNED_END_TIME.strftime('%H:%M')}",
-                "Planned time": PLANNED_WORK_DURATION_MINUTES,
-                "Actual attendance": f"{first_in_dt.strftime('%H:%M:%S')} - {last_out_dt.strftime('%H:%M:%S')}",
-                "Actual Time": str(actual_duration),
-                "Transaction count": transaction_count,
-                "Late": str(lateness),
-                "Overwork": str(overwork),
-                "difference": f"{difference_minutes:.0f} min"
-            })
+        # 3. The per-day transaction counts are fetched up front, in record order
+        transaction_counts = await fetch_transaction_counts(fetcher, pin_id, complete_days(daily_records))
+        return build_rows(pin_id, user_info, daily_records, transaction_counts)
+
+    except requests.RequestException as e:
+        print(f"An error occurred while processing attendance for PIN #{pin_id}: {e}")
+    except (ValueError, KeyError):
+        print(f"Could not parse attendance data for PIN #{pin_id}.")
+    return None
+
+
+async def process_pin_incremental(fetcher, pin_id, person=None, row_store=None, today=None):
+    """Like process_pin(), but only fetches the days that are not final in the row store yet.
 
+    The rows of final days come from `row_store` (a ReportRowStore); only the days
+    after the newest final one are fetched and computed again. The merged rows are
+    written back to the store. Returns the same as process_pin().
+    """
+    today = today or date.today()
+    stored = row_store.rows(pin_id)
+    final_days = {day for day, _, final in stored if final}
+    newest_final = max(final_days) if final_days else None
+    # At most one record per day, so this many records reach back past the newest final day
+    page_size = NUMBER_OF_DAYS
+    if newest_final:
+        page_size = min(NUMBER_OF_DAYS, (today - date.fromisoformat(newest_final)).days)
+
+    try:
+        user_info = person or await fetch_user_info(fetcher, pin_id)
+        if not user_info:
+            return []
+        daily_records = await fetch_daily_records(fetcher, pin_id, page_size) if page_size > 0 else []
+        daily_records = [r for r in daily_records if row_day(r) not in final_days]
+        transaction_counts = await fetch_transaction_counts(fetcher, pin_id, complete_days(daily_records))
+        new_rows = build_rows(pin_id, user_info, daily_records, transaction_counts) if daily_records else []
     except requests.RequestException as e:
         print(f"An error occurred while processing attendance for PIN #{pin_id}: {e}")
+        return None
+    except (ValueError, KeyError):
+        print(f"Could not parse attendance data for PIN #{pin_id}.")
+        return None
+
+    # Fresh rows replace the stored ones of the same day; keep the newest NUMBER_OF_DAYS like a full sweep
+    by_day = {day: row for day, row, _ in stored}
+    by_day.update((row_day(row), row) for row in new_rows)
+    rows = [by_day[day] for day in sorted(by_day, reverse=True)[:NUMBER_OF_DAYS]]
+    row_store.replace(pin_id, rows, today)
+    if new_rows:
+        print(f"Processing PIN #{pin_id}. {len(new_rows)} new or open days.")
+    return rows or build_rows(pin_id, user_info, [], [])
+
+
+def _pin_and_person(person):
+    """Splits a roster entry (or a bare PIN) into the PIN and the known person info."""
+    if isinstance(person, dict):
+        return (int(person['pin']) if person['pin'].isdigit() else person['pin']), person
+    return person, None
+
+
+async def _finished(rows):
+    return rows
+
+
+async def sweep(people, on_rows, checkpoint=None, process=process_pin, fetcher=None):
+    """Processes employees concurrently and hands each one's rows to `on_rows` in PIN order.
+
+    `people` is a list of roster entries, or of bare PINs when they still have
+    to be probed one by one. Only a sliding window of employees is in flight or
+    waiting to be written at any time, so memory does not grow with the roster.
+    PINs already finished in the `checkpoint` are not fetched again, and newly
+    finished ones are recorded in it. `process(fetcher, pin, person)` produces
+    one PIN's rows (process_pin or process_pin_incremental). A long-lived
+    `fetcher` (e.g. the report service's) is used as is, otherwise the sweep
+    opens its own. Returns the PINs that failed.
+    """
+    if fetcher is None:
+        async with AsyncFetcher() as fetcher:
+            return await sweep(people, on_rows, checkpoint, process, fetcher)
+
+    window = CONCURRENCY_LIMIT * 4
+    failed = []
+
+    def emit(pin_id, rows):
+        if rows is None:
+            failed.append(pin_id)
+            return
+        if checkpoint is not None and checkpoint.rows_for(pin_id) is None:
+            checkpoint.record(pin_id, rows)
+        on_rows(rows)
+
+    pending = deque()
+    for person in people:
+        pin_id, person = _pin_and_person(person)
+        done_rows = checkpoint.rows_for(pin_id) if checkpoint is not None else None
+        if done_rows is not None:
+            task = asyncio.ensure_future(_finished(done_rows))
+        else:
+            task = asyncio.ensure_future(process(fetcher, pin_id, person))
+        pending.append((pin_id, task))
+        if len(pending) >= window:
+            pin_id, task = pending.popleft()
+            emit(pin_id, await task)
+    while pending:
+        pin_id, task = pending.popleft()
+        emit(pin_id, await task)
+    return failed
+
+
+def process_pin_from_store(store, pin_id, person=None):
+    """Builds the PIN's report rows from the local transaction store, without any API calls."""
+    start_date_str = (date.today() - timedelta(days=NUMBER_OF_DAYS - 1)).isoformat()
+    with PROFILE.stage('store'):
+        days = store.day_summaries(pin_id, start_date_str).values()
+    # Like firstInAndLastOut, a day with a single punch has no last-out time
+    daily_records = [
+        {'firstInTime': day['first_in'], 'lastOutTime': day['last_out'] if day['total'] > 1 else None}
+        for day in days
+    ]
+    transaction_counts = [day['total'] for day in days if day['total'] > 1]
+    try:
+        return build_rows(pin_id, person or {}, daily_records, transaction_counts)
     except (ValueError, KeyError):
-        print(f"Could not parse attendance data for PIN #{pin_id}. Skipping.")
-
-# --- Save to Excel ---
-if all_records:
-    print(f"\nProcessed all workers. Total records created: {len(all_records)}.")
-    report_df = pandas.DataFrame(all_records)
-    output_filename = "monthly_attendance_report_with_calculations.xlsx"
-    report_df.to_excel(output_filename, index=False)
-    print(f"Report successfully saved as {output_filename}")
-else:
-    print("No data was collected. The report was not generated.")
\ No newline at end of file
+        print(f"Could not parse stored attendance data for PIN #{pin_id}. Skipping.")
+        return []
+
+
+def sweep_from_store(people, on_rows):
+    """Same as sweep() but reads the transactions from the local store."""
+    with TransactionStore() as store:
+        if not people:
+            people = sorted(store.pins(), key=pin_sort_key)
+        for person in people:
+            on_rows(process_pin_from_store(store, *_pin_and_person(person)))
+
+
+def load_people(dept_codes=None, refresh=False, probe=False, site=None):
+    """Returns the roster to sweep, falling back to probing PINs 1..MAX_WORKERS."""
+    if not probe:
+        try:
+            return load_roster(dept_codes, refresh=refresh, site=site)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Could not load the roster: {e}. Falling back to probing PINs.")
+    return list(range(1, MAX_WORKERS))
+
+
+async def sweep_sites(sites, on_rows, dept_codes=None, refresh=False, probe=False):
+    """Sweeps all sites at once and hands each employee's merged rows to `on_rows` in PIN order.
+
+    Every site gets its own fetcher (connection pool, concurrency and rate limit), so
+    the sweep takes as long as the slowest site. An employee found at several sites
+    gets one row per day (see sites.merge_rows). Returns the failed PINs.
+    """
+    async def sweep_site(site):
+        people = await asyncio.to_thread(load_people, dept_codes, refresh, probe, site)
+        by_pin = {}
+
+        def collect(rows):
+            if rows:
+                pin = site.pin(rows[0]['ID'])
+                by_pin[pin] = [{**row, 'ID': pin} for row in rows]
+
+        async with site.fetcher() as fetcher:
+            failed = await sweep(people, collect, fetcher=fetcher)
+        print(f"Site {site.name}: {len(by_pin)} employees.")
+        return by_pin, [site.pin(pin_id) for pin_id in failed]
+
+    results = await asyncio.gather(*(sweep_site(site) for site in sites))
+    pins = set().union(*(by_pin for by_pin, _ in results))
+    for pin in sorted(pins, key=pin_sort_key):
+        parts = [by_pin[pin] for by_pin, _ in results if pin in by_pin]
+        on_rows(parts[0] if len(parts) == 1 else merge_rows(parts))
+    return [pin_id for _, failed in results for pin_id in failed]
+
+
+def write_report(output_filename, produce, output_format=None, excel_engine=REPORT_EXCEL_ENGINE, summary=True,
+                 extra_sheets=None):
+    """Streams the rows of `produce(on_rows)` into the report file, with the summary sheets at the end.
+
+    `produce` hands raw rows to on_rows as it collects them and returns the failed PINs.
+    `extra_sheets()`, when given, returns more {sheet name: DataFrame} to add after them.
+    Returns (number of report rows, failed PINs); an empty report file is removed again.
+    """
+    with open_report_writer(output_filename, output_format, excel_engine) as writer:
+        summaries = SummaryCollector()
+        build = partial(build_report, on_metrics=summaries.add) if summary else build_report
+        report = BatchedReport(writer, build)
+        failed = produce(report.add)
+        report.flush()
+        if report.total_rows and summary:
+            with PROFILE.stage('summary'):
+                departments, organization = summaries.summaries()
+            with PROFILE.stage('write'):
+                writer.write_sheet("Department summary", departments)
+                writer.write_sheet("Organization summary", organization)
+        if report.total_rows and extra_sheets is not None:
+            for sheet_name, df in extra_sheets().items():
+                with PROFILE.stage('write'):
+                    writer.write_sheet(sheet_name, df)
+    if not report.total_rows:
+        os.remove(output_filename)
+    return report.total_rows, failed
+
+
+def render_by_department(output_filename, split, excel_engine):
+    """Renders the finished report again, split by department."""
+    report_df = read_report(output_filename)
+    root = os.path.splitext(output_filename)[0]
+    if split == "files":
+        paths = render_department_files(report_df, f"{root}_departments", excel_engine)
+        print(f"Rendered {len(paths)} department reports into {root}_departments")
+    else:
+        render_department_sheets(report_df, f"{root}_by_department.xlsx", excel_engine)
+        print(f"Rendered the report with one sheet per department as {root}_by_department.xlsx")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generates the monthly attendance report for all employees.")
+    parser.add_argument("--dept", action="append", dest="dept_codes", help="Only include this department code (repeatable)")
+    parser.add_argument("--refresh-roster", action="store_true", help="Ignore the cached roster and fetch it again")
+    parser.add_argument("--probe", action="store_true", help=f"Probe PINs 1..{MAX_WORKERS - 1} instead of loading the roster")
+    parser.add_argument("--from-store", action="store_true",
+                        help="Build the report from the local transaction store (see transaction_store.py sync)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted sweep from its checkpoint instead of starting over")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only fetch the days that are not final yet and reuse the stored rows of the others")
+    parser.add_argument("--site", action="append", dest="site_names",
+                        help="Only sweep this site of the sites file (repeatable; default: all of them)")
+    parser.add_argument("--output", default=REPORT_OUTPUT_FILE, help="Report file to write")
+    parser.add_argument("--format", choices=["xlsx", "csv", "parquet"],
+                        help="Output format (default: taken from the --output extension)")
+    parser.add_argument("--excel-engine", choices=["auto", "openpyxl", "xlsxwriter"], default=REPORT_EXCEL_ENGINE,
+                        help="Excel writer for xlsx output")
+    parser.add_argument("--by-department", choices=["files", "sheets"],
+                        help="Also render the report per department: one workbook each (in parallel) or one sheet each")
+    parser.add_argument("--no-summary", action="store_true",
+                        help="Skip the department and organization summary sheets")
+    parser.add_argument("--anomalies", action="store_true",
+                        help="Add an Anomalies sheet from the full punch history of the window (see anomalies.py)")
+    parser.add_argument("--profile", default=RUN_PROFILE_FILE,
+                        help="Where to write the run profile JSON (a CSV table is written next to it)")
+    args = parser.parse_args(argv)
+    if args.incremental and (args.from_store or args.resume):
+        parser.error("--incremental cannot be combined with --from-store or --resume")
+
+    sites = load_sites()
+    if args.site_names:
+        unknown = set(args.site_names) - {site.name for site in sites}
+        if unknown:
+            parser.error(f"unknown site(s): {', '.join(sorted(unknown))}")
+        sites = [site for site in sites if site.name in args.site_names]
+    multi_site = sites != [DEFAULT_SITE]
+    if multi_site and (args.from_store or args.resume or args.incremental or args.anomalies):
+        parser.error("--from-store, --resume, --incremental and --anomalies only work without a sites file")
+
+    output_filename = args.output
+    if multi_site:
+        people = []
+    elif args.from_store:
+        try:
+            people = load_roster(args.dept_codes, refresh=args.refresh_roster)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Could not load the roster: {e}. Using the PINs found in the store.")
+            people = []
+    else:
+        people = load_people(args.dept_codes, refresh=args.refresh_roster, probe=args.probe)
+
+    def produce(on_rows):
+        if multi_site:
+            return asyncio.run(sweep_sites(sites, on_rows, args.dept_codes, args.refresh_roster, args.probe))
+        if args.from_store:
+            sweep_from_store(people, on_rows)
+            return []
+        if args.incremental:
+            with ReportRowStore() as row_store:
+                process = partial(process_pin_incremental, row_store=row_store)
+                return asyncio.run(sweep(people, on_rows, process=process))
+        checkpoint = SweepCheckpoint(resume=args.resume)
+        failed = asyncio.run(sweep(people, on_rows, checkpoint))
+        if failed:
+            checkpoint.close()
+        else:
+            checkpoint.discard()
+        return failed
+
+    def anomaly_sheets():
+        end_date = date.today()
+        start_date = (end_date - timedelta(days=NUMBER_OF_DAYS - 1)).isoformat()
+        if args.from_store:
+            with TransactionStore() as store:
+                sheet = find_anomalies(people, start_date, end_date.isoformat(), store)
+        else:
+            sheet = find_anomalies(people, start_date, end_date.isoformat())
+        print(f"Found {len(sheet)} anomalies.")
+        return {"Anomalies": sheet}
+
+    total_rows, failed = write_report(output_filename, produce, args.format, args.excel_engine,
+                                      summary=not args.no_summary,
+                                      extra_sheets=anomaly_sheets if args.anomalies else None)
+    if total_rows:
+        print(f"\nProcessed all workers. Total records created: {total_rows}.")
+        print(f"Report successfully saved as {output_filename}")
+        if args.by_department:
+            render_by_department(output_filename, args.by_department, args.excel_engine)
+    else:
+        print("No data was collected. The report was not generated.")
+
+    if failed:
+        print(f"\n{len(failed)} PINs still failed after retries: {', '.join(str(pin) for pin in failed)}")
+        print("Run again with --incremental to retry only their open days." if args.incremental
+              else "Run again with --resume to retry only those PINs.")
+
+    cache = shared_cache()
+    if cache is not None:
+        print(cache.summary())
+    PROFILE.write(args.profile)
+    print(PROFILE.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import json
+import sqlite3
+from datetime import date, timedelta
+
+from configs import REPORT_ROWS_FILE, REPORT_SETTLE_DAYS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_rows (
+    pin TEXT NOT NULL,
+    day TEXT NOT NULL,
+    row TEXT NOT NULL,
+    final INTEGER NOT NULL,
+    PRIMARY KEY (pin, day)
+);
+"""
+
+
+def row_day(row):
+    """Returns the 'YYYY-MM-DD' day of a raw report row (None for a 'no records' row)."""
+    moment = row.get('firstInTime') or row.get('lastOutTime')
+    return moment.split(' ')[0] if moment else None
+
+
+def settled_before(today=None):
+    """Days before this date ('YYYY-MM-DD') no longer change: no more punches will arrive for them."""
+    today = today or date.today()
+    return (today - timedelta(days=REPORT_SETTLE_DAYS - 1)).isoformat()
+
+
+class ReportRowStore:
+    """The raw report rows of earlier runs, keyed by (pin, day), for the incremental report mode.
+
+    A row is stored as final once its day is settled (see REPORT_SETTLE_DAYS); final
+    rows are never fetched again, open ones are refetched on the next run.
+    """
+
+    def __init__(self, path=REPORT_ROWS_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def rows(self, pin_id):
+        """Returns the PIN's stored rows as (day, row, final) tuples, newest day first."""
+        return [
+            (day, json.loads(row), bool(final))
+            for day, row, final in self.conn.execute(
+                "SELECT day, row, final FROM report_rows WHERE pin = ? ORDER BY day DESC", (str(pin_id),)
+            )
+        ]
+
+    def replace(self, pin_id, rows, today=None):
+        """Stores the PIN's current rows (replacing the old ones), marking settled days final."""
+        pin = str(pin_id)
+        settled = settled_before(today)
+        values = [
+            (pin, row_day(row), json.dumps(row, ensure_ascii=False), row_day(row) < settled)
+            for row in rows if row_day(row)
+        ]
+        with self.conn:
+            self.conn.execute("DELETE FROM report_rows WHERE pin = ?", (pin,))
+            self.conn.executemany("INSERT INTO report_rows (pin, day, row, final) VALUES (?, ?, ?, ?)", values)
@@ -0,0 +1,308 @@
+import csv
+import os
+
+import pandas
+
+from configs import REPORT_BATCH_ROWS, REPORT_EXCEL_ENGINE
+from instrumentation import PROFILE
+
+
+def _side_file(path, sheet_name, extension):
+    """Formats without sheets write extra tables next to the report: report_<sheet name>.<ext>."""
+    root = os.path.splitext(path)[0]
+    return f"{root}_{sheet_name.lower().replace(' ', '_')}.{extension}"
+
+
+class ReportWriter:
+    """Base class of the streaming writers: write() DataFrames batch by batch, then close().
+
+    write_sheet() adds a complete extra table (e.g. a summary) next to the report rows.
+    """
+
+    def write(self, report_df):
+        raise NotImplementedError
+
+    def write_sheet(self, sheet_name, df):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with PROFILE.stage('write'):
+            self.close()
+
+
+class CsvReportWriter(ReportWriter):
+    """Appends report rows to a CSV file, flushing after every batch so partial results survive a crash."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w', newline='', encoding='utf-8-sig')
+        self._writer = csv.writer(self._file)
+        self._header_written = False
+
+    def write(self, report_df):
+        if not self._header_written:
+            self._writer.writerow(report_df.columns)
+            self._header_written = True
+        self._writer.writerows(report_df.itertuples(index=False, name=None))
+        self._file.flush()
+
+    def write_sheet(self, sheet_name, df):
+        df.to_csv(_side_file(self.path, sheet_name, 'csv'), index=False, encoding='utf-8-sig')
+
+    def close(self):
+        self._file.close()
+
+
+# Conditional formatting of the report rows: (column, formula on that column's cell, fill colour)
+HIGHLIGHT_RULES = [
+    ("Actual attendance", '{cell}="No records found"', "FFC7CE"), # Absent: red
+    ("Late", 'AND({cell}<>"0:00:00",{cell}<>"N/A",{cell}<>"Incomplete Data")', "FFEB9C"), # Late: amber
+]
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(65 + rest) + letters
+    return letters
+
+
+def highlight_rules(columns):
+    """Returns (formula, fill colour) for every highlight rule whose column is in the sheet.
+
+    The formulas are written for row 2 with an absolute column, so Excel applies them
+    row by row across the whole data range.
+    """
+    columns = list(columns)
+    return [
+        ('=' + formula.format(cell=f"${_column_letter(columns.index(column))}2"), color)
+        for column, formula, color in HIGHLIGHT_RULES
+        if column in columns
+    ]
+
+
+def _column_width(header):
+    return max(12, len(str(header)) + 2)
+
+
+class XlsxReportWriter(ReportWriter):
+    """Streams report rows into an openpyxl write-only workbook, which keeps memory flat.
+
+    Every sheet gets a bold, frozen header row; late and absent report rows are
+    highlighted with conditional formatting.
+    """
+
+    def __init__(self, path):
+        from openpyxl import Workbook
+
+        self.path = path
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet("Report")
+        self._columns = None
+        self._rows = 0
+
+    def _start_sheet(self, sheet, columns):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        sheet.freeze_panes = 'A2'
+        header = []
+        for index, column in enumerate(columns):
+            sheet.column_dimensions[_column_letter(index)].width = _column_width(column)
+            cell = WriteOnlyCell(sheet, value=column)
+            cell.font = Font(bold=True)
+            header.append(cell)
+        sheet.append(header)
+
+    def write(self, report_df):
+        if self._columns is None:
+            self._columns = list(report_df.columns)
+            self._start_sheet(self._sheet, self._columns)
+        for row in report_df.itertuples(index=False, name=None):
+            self._sheet.append(list(row))
+        self._rows += len(report_df)
+
+    def _highlight(self, sheet, columns, rows):
+        from openpyxl.formatting.rule import FormulaRule
+        from openpyxl.styles import PatternFill
+
+        if not rows:
+            return
+        data_range = f"A2:{_column_letter(len(columns) - 1)}{rows + 1}"
+        for formula, color in highlight_rules(columns):
+            fill = PatternFill('solid', start_color=color, end_color=color)
+            sheet.conditional_formatting.add(data_range, FormulaRule(formula=[formula], fill=fill))
+
+    def write_sheet(self, sheet_name, df):
+        sheet = self._workbook.create_sheet(sheet_name)
+        self._start_sheet(sheet, df.columns)
+        for row in df.itertuples(index=False, name=None):
+            sheet.append(list(row))
+        self._highlight(sheet, list(df.columns), len(df))
+
+    def close(self):
+        if self._columns is None:
+            self._sheet.append([])
+        else:
+            self._highlight(self._sheet, self._columns, self._rows)
+        self._workbook.save(self.path)
+
+
+class XlsxWriterReportWriter(ReportWriter):
+    """Same workbook as XlsxReportWriter, written by xlsxwriter in constant-memory mode.
+
+    xlsxwriter serializes several times faster than openpyxl. Needs xlsxwriter.
+    """
+
+    def __init__(self, path):
+        try:
+            import xlsxwriter
+        except ImportError as e:
+            raise RuntimeError("The xlsxwriter engine needs xlsxwriter: pip install xlsxwriter") from e
+
+        self.path = path
+        self._workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True})
+        self._bold = self._workbook.add_format({'bold': True})
+        self._sheet = self._workbook.add_worksheet("Report")
+        self._columns = None
+        self._rows = 0
+
+    def _start_sheet(self, sheet, columns):
+        sheet.freeze_panes(1, 0)
+        for index, column in enumerate(columns):
+            sheet.set_column(index, index, _column_width(column))
+        sheet.write_row(0, 0, list(columns), self._bold)
+
+    def _write_rows(self, sheet, df, first_row):
+        for offset, row in enumerate(df.itertuples(index=False, name=None)):
+            # None and pandas' missing values are left blank
+            sheet.write_row(first_row + offset, 0, [None if pandas.isna(value) else value for value in row])
+
+    def write(self, report_df):
+        if self._columns is None:
+            self._columns = list(report_df.columns)
+            self._start_sheet(self._sheet, self._columns)
+        self._write_rows(self._sheet, report_df, self._rows + 1)
+        self._rows += len(report_df)
+
+    def _highlight(self, sheet, columns, rows):
+        if not rows:
+            return
+        for formula, color in highlight_rules(columns):
+            sheet.conditional_format(1, 0, rows, len(columns) - 1, {
+                'type': 'formula',
+                'criteria': formula,
+                'format': self._workbook.add_format({'bg_color': f"#{color}"}),
+            })
+
+    def write_sheet(self, sheet_name, df):
+        sheet = self._workbook.add_worksheet(sheet_name)
+        self._start_sheet(sheet, df.columns)
+        self._write_rows(sheet, df, 1)
+        self._highlight(sheet, list(df.columns), len(df))
+
+    def close(self):
+        if self._columns is not None:
+            self._highlight(self._sheet, self._columns, self._rows)
+        self._workbook.close()
+
+
+class ParquetReportWriter(ReportWriter):
+    """Writes every batch as its own Parquet row group. Needs pyarrow."""
+
+    def __init__(self, path):
+        try:
+            import pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow") from e
+
+        self.path = path
+        self._pq = pyarrow.parquet
+        self._writer = None
+
+    def write(self, report_df):
+        import pyarrow
+
+        # Several report columns mix numbers with markers like "N/A", so store them as text
+        table = pyarrow.Table.from_pandas(report_df.astype(str), preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def write_sheet(self, sheet_name, df):
+        df.to_parquet(_side_file(self.path, sheet_name, 'parquet'), index=False)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+WRITERS = {
+    'csv': CsvReportWriter,
+    'xlsx': XlsxReportWriter,
+    'parquet': ParquetReportWriter,
+}
+
+EXCEL_ENGINES = {
+    'openpyxl': XlsxReportWriter,
+    'xlsxwriter': XlsxWriterReportWriter,
+}
+
+
+def excel_writer_class(engine=REPORT_EXCEL_ENGINE):
+    """Returns the xlsx writer of the engine; 'auto' picks xlsxwriter when it is installed."""
+    if engine == 'auto':
+        try:
+            import xlsxwriter
+        except ImportError:
+            return XlsxReportWriter
+        return XlsxWriterReportWriter
+    if engine not in EXCEL_ENGINES:
+        raise ValueError(f"Unknown Excel engine '{engine}'. Use one of: auto, {', '.join(EXCEL_ENGINES)}")
+    return EXCEL_ENGINES[engine]
+
+
+def open_report_writer(path, output_format=None, excel_engine=REPORT_EXCEL_ENGINE):
+    """Returns the streaming writer for the format, inferred from the file extension if not given."""
+    output_format = output_format or os.path.splitext(path)[1].lstrip('.').lower()
+    if output_format not in WRITERS:
+        raise ValueError(f"Unsupported report format '{output_format}'. Use one of: {', '.join(WRITERS)}")
+    if output_format == 'xlsx':
+        return excel_writer_class(excel_engine)(path)
+    return WRITERS[output_format](path)
+
+
+class BatchedReport:
+    """Collects raw rows and writes them out through `build` every `batch_rows` rows.
+
+    `build` turns a list of raw rows into the report DataFrame (metrics.build_report).
+    """
+
+    def __init__(self, writer, build, batch_rows=REPORT_BATCH_ROWS):
+        self.writer = writer
+        self.build = build
+        self.batch_rows = batch_rows
+        self.total_rows = 0
+        self._pending = []
+
+    def add(self, rows):
+        self._pending.extend(rows)
+        if len(self._pending) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with PROFILE.stage('metrics'):
+                report_df = self.build(self._pending)
+            with PROFILE.stage('write'):
+                self.writer.write(report_df)
+            self.total_rows += len(self._pending)
+            self._pending = []
@@ -0,0 +1,171 @@
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+from configs import HTTP_CACHE_FILE, HTTP_CACHE_MAX_BYTES, HTTP_CACHE_TTL_SECONDS, HTTP_CACHE_SETTLE_DAYS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    expires_at REAL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+"""
+
+
+def cache_key(url):
+    """Normalizes the URL into a cache key: sorted query parameters, access_token removed."""
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query) if k != 'access_token')
+    return f"{parts.scheme}://{parts.netloc.lower()}{parts.path}?{urlencode(query)}"
+
+
+def ttl_for(url):
+    """Returns how long a response for this URL stays fresh (None = forever, 0 = not cached)."""
+    parts = urlsplit(url)
+    if '/api/person/get/' in parts.path:
+        return HTTP_CACHE_TTL_SECONDS["person"]
+    if '/transaction/firstInAndLastOut/' in parts.path:
+        return HTTP_CACHE_TTL_SECONDS["firstInAndLastOut"]
+    if '/transaction/person/' in parts.path:
+        query = dict(parse_qsl(parts.query))
+        try:
+            start = date.fromisoformat(query['startDate'])
+            end = date.fromisoformat(query['endDate'])
+        except (KeyError, ValueError):
+            return 0
+        # Range queries pass an exclusive endDate, single-day queries pass startDate == endDate
+        last_day = end - timedelta(days=1) if end > start else end
+        if last_day <= date.today() - timedelta(days=HTTP_CACHE_SETTLE_DAYS):
+            return HTTP_CACHE_TTL_SECONDS["transactions_final"]
+        return HTTP_CACHE_TTL_SECONDS["transactions_recent"]
+    return 0
+
+
+def _response(url, status, body):
+    """Rebuilds a requests.Response from a cached body, so callers cannot tell the difference."""
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response._content = body
+    response.headers['Content-Type'] = 'application/json'
+    response.encoding = 'utf-8'
+    return response
+
+
+class ResponseCache:
+    """On-disk cache of successful GET responses with per-endpoint TTLs and LRU eviction.
+
+    Stale entries that carried an ETag or Last-Modified header are revalidated with a
+    conditional request instead of being downloaded again.
+    """
+
+    def __init__(self, path=HTTP_CACHE_FILE, max_bytes=HTTP_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Batch runs share the cache between worker processes, so wait for locks instead of failing
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def lookup(self, url):
+        """Returns (response, validators).
+
+        `response` is the cached response if it is still fresh, else None. `validators`
+        holds the conditional request headers for a stale entry that can be revalidated.
+        """
+        key = cache_key(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, body, etag, last_modified, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None, {}
+            status, body, etag, last_modified, expires_at = row
+            if expires_at is None or expires_at > now:
+                self.hits += 1
+                with self._conn:
+                    self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                return _response(url, status, body), {}
+            self.misses += 1
+        validators = {}
+        if etag:
+            validators['If-None-Match'] = etag
+        if last_modified:
+            validators['If-Modified-Since'] = last_modified
+        return None, validators
+
+    def revalidate(self, url):
+        """Marks a stale entry fresh again after a 304 answer and returns the cached response."""
+        key = cache_key(url)
+        ttl = ttl_for(url)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE responses SET stored_at = ?, expires_at = ?, last_access = ? WHERE key = ?",
+                (now, None if ttl is None else now + ttl, now, key),
+            )
+            status, body = self._conn.execute(
+                "SELECT status, body FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self.revalidated += 1
+        return _response(url, status, body)
+
+    def store(self, url, response):
+        """Caches a successful response if its endpoint is cacheable."""
+        ttl = ttl_for(url)
+        if response.status_code != 200 or ttl == 0:
+            return
+        key = cache_key(url)
+        body = response.content
+        now = time.time()
+        with self._lock, self._conn:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, status, body, etag, last_modified, stored_at, expires_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, response.status_code, body, response.headers.get('ETag'),
+                 response.headers.get('Last-Modified'), now, None if ttl is None else now + ttl, now, len(body)),
+            )
+            self._size += len(body) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drops least recently used entries until the cache is back under 90% of max_bytes."""
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access")
+        doomed = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            doomed.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def summary(self):
+        return (f"HTTP cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.revalidated} revalidated, {self.evictions} evicted.")
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+
+import requests
+
+from configs import BASE_URL, ACCESS_TOKEN
+from configs import PERSON_LIST_PATH, ROSTER_PAGE_SIZE, ROSTER_CACHE_FILE, ROSTER_CACHE_TTL_SECONDS
+from http_client import post_with_retry
+from instrumentation import PROFILE
+
+# Several sites may load their rosters at the same time (see sites.py)
+_cache_lock = threading.Lock()
+
+
+def _person_info(person):
+    """Keeps only the fields the reports use, in the shape /api/person/get returns them."""
+    return {
+        'pin': str(person.get('pin', '')),
+        'name': person.get('name', ''),
+        'lastName': person.get('lastName', ''),
+        'deptCode': person.get('deptCode', ''),
+        'deptName': person.get('deptName', 'N/A'),
+    }
+
+
+def _read_person_page(payload):
+    """Returns (people, total) from a person list response body."""
+    page = payload.get('data') or []
+    if isinstance(page, dict):
+        return page.get('data') or [], page.get('total', 0)
+    return page, None
+
+
+def fetch_roster(dept_codes=None, pins=None, session=requests, site=None):
+    """Fetches all personnel in batched pages, optionally restricted to departments or PINs.
+
+    With a `site` (see sites.py) the roster comes from that site's server.
+    """
+    url = f"{BASE_URL}{PERSON_LIST_PATH}?access_token={ACCESS_TOKEN}"
+    if site is not None:
+        url = site.url(url)
+    people = []
+    page_no = 1
+    while True:
+        body = {"pageNo": page_no, "pageSize": ROSTER_PAGE_SIZE}
+        if dept_codes:
+            body["deptCodes"] = ",".join(dept_codes)
+        if pins:
+            body["pins"] = ",".join(str(pin) for pin in pins)
+        # A roster failure would make the sweep probe every PIN instead, so retry like any GET
+        response = post_with_retry(url, json=body, session=session)
+        response.raise_for_status()
+        with PROFILE.stage('parse'):
+            page, total = _read_person_page(response.json())
+        people.extend(_person_info(person) for person in page)
+        if not page or len(page) < ROSTER_PAGE_SIZE or (total is not None and len(people) >= total):
+            break
+        page_no += 1
+    return people
+
+
+def pin_sort_key(pin):
+    """Orders numeric PINs numerically and puts any non-numeric PINs after them."""
+    pin = str(pin)
+    return (0, int(pin), '') if pin.isdigit() else (1, 0, pin)
+
+
+def _cache_key(dept_codes, site=None):
+    key = ",".join(sorted(dept_codes)) if dept_codes else "*"
+    return f"{site.name}|{key}" if site is not None else key
+
+
+def _read_cache(cache_file):
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def load_roster(dept_codes=None, refresh=False, cache_file=ROSTER_CACHE_FILE, ttl=ROSTER_CACHE_TTL_SECONDS, site=None):
+    """Returns the roster sorted by PIN, served from the on-disk cache while it is younger than ttl."""
+    key = _cache_key(dept_codes, site)
+    with _cache_lock:
+        entry = _read_cache(cache_file).get(key)
+    if entry and not refresh and time.time() - entry.get('fetched_at', 0) < ttl:
+        return entry['people']
+
+    people = fetch_roster(dept_codes, site=site)
+    if dept_codes:
+        # Not every server version honours deptCodes, so filter locally as well
+        people = [p for p in people if p['deptCode'] in dept_codes]
+    people.sort(key=lambda p: pin_sort_key(p['pin']))
+
+    with _cache_lock:
+        cache = _read_cache(cache_file)
+        cache[key] = {'fetched_at': time.time(), 'people': people}
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+    print(f"Roster loaded: {len(people)} employees" + (f" at {site.name}." if site is not None else "."))
+    return people
@@ -0,0 +1,163 @@
+import json
+import os
+from datetime import date, datetime
+
+import pandas
+
+from configs import PLANNED_START_TIME, PLANNED_END_TIME, PLANNED_WORK_DURATION_MINUTES, LUNCH_BREAK_MINUTES
+from configs import SCHEDULE_FILE
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+DEFAULT_SHIFT = "default"
+
+CALENDAR_COLUMNS = ["shift", "date", "planned_start", "planned_end", "planned_minutes", "schedule"]
+
+
+def _parse_time(text):
+    return datetime.strptime(text, '%H:%M').time()
+
+
+def _offset(planned_time):
+    return pandas.Timedelta(hours=planned_time.hour, minutes=planned_time.minute, seconds=planned_time.second)
+
+
+def _shift_hours(spec, name):
+    """Turns one shift (or weekday override) definition into (start offset, end offset, minutes, label)."""
+    try:
+        start, end = _parse_time(spec['start']), _parse_time(spec['end'])
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"shift '{name}' needs 'start' and 'end' times as HH:MM") from e
+    start_offset, end_offset = _offset(start), _offset(end)
+    if end_offset <= start_offset:
+        end_offset += pandas.Timedelta(days=1) # A night shift ends on the next day
+    span = int((end_offset - start_offset).total_seconds() // 60)
+    minutes = spec.get('minutes', span - LUNCH_BREAK_MINUTES)
+    return start_offset, end_offset, minutes, f"{start.strftime('%H:%M')} - {end.strftime('%H:%M')}"
+
+
+class Schedule:
+    """Shifts, holidays and employee-to-shift assignments, as loaded from the schedule file.
+
+    The planned interval of every (shift, date) is computed once into a calendar table;
+    compute_metrics() then only maps employees to shifts and joins that table.
+    """
+
+    def __init__(self, shifts, holidays=(), default_shift=DEFAULT_SHIFT, departments=None, employees=None):
+        if default_shift not in shifts:
+            raise ValueError(f"default shift '{default_shift}' is not defined")
+        self.shifts = shifts
+        self.holidays = {date.fromisoformat(str(day)) for day in holidays}
+        self.default_shift = default_shift
+        self.departments = dict(departments or {})
+        self.employees = {str(pin): shift for pin, shift in (employees or {}).items()}
+        for shift in list(self.departments.values()) + list(self.employees.values()):
+            if shift not in shifts:
+                raise ValueError(f"assignment to unknown shift '{shift}'")
+        self._calendar = None
+        self._covered = None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            shifts=data['shifts'],
+            holidays=data.get('holidays', ()),
+            default_shift=data.get('default_shift', DEFAULT_SHIFT),
+            departments=data.get('departments'),
+            employees=data.get('employees'),
+        )
+
+    def shift_for(self, ids, departments=None):
+        """Returns each row's shift: the employee's own assignment, else its department's, else the default."""
+        shifts = ids.astype(str).map(self.employees)
+        if departments is not None and self.departments:
+            shifts = shifts.fillna(departments.map(self.departments))
+        return shifts.fillna(self.default_shift)
+
+    def overnight_shifts(self):
+        """The names of the shifts that end on the next day on any of their workdays."""
+        one_day = pandas.Timedelta(days=1)
+        return {
+            name for name, spec in self.shifts.items()
+            if any(_shift_hours({**spec, **override}, name)[1] >= one_day
+                   for override in [{}] + list(spec.get('overrides', {}).values()))
+        }
+
+    def _shift_calendar(self, name, days):
+        spec = self.shifts[name]
+        workdays = set(spec.get('workdays', WEEKDAYS))
+        base = _shift_hours(spec, name)
+        overrides = {day: _shift_hours({**spec, **override}, name)
+                     for day, override in spec.get('overrides', {}).items()}
+
+        rows = []
+        for day in days:
+            weekday = WEEKDAYS[day.weekday()]
+            if day.date() in self.holidays:
+                rows.append((pandas.NaT, pandas.NaT, 0, "Holiday"))
+            elif weekday not in workdays:
+                rows.append((pandas.NaT, pandas.NaT, 0, "Day off"))
+            else:
+                start, end, minutes, label = overrides.get(weekday, base)
+                rows.append((day + start, day + end, minutes, label))
+        calendar = pandas.DataFrame(rows, columns=CALENDAR_COLUMNS[2:])
+        calendar.insert(0, 'date', days)
+        calendar.insert(0, 'shift', name)
+        return calendar
+
+    def calendar(self, start, end):
+        """Returns the planned interval of every shift on every day from start to end (inclusive).
+
+        The table is kept for the rest of the run and only rebuilt when a later batch
+        needs dates outside the range it already covers.
+        """
+        start, end = pandas.Timestamp(start).normalize(), pandas.Timestamp(end).normalize()
+        if self._covered is not None:
+            covered_start, covered_end = self._covered
+            if covered_start <= start and end <= covered_end:
+                return self._calendar
+            start, end = min(start, covered_start), max(end, covered_end)
+        days = pandas.date_range(start, end)
+        self._calendar = pandas.concat(
+            [self._shift_calendar(name, days) for name in self.shifts], ignore_index=True
+        )
+        self._calendar['planned_minutes'] = self._calendar['planned_minutes'].astype('int64')
+        self._covered = (start, end)
+        return self._calendar
+
+    def plan(self, ids, departments, dates):
+        """Returns the planned start/end/minutes and schedule label of each row, aligned to `dates`."""
+        rows = pandas.DataFrame({'shift': self.shift_for(ids, departments), 'date': dates})
+        known = dates.dropna()
+        if known.empty:
+            return rows.assign(planned_start=pandas.NaT, planned_end=pandas.NaT, planned_minutes=0, schedule=None)
+        calendar = self.calendar(known.min(), known.max())
+        planned = rows.merge(calendar, on=['shift', 'date'], how='left')
+        planned.index = rows.index
+        return planned
+
+
+def default_schedule():
+    """The single shift from configs.py, used when there is no schedule file."""
+    return Schedule({DEFAULT_SHIFT: {
+        'start': PLANNED_START_TIME.strftime('%H:%M'),
+        'end': PLANNED_END_TIME.strftime('%H:%M'),
+        'minutes': PLANNED_WORK_DURATION_MINUTES,
+    }})
+
+
+_loaded = {}
+
+
+def load_schedule(path=SCHEDULE_FILE):
+    """Returns the schedule from the JSON file, or the configs.py shift if the file does not exist.
+
+    The schedule is loaded once per process and path.
+    """
+    if path not in _loaded:
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                _loaded[path] = Schedule.from_dict(json.load(f))
+            print(f"Loaded schedule from {path}.")
+        else:
+            _loaded[path] = default_schedule()
+    return _loaded[path]
@@ -0,0 +1,328 @@
+"""Local report service: keeps the roster, the HTTP connections and the caches warm between reports.
+
+    python service.py --port 8099
+
+    POST /jobs          {"kind": "all"}
+                        {"kind": "department", "dept_codes": ["D01"]}
+                        {"kind": "pin", "pin": "392", "start": "2025-08-01", "end": "2025-08-28"}
+    GET  /jobs          all known jobs
+    GET  /jobs/<id>     status of one job
+    GET  /jobs/<id>/file  the finished report
+    GET  /health
+
+Jobs wait in a bounded queue (503 when it is full) and are run by a pool of worker
+threads. An identical request whose report finished less than SERVICE_RESULT_TTL_SECONDS
+ago is answered with that job instead of a new one.
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from configs import SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS, SERVICE_QUEUE_SIZE
+from configs import SERVICE_OUTPUT_DIR, SERVICE_RESULT_TTL_SECONDS, SERVICE_MAX_JOBS, ROSTER_CACHE_TTL_SECONDS
+from fetch_engine import AsyncFetcher
+from instrumentation import PROFILE
+from report_attendance import sweep, write_report
+from roster import load_roster
+
+# The per-PIN report lives with the other standalone scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DIF_CODES'))
+from info_by_pin_and_date import generate_report, save_report  # noqa: E402
+
+JOB_KINDS = ("all", "department", "pin")
+
+
+class Job:
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.path = None
+        self.rows = 0
+        self.progress = None # "<employees done>/<employees>" while a sweep runs
+        self.failed_pins = []
+        self.error = None
+
+    def key(self):
+        return json.dumps([self.kind, self.params], sort_keys=True)
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'seconds': round(self.finished - self.started, 3) if self.finished and self.started else None,
+            'rows': self.rows,
+            'progress': self.progress,
+            'failed_pins': self.failed_pins,
+            'error': self.error,
+            'file': f"/jobs/{self.id}/file" if self.status == 'done' and self.path else None,
+        }
+
+
+def validate(body):
+    """Returns (kind, params) of a job request, or raises ValueError with the reason."""
+    if not isinstance(body, dict):
+        raise ValueError("the request body must be a JSON object")
+    kind = body.get('kind')
+    if kind not in JOB_KINDS:
+        raise ValueError(f"'kind' must be one of: {', '.join(JOB_KINDS)}")
+    if kind == 'all':
+        return kind, {}
+    if kind == 'department':
+        dept_codes = body.get('dept_codes')
+        if not dept_codes or not isinstance(dept_codes, list):
+            raise ValueError("'dept_codes' must be a non-empty list")
+        return kind, {'dept_codes': sorted(str(code) for code in dept_codes)}
+    pin, start, end = body.get('pin'), body.get('start'), body.get('end')
+    if not pin or not start or not end:
+        raise ValueError("'pin', 'start' and 'end' are required")
+    if not isinstance(pin, (str, int)) or not isinstance(start, str) or not isinstance(end, str):
+        raise ValueError("'pin' must be a string or number, 'start' and 'end' 'YYYY-MM-DD' strings")
+    if date.fromisoformat(start) > date.fromisoformat(end):
+        raise ValueError("'start' must not be after 'end'")
+    return kind, {'pin': str(pin), 'start': start, 'end': end}
+
+
+class ReportService:
+    """Owns the warm state (roster, AsyncFetcher, event loop) and the job queue and workers."""
+
+    def __init__(self, workers=SERVICE_WORKERS, queue_size=SERVICE_QUEUE_SIZE, output_dir=SERVICE_OUTPUT_DIR):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._roster = None
+        self._roster_loaded = 0
+        # Loading the roster is a network call: it has its own lock, so the jobs are not held up
+        self._roster_lock = threading.Lock()
+        self._running = 0
+
+        # One event loop and one AsyncFetcher for every sweep: the connection pool and
+        # the rate limiter are shared by all jobs instead of being rebuilt per report
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="service-loop", daemon=True).start()
+        self.fetcher = AsyncFetcher()
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f"service-worker-{n}", daemon=True) for n in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def roster(self):
+        """The whole roster, kept in memory and reloaded after ROSTER_CACHE_TTL_SECONDS."""
+        with self._roster_lock:
+            if self._roster is None or time.time() - self._roster_loaded > ROSTER_CACHE_TTL_SECONDS:
+                self._roster = load_roster()
+                self._roster_loaded = time.time()
+            return self._roster
+
+    def submit(self, kind, params):
+        """Queues a job, or returns the recent finished job for the same request.
+
+        Raises queue.Full when the queue is full.
+        """
+        job = Job(kind, params)
+        with self._lock:
+            for known in self.jobs.values():
+                fresh = known.finished and time.time() - known.finished < SERVICE_RESULT_TTL_SECONDS
+                if known.key() == job.key() and (known.status in ('queued', 'running') or
+                                                 (known.status == 'done' and fresh)):
+                    return known
+            self._queue.put_nowait(job)
+            self.jobs[job.id] = job
+            self._forget_old_jobs()
+        return job
+
+    def _forget_old_jobs(self):
+        finished = [job for job in self.jobs.values() if job.status in ('done', 'failed')]
+        for job in sorted(finished, key=lambda job: job.finished)[:max(0, len(self.jobs) - SERVICE_MAX_JOBS)]:
+            del self.jobs[job.id]
+
+    def get(self, job_id):
+        """A copy of the job as it is now, or None for an unknown id."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return copy.copy(job) if job else None
+
+    def list(self):
+        with self._lock:
+            return [job.as_dict() for job in sorted(self.jobs.values(), key=lambda job: job.created)]
+
+    def _update(self, job, **fields):
+        # Jobs are read by the HTTP threads, so they only change under the lock
+        with self._lock:
+            for name, value in fields.items():
+                setattr(job, name, value)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                # The run profile covers the jobs since the service was last idle
+                if not self._running:
+                    PROFILE.reset()
+                self._running += 1
+            self._update(job, status='running', started=time.time())
+            try:
+                run = self._run_pin_report if job.kind == 'pin' else self._run_sweep
+                rows, failed_pins, path = run(job)
+                self._update(job, status='done', rows=rows, failed_pins=failed_pins, path=path, finished=time.time())
+            except Exception as e:
+                self._update(job, status='failed', error=str(e), finished=time.time())
+                print(f"Job {job.id} ({job.kind}) failed: {e}")
+            finally:
+                with self._lock:
+                    self._running -= 1
+                self._queue.task_done()
+
+    def _run_sweep(self, job):
+        people = self.roster()
+        if job.kind == 'department':
+            dept_codes = set(job.params['dept_codes'])
+            people = [person for person in people if person['deptCode'] in dept_codes]
+        path = os.path.join(self.output_dir, f"report_{job.id}.xlsx")
+
+        def produce(on_rows):
+            # The sweep runs on the shared service loop and only queues the rows; this worker
+            # thread builds and writes them, so one job's writing never holds up another's fetches
+            collected = queue.Queue()
+            future = asyncio.run_coroutine_threadsafe(sweep(people, collected.put, fetcher=self.fetcher), self._loop)
+            future.add_done_callback(lambda _: collected.put(None))
+            done = 0
+            while (rows := collected.get()) is not None:
+                on_rows(rows)
+                done += 1
+                self._update(job, progress=f"{done}/{len(people)}")
+            return future.result()
+
+        rows, failed_pins = write_report(path, produce)
+        return rows, failed_pins, path if rows else None
+
+    def _run_pin_report(self, job):
+        pin, start, end = job.params['pin'], job.params['start'], job.params['end']
+        person = next((p for p in self.roster() if p['pin'] == pin), None)
+        report_data, user_info = generate_report(pin, start, end, user_info=person)
+        if report_data is None:
+            raise ValueError(f"could not generate the report of PIN {pin}, see the service log")
+        path = save_report(report_data, user_info, pin, start, end, self.output_dir) if report_data else None
+        return len(report_data), [], path
+
+    def close(self):
+        self.fetcher.close()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    service = None # Set by create_server()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_file(self, path):
+        with open(path, 'rb') as f:
+            payload = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(path)}"')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        if parts == ['health']:
+            return self._send_json(200, {
+                'ok': True, 'queued': self.service._queue.qsize(), 'profile': PROFILE.summary(),
+            })
+        if parts == ['jobs']:
+            return self._send_json(200, self.service.list())
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.service.get(parts[1])
+            if job is None:
+                return self._send_json(404, {'error': 'No such job'})
+            if len(parts) == 2:
+                return self._send_json(200, job.as_dict())
+            if parts[2] == 'file':
+                if job.status != 'done' or not job.path:
+                    return self._send_json(409, {'error': f"Job is {job.status}, no file to serve", 'job': job.as_dict()})
+                return self._send_file(job.path)
+        self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path.split('?')[0].rstrip('/') != '/jobs':
+            return self._send_json(404, {'error': 'Not found'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            kind, params = validate(json.loads(self.rfile.read(length) or b'{}'))
+        except ValueError as e:
+            return self._send_json(400, {'error': str(e)})
+        try:
+            job = self.service.submit(kind, params)
+        except queue.Full:
+            return self._send_json(503, {'error': 'The job queue is full, try again later'})
+        self._send_json(202 if job.status in ('queued', 'running') else 200, job.as_dict())
+
+
+def create_server(service, host=SERVICE_HOST, port=SERVICE_PORT):
+    handler = type('BoundServiceHandler', (ServiceHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the attendance report service.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="Reports generated at the same time")
+    parser.add_argument("--output-dir", default=SERVICE_OUTPUT_DIR, help="Folder for the finished reports")
+    args = parser.parse_args(argv)
+
+    service = ReportService(workers=args.workers, output_dir=args.output_dir)
+    try:
+        service.roster()
+    except (requests.RequestException, ValueError) as e:
+        print(f"Could not preload the roster: {e}. It will be loaded with the first job.")
+    server = create_server(service, args.host, args.port)
+    print(f"Report service on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import json
+import os
+
+from configs import BASE_URL, ACCESS_TOKEN, CONCURRENCY_LIMIT, DEFAULT_REQUESTS_PER_SECOND, SITES_FILE
+from fetch_engine import AsyncFetcher, HostRateLimiter
+from report_rows import row_day
+
+
+class Site:
+    """One device server: its address, token, request limits and PIN namespace.
+
+    Sites with the same `namespace` share their PINs, so the same PIN at two of them
+    is the same employee and their rows are merged. A site with its own namespace
+    (e.g. "B2-") gets it put in front of its PINs to keep them apart.
+    """
+
+    def __init__(self, name, base_url, access_token, concurrency=CONCURRENCY_LIMIT,
+                 requests_per_second=DEFAULT_REQUESTS_PER_SECOND, namespace=""):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.access_token = access_token
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        self.namespace = namespace
+
+    @classmethod
+    def from_dict(cls, spec):
+        try:
+            return cls(spec['name'], spec['base_url'], spec['access_token'],
+                       spec.get('concurrency', CONCURRENCY_LIMIT),
+                       spec.get('requests_per_second', DEFAULT_REQUESTS_PER_SECOND),
+                       spec.get('namespace', ""))
+        except KeyError as e:
+            raise ValueError(f"every site needs 'name', 'base_url' and 'access_token', missing {e}") from e
+
+    def url(self, url):
+        """Points a URL built for configs.BASE_URL/ACCESS_TOKEN at this site."""
+        if url.startswith(BASE_URL):
+            url = self.base_url + url[len(BASE_URL):]
+        return url.replace(f"access_token={ACCESS_TOKEN}", f"access_token={self.access_token}")
+
+    def pin(self, pin_id):
+        """The PIN as it appears in the merged report."""
+        return f"{self.namespace}{pin_id}" if self.namespace else pin_id
+
+    def fetcher(self):
+        """An AsyncFetcher with this site's own connection pool, concurrency and rate limit."""
+        return AsyncFetcher(concurrency=self.concurrency,
+                            rate_limiter=HostRateLimiter(default_rate=self.requests_per_second), site=self)
+
+
+DEFAULT_SITE = Site("default", BASE_URL, ACCESS_TOKEN)
+
+
+def load_sites(path=SITES_FILE):
+    """Returns the sites of the JSON file, or just the configs.py server if the file does not exist."""
+    if not (path and os.path.exists(path)):
+        return [DEFAULT_SITE]
+    with open(path, encoding='utf-8') as f:
+        sites = [Site.from_dict(spec) for spec in json.load(f).get('sites', [])]
+    if not sites:
+        raise ValueError(f"{path} does not define any sites")
+    names = [site.name for site in sites]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{path} has several sites with the same name")
+    return sites
+
+
+def _merge_day(rows):
+    complete = [row for row in rows if row.get('firstInTime') and row.get('lastOutTime')]
+    known = {moment for row in complete for moment in (row['firstInTime'], row['lastOutTime'])}
+    # An incomplete row stands for a single punch (firstInAndLastOut has no last-out for it);
+    # the same punch reported by two sites is counted once
+    singles = {row.get('firstInTime') or row.get('lastOutTime') for row in rows if row not in complete} - known
+    moments = sorted(known | singles)
+    count = sum(row['Transaction count'] for row in complete) + len(singles)
+    is_complete = count > 1 and len(moments) > 1
+    return {
+        **rows[0],
+        "firstInTime": moments[0],
+        "lastOutTime": moments[-1] if is_complete else None,
+        "Transaction count": count if is_complete else "N/A",
+    }
+
+
+def merge_rows(row_lists):
+    """Merges one employee's raw report rows from several sites into one row per day.
+
+    The first-in is the earliest and the last-out the latest of the sites' times, and
+    the transaction counts add up. Name and department come from the first site.
+    """
+    by_day = {}
+    for rows in row_lists:
+        for row in rows:
+            day = row_day(row)
+            if day is not None:
+                by_day.setdefault(day, []).append(row)
+    if not by_day:
+        return row_lists[0]
+    employee = {key: row_lists[0][0][key] for key in ("ID", "FIO", "Department")}
+    return [{**_merge_day(rows), **employee} for day, rows in sorted(by_day.items(), reverse=True)]
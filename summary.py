@@ -0,0 +1,194 @@
+import argparse
+import os
+from datetime import date
+
+import numpy
+import pandas
+
+from configs import NUMBER_OF_DAYS
+from metrics import TIME_FORMAT, compute_metrics
+from schedule import load_schedule
+
+SUMMARY_COLUMNS = [
+    "Department", "Employees", "Days present", "Late days", "Total lateness (min)",
+    "Total overwork (min)", "Absence days", "Average arrival",
+]
+
+COMPACT_COLUMNS = ["ID", "Department", "date", "status", "late_min", "overwork_min", "arrival_sec"]
+
+
+def compact_metrics(metrics):
+    """Keeps only what the summaries need from a compute_metrics() frame, as plain numbers.
+
+    Like the report itself, lateness, overwork and arrival only count for complete days.
+    """
+    complete = metrics['status'] == 'complete'
+    first_in = metrics['first_in']
+    compact = pandas.DataFrame({
+        "ID": metrics['ID'].astype(str),
+        "Department": metrics['Department'].fillna('N/A'),
+        "date": metrics['date'],
+        "status": metrics['status'],
+        "late_min": (metrics['late'].dt.total_seconds() / 60).where(complete),
+        "overwork_min": (metrics['overwork'].dt.total_seconds() / 60).where(complete),
+        "arrival_sec": (first_in - first_in.dt.normalize()).dt.total_seconds().where(complete),
+    })
+    return compact[COMPACT_COLUMNS]
+
+
+class SummaryCollector:
+    """Collects the compact metrics of every report batch, to be passed as build_report(on_metrics=...).
+
+    `start` and `end` are the report window the absences are counted in (see department_summary()).
+    """
+
+    def __init__(self, start=None, end=None):
+        self.start = start
+        self.end = end
+        self._parts = []
+
+    def add(self, metrics):
+        self._parts.append(compact_metrics(metrics))
+
+    def frame(self):
+        if not self._parts:
+            return pandas.DataFrame(columns=COMPACT_COLUMNS)
+        return pandas.concat(self._parts, ignore_index=True)
+
+    def summaries(self):
+        return department_summary(self.frame(), self.start, self.end)
+
+
+def _format_arrival(seconds):
+    seconds = seconds.round()
+    text = (
+        (seconds // 3600).astype('Int64').astype(str).str.zfill(2) + ':'
+        + (seconds % 3600 // 60).astype('Int64').astype(str).str.zfill(2)
+    )
+    return text.where(seconds.notna(), "N/A")
+
+
+def _aggregate(compact, by):
+    """Aggregates the compact metrics per `by` column with one grouped pass."""
+    present = compact['status'] != 'no_records'
+    dated = compact.assign(present_day=present, late_day=compact['late_min'] > 0)
+    grouped = dated.groupby(by, sort=True)
+    summary = pandas.DataFrame({
+        "Employees": grouped['ID'].nunique(),
+        "Days present": grouped['present_day'].sum(),
+        "Late days": grouped['late_day'].sum(),
+        "Total lateness (min)": grouped['late_min'].sum().round().astype('int64'),
+        "Total overwork (min)": grouped['overwork_min'].sum().round().astype('int64'),
+        "Average arrival": _format_arrival(grouped['arrival_sec'].mean()),
+    })
+    return summary
+
+
+def report_window(end=None):
+    """The (start, end) dates of the NUMBER_OF_DAYS report window ending on `end` (default: today)."""
+    end = pandas.Timestamp(end or date.today()).normalize()
+    return end - pandas.Timedelta(days=NUMBER_OF_DAYS - 1), end
+
+
+def absences(compact, start, end, schedule=None):
+    """Returns one row (ID, Department, date) per planned workday of the window an employee has no record on.
+
+    Every employee of `compact` is checked over the same window, and the schedule
+    (see schedule.py) decides which days are workdays, so days off and holidays
+    are not absences.
+    """
+    schedule = schedule or load_schedule()
+    employees = compact.drop_duplicates('ID')
+    dates = pandas.date_range(start, end)
+    grid = pandas.DataFrame({
+        'ID': numpy.repeat(employees['ID'].to_numpy(), len(dates)),
+        'Department': numpy.repeat(employees['Department'].to_numpy(), len(dates)),
+        'date': numpy.tile(dates.to_numpy(), len(employees)),
+    })
+    planned = schedule.plan(grid['ID'], grid['Department'], grid['date'])['planned_minutes'].fillna(0).to_numpy() > 0
+    present = compact.loc[compact['status'] != 'no_records', ['ID', 'date']].dropna().drop_duplicates()
+    grid = grid[planned].merge(present.assign(present=True), on=['ID', 'date'], how='left')
+    return grid.loc[grid['present'].isna(), ['ID', 'Department', 'date']]
+
+
+def department_summary(compact, start=None, end=None, schedule=None):
+    """Returns (department summary, organization summary) DataFrames.
+
+    Absence days are the planned workdays of the report window (start to end dates,
+    by default the NUMBER_OF_DAYS ending today) on which an employee has no record
+    at all, summed per department.
+    """
+    if compact.empty:
+        return pandas.DataFrame(columns=SUMMARY_COLUMNS), pandas.DataFrame(columns=SUMMARY_COLUMNS)
+
+    default_start, default_end = report_window(end)
+    start = pandas.Timestamp(start).normalize() if start is not None else default_start
+    absent = absences(compact, start, default_end, schedule)
+
+    departments = _aggregate(compact, 'Department')
+    departments["Absence days"] = absent.groupby('Department').size().reindex(departments.index, fill_value=0)
+    departments = departments.reset_index()[SUMMARY_COLUMNS]
+
+    organization = _aggregate(compact.assign(Department="All departments"), 'Department')
+    organization["Absence days"] = len(absent)
+    organization = organization.reset_index()[SUMMARY_COLUMNS]
+    return departments, organization
+
+
+def metrics_from_report(report_df, schedule=None):
+    """Recomputes the metrics from an already written report, so no data has to be fetched again.
+
+    The report has one row per shift already: a last-out not after the first-in belongs
+    to a night shift and is on the next day.
+    """
+    attendance = report_df['Actual attendance'].astype(str).str.split(' - ', n=1, expand=True).reindex(columns=[0, 1])
+    complete = report_df['Actual attendance'].astype(str).str.contains(' - ', regex=False)
+    day = report_df['Date'].astype(str)
+    raw = pandas.DataFrame({
+        "ID": report_df['ID'],
+        "FIO": report_df['FIO'],
+        "Department": report_df['Department'],
+        "firstInTime": (day + ' ' + attendance[0]).where(complete),
+        "lastOutTime": (day + ' ' + attendance[1]).where(complete),
+    })
+    first_in = pandas.to_datetime(raw['firstInTime'], format=TIME_FORMAT, errors='coerce')
+    last_out = pandas.to_datetime(raw['lastOutTime'], format=TIME_FORMAT, errors='coerce')
+    next_day = last_out <= first_in
+    raw.loc[next_day, 'lastOutTime'] = (last_out[next_day] + pandas.Timedelta(days=1)).dt.strftime(TIME_FORMAT)
+    # Incomplete days still count as present; a placeholder first-in time keeps their date
+    incomplete = report_df['Actual attendance'] == "Incomplete Data"
+    raw.loc[incomplete, 'firstInTime'] = day[incomplete] + ' 00:00:00'
+    return compute_metrics(raw, schedule, by_shift=False)
+
+
+def read_report(path):
+    """Reads a report written by report_attendance.py in any of its formats."""
+    extension = os.path.splitext(path)[1].lower()
+    # Markers like "N/A" are report values, not missing data
+    if extension == '.csv':
+        return pandas.read_csv(path, encoding='utf-8-sig', keep_default_na=False)
+    if extension == '.parquet':
+        return pandas.read_parquet(path)
+    return pandas.read_excel(path, sheet_name='Report', keep_default_na=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Builds the department and organization summaries of a report.")
+    parser.add_argument("report", help="Report file written by report_attendance.py (xlsx, csv or parquet)")
+    parser.add_argument("--output", help="Summary workbook to write (default: <report>_summary.xlsx)")
+    parser.add_argument("--end", help="Last day of the report window (YYYY-MM-DD, default: today)")
+    parser.add_argument("--start", help="First day of the report window (default: NUMBER_OF_DAYS before --end)")
+    args = parser.parse_args(argv)
+
+    output = args.output or f"{os.path.splitext(args.report)[0]}_summary.xlsx"
+    departments, organization = department_summary(
+        compact_metrics(metrics_from_report(read_report(args.report))), args.start, args.end
+    )
+    with pandas.ExcelWriter(output) as writer:
+        departments.to_excel(writer, sheet_name="Department summary", index=False)
+        organization.to_excel(writer, sheet_name="Organization summary", index=False)
+    print(f"Summary of {len(departments)} departments saved as {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import pandas
+
+from metrics import compute_metrics, format_report
+from schedule import Schedule
+from summary import metrics_from_report
+
+NIGHT_SCHEDULE = Schedule.from_dict({
+    "default_shift": "day",
+    "shifts": {
+        "day": {"start": "09:00", "end": "18:00", "minutes": 480},
+        "night": {"start": "20:00", "end": "08:00", "minutes": 660},
+    },
+    "employees": {"392": "night"},
+})
+
+
+def night_shift_rows():
+    """Calendar-day first-in/last-out rows of a night worker, as the device server returns them."""
+    def row(first_in, last_out, count):
+        return {"ID": "392", "FIO": "Night Worker", "Department": "Security",
+                "firstInTime": first_in, "lastOutTime": last_out, "Transaction count": count}
+
+    return pandas.DataFrame([
+        row("2025-08-04 20:45:00", None, "N/A"),
+        row("2025-08-05 08:10:00", "2025-08-05 20:05:00", 2),
+        row("2025-08-06 07:50:00", "2025-08-06 19:58:00", 2),
+        row("2025-08-07 08:02:00", None, "N/A"),
+    ])
+
+
+def test_night_shift_report_round_trips_through_the_summary():
+    metrics = compute_metrics(night_shift_rows(), NIGHT_SCHEDULE)
+    report = format_report(metrics)
+    again = metrics_from_report(report, NIGHT_SCHEDULE)
+
+    assert list(metrics['status']) == ['complete'] * 3
+    assert list(again['status']) == list(metrics['status'])
+    assert list(again['date']) == list(metrics['date'])
+    assert list(again['late']) == list(metrics['late'])
+    assert list(again['actual']) == list(metrics['actual'])
+    assert (again['actual'] > pandas.Timedelta(0)).all()
+
+
+def test_night_shift_report_without_the_schedule_has_no_negative_durations():
+    report = format_report(compute_metrics(night_shift_rows(), NIGHT_SCHEDULE))
+    again = metrics_from_report(report, Schedule.from_dict({"shifts": {"default": {"start": "09:00", "end": "18:00"}}}))
+
+    assert len(again) == len(report)
+    assert (again['actual'] > pandas.Timedelta(0)).all()
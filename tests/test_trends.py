@@ -0,0 +1,59 @@
+import pandas
+
+from schedule import Schedule
+from transaction_store import TransactionStore
+from trends import AggregateStore, update_aggregates
+
+NIGHT_SCHEDULE = Schedule.from_dict({
+    "default_shift": "day",
+    "shifts": {
+        "day": {"start": "09:00", "end": "18:00", "minutes": 480},
+        "night": {"start": "20:00", "end": "08:00", "minutes": 660},
+    },
+    "employees": {"392": "night"},
+})
+
+PEOPLE = [{"pin": "100", "deptName": "Office"}, {"pin": "392", "deptName": "Security"}]
+
+
+def add_punches(store, pin, *event_times):
+    store.add_transactions(pin, [{"eventTime": event_time, "devName": "Turnstile"} for event_time in event_times])
+
+
+def tables(aggregates):
+    return (
+        pandas.read_sql("SELECT * FROM daily ORDER BY pin, day", aggregates.conn),
+        pandas.read_sql("SELECT * FROM rollup ORDER BY grain, period, pin, department", aggregates.conn),
+    )
+
+
+def test_punches_that_reach_the_store_late_are_aggregated(tmp_path):
+    with TransactionStore(str(tmp_path / "transactions.db")) as store:
+        add_punches(store, "100", "2025-08-04 09:05:00", "2025-08-04 18:10:00",
+                    "2025-08-06 08:55:00", "2025-08-06 18:00:00", "2025-08-07 09:00:00")
+        add_punches(store, "392", "2025-08-04 20:45:00", "2025-08-05 20:05:00", "2025-08-06 07:58:00")
+
+        with AggregateStore(str(tmp_path / "incremental.db")) as incremental:
+            update_aggregates(incremental, store, PEOPLE, days=4, today=pandas.Timestamp("2025-08-07").date(),
+                              schedule=NIGHT_SCHEDULE)
+
+            # A retried sync brings in an older day, the OUT of a night shift and the days since
+            add_punches(store, "100", "2025-08-05 09:20:00", "2025-08-05 18:05:00", "2025-08-07 18:00:00",
+                        "2025-08-08 09:01:00", "2025-08-08 18:02:00")
+            add_punches(store, "392", "2025-08-05 08:10:00", "2025-08-08 20:00:00")
+            since, until, late = update_aggregates(incremental, store, PEOPLE, days=4,
+                                                   today=pandas.Timestamp("2025-08-09").date(),
+                                                   schedule=NIGHT_SCHEDULE)
+            daily, rollup = tables(incremental)
+
+        with AggregateStore(str(tmp_path / "rebuilt.db")) as rebuilt:
+            update_aggregates(rebuilt, store, PEOPLE, days=6, today=pandas.Timestamp("2025-08-09").date(),
+                              schedule=NIGHT_SCHEDULE)
+            expected_daily, expected_rollup = tables(rebuilt)
+
+    assert (since, until) == ("2025-08-08", "2025-08-09")
+    assert late == {"100": "2025-08-04", "392": "2025-08-04"}
+    office_day = daily[(daily["pin"] == "100") & (daily["day"] == "2025-08-05")].iloc[0]
+    assert office_day["present"] == 1 and office_day["absent"] == 0
+    pandas.testing.assert_frame_equal(daily, expected_daily)
+    pandas.testing.assert_frame_equal(rollup, expected_rollup)
@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import sqlite3
+from datetime import date, timedelta
+
+import requests
+
+from configs import NUMBER_OF_DAYS, TRANSACTION_STORE_FILE
+from fetch_engine import AsyncFetcher
+from roster import load_roster
+from transactions import fetch_transactions_range_async, group_transactions_by_day
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    pin TEXT NOT NULL,
+    event_time TEXT NOT NULL,
+    dev_name TEXT,
+    PRIMARY KEY (pin, event_time)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    pin TEXT PRIMARY KEY,
+    high_water TEXT NOT NULL
+);
+"""
+
+
+class TransactionStore:
+    """Local SQLite copy of the device server's transactions, keyed by (pin, eventTime)."""
+
+    def __init__(self, path=TRANSACTION_STORE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def high_water_mark(self, pin_id):
+        """Returns the newest eventTime already stored for the PIN, or None."""
+        row = self.conn.execute("SELECT high_water FROM sync_state WHERE pin = ?", (str(pin_id),)).fetchone()
+        return row[0] if row else None
+
+    def add_transactions(self, pin_id, transactions):
+        """Stores the transactions (duplicates are ignored) and advances the PIN's high-water mark."""
+        pin = str(pin_id)
+        rows = [(pin, t['eventTime'], t.get('devName', '')) for t in transactions if t.get('eventTime')]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO transactions (pin, event_time, dev_name) VALUES (?, ?, ?)", rows
+            )
+            if rows:
+                newest = max(row[1] for row in rows)
+                self.conn.execute(
+                    "INSERT INTO sync_state (pin, high_water) VALUES (?, ?) "
+                    "ON CONFLICT(pin) DO UPDATE SET high_water = max(high_water, excluded.high_water)",
+                    (pin, newest),
+                )
+        return len(rows)
+
+    def changes_since(self, rowid=0):
+        """Returns ({pin: oldest eventTime stored after `rowid`}, the newest rowid).
+
+        Rows are only ever added, so the rowid tells which transactions came in since a
+        reader last looked, whatever days they belong to.
+        """
+        newest = self.conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM transactions").fetchone()[0]
+        changed = dict(self.conn.execute(
+            "SELECT pin, MIN(event_time) FROM transactions WHERE rowid > ? GROUP BY pin", (rowid,)
+        ))
+        return changed, newest
+
+    def pins(self):
+        """Returns every PIN that has stored transactions."""
+        return [row[0] for row in self.conn.execute("SELECT pin FROM sync_state ORDER BY pin")]
+
+    def get_transactions(self, pin_id, start_date_str=None, end_date_str=None):
+        """Returns the PIN's stored transactions as API-shaped dicts, oldest first."""
+        query = "SELECT event_time, dev_name FROM transactions WHERE pin = ?"
+        params = [str(pin_id)]
+        if start_date_str:
+            query += " AND event_time >= ?"
+            params.append(start_date_str)
+        if end_date_str:
+            query += " AND event_time < ?"
+            params.append((date.fromisoformat(end_date_str) + timedelta(days=1)).isoformat())
+        query += " ORDER BY event_time"
+        return [
+            {'pin': str(pin_id), 'eventTime': event_time, 'devName': dev_name}
+            for event_time, dev_name in self.conn.execute(query, params)
+        ]
+
+    def day_summaries(self, pin_id, start_date_str=None, end_date_str=None):
+        """Per-day figures for the PIN, computed from the store (see transactions.summarize_day)."""
+        return group_transactions_by_day(self.get_transactions(pin_id, start_date_str, end_date_str))
+
+
+async def _sync_pin(fetcher, store, pin_id, default_start, end_date_str):
+    high_water = store.high_water_mark(pin_id)
+    # Re-read the high-water day itself: punches made later that day were not there yet
+    start_date_str = high_water.split(' ')[0] if high_water else default_start
+    try:
+        transactions = await fetch_transactions_range_async(fetcher, pin_id, start_date_str, end_date_str)
+    except requests.RequestException as e:
+        print(f"Could not sync transactions for PIN #{pin_id}: {e}")
+        return 0
+    return store.add_transactions(pin_id, transactions)
+
+
+async def sync(store, pins, days=NUMBER_OF_DAYS):
+    """Pulls only the transactions newer than each PIN's high-water mark into the store."""
+    today = date.today()
+    default_start = (today - timedelta(days=days - 1)).isoformat()
+    async with AsyncFetcher() as fetcher:
+        counts = await asyncio.gather(*(
+            _sync_pin(fetcher, store, pin_id, default_start, today.isoformat()) for pin_id in pins
+        ))
+    return sum(counts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintains the local transaction store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sync_parser = subparsers.add_parser("sync", help="Pull new transactions from the device server")
+    sync_parser.add_argument("--days", type=int, default=NUMBER_OF_DAYS, help="History to fetch for PINs never synced before")
+    sync_parser.add_argument("--dept", action="append", dest="dept_codes", help="Only sync this department code (repeatable)")
+    sync_parser.add_argument("--pin", action="append", dest="pins", help="Only sync this PIN (repeatable)")
+    args = parser.parse_args(argv)
+
+    pins = args.pins or [person['pin'] for person in load_roster(args.dept_codes)]
+    with TransactionStore() as store:
+        fetched = asyncio.run(sync(store, pins, days=args.days))
+    print(f"Synced {len(pins)} employees, {fetched} transactions fetched.")
+
+
+if __name__ == "__main__":
+    main()
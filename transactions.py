@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+import http_client
+from configs import BASE_URL, ACCESS_TOKEN, TRANSACTION_PAGE_SIZE
+from instrumentation import PROFILE
+
+ENTRY_MARKERS = ("Турникет-Вход", "Enter tur")
+EXIT_MARKERS = ("Турникет-Выход", "Exit tur")
+
+
+def transaction_direction(device_name):
+    """Returns 'in' or 'out' for turnstile devices, None for any other device."""
+    device_name = device_name or ''
+    if any(marker in device_name for marker in ENTRY_MARKERS):
+        return 'in'
+    if any(marker in device_name for marker in EXIT_MARKERS):
+        return 'out'
+    return None
+
+
+def transaction_page_url(pin_id, start_date_str, end_date_str, page_no, page_size=TRANSACTION_PAGE_SIZE):
+    # The server treats endDate as the start of the last day, so ask for one day more
+    # and let group_transactions_by_day() drop anything outside the window.
+    end_exclusive = datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1)
+    return (
+        f"{BASE_URL}/api/v2/transaction/person/{pin_id}?"
+        f"startDate={start_date_str}&endDate={end_exclusive.strftime('%Y-%m-%d')}"
+        f"&pageNo={page_no}&pageSize={page_size}&access_token={ACCESS_TOKEN}"
+    )
+
+
+def first_last_url(pin_id, page_size):
+    return (
+        f"{BASE_URL}/api/v2/transaction/firstInAndLastOut/{pin_id}?"
+        f"pageNo=1&pageSize={page_size}&access_token={ACCESS_TOKEN}"
+    )
+
+
+def fetch_first_in_last_out(pin_id, page_size=1):
+    """Returns the PIN's newest `page_size` first-in/last-out records (one per day with punches), newest first."""
+    response = http_client.get(first_last_url(pin_id, page_size))
+    response.raise_for_status()
+    with PROFILE.stage('parse'):
+        return (response.json().get('data') or {}).get('data') or []
+
+
+def _read_page(payload):
+    """Returns (transactions, total) from a transaction page response body."""
+    page = payload.get('data') or {}
+    if not isinstance(page, dict):
+        return [], 0
+    return page.get('data') or [], page.get('total', 0)
+
+
+def fetch_transactions_range(pin_id, start_date_str, end_date_str):
+    """Fetches every transaction of the PIN in the window, walking pageNo until total is reached."""
+    transactions = []
+    page_no = 1
+    while True:
+        response = http_client.get(transaction_page_url(pin_id, start_date_str, end_date_str, page_no))
+        response.raise_for_status()
+        with PROFILE.stage('parse'):
+            page, total = _read_page(response.json())
+        transactions.extend(page)
+        if not page or len(transactions) >= total:
+            return transactions
+        page_no += 1
+
+
+async def fetch_transactions_range_async(fetcher, pin_id, start_date_str, end_date_str):
+    """Same as fetch_transactions_range() but through an AsyncFetcher."""
+    transactions = []
+    page_no = 1
+    while True:
+        response = await fetcher.get(transaction_page_url(pin_id, start_date_str, end_date_str, page_no))
+        response.raise_for_status()
+        with PROFILE.stage('parse'):
+            page, total = _read_page(response.json())
+        transactions.extend(page)
+        if not page or len(transactions) >= total:
+            return transactions
+        page_no += 1
+
+
+def summarize_day(day_transactions, total=None):
+    """Derives the daily figures the reports need from one day's transactions."""
+    event_times = [t['eventTime'] for t in day_transactions]
+    entry_in_count = 0
+    entry_out_count = 0
+    for trans in day_transactions:
+        direction = transaction_direction(trans.get('devName'))
+        if direction == 'in':
+            entry_in_count += 1
+        elif direction == 'out':
+            entry_out_count += 1
+    return {
+        "total": len(day_transactions) if total is None else total,
+        "first_in": min(event_times) if event_times else None,
+        "last_out": max(event_times) if event_times else None,
+        "entry_in": entry_in_count,
+        "entry_out": entry_out_count,
+    }
+
+
+def group_transactions_by_day(transactions, start_date_str=None, end_date_str=None):
+    """Groups a range result set by eventTime date and returns {date_str: summarize_day(...)}."""
+    by_day = {}
+    for trans in transactions:
+        date_str = trans['eventTime'].split(' ')[0]
+        if start_date_str and date_str < start_date_str:
+            continue
+        if end_date_str and date_str > end_date_str:
+            continue
+        by_day.setdefault(date_str, []).append(trans)
+    return {date_str: summarize_day(day) for date_str, day in sorted(by_day.items())}
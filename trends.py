@@ -0,0 +1,427 @@
+"""Materialized attendance aggregates per employee and day, week and month, for trend charts.
+
+    python trends.py update
+    python trends.py export --grain month --by department --measure lateness --output trends.xlsx
+
+`update` computes the daily figures only for the days since the last update, from the
+punches in the local transaction store (see transaction_store.py sync), plus the older
+days of the employees whose punches reached the store late, and refreshes the week and
+month rollups of those days from the daily table. `export` reads the rollups, so a
+year of the whole organization is a small GROUP BY.
+"""
+import argparse
+import os
+import sqlite3
+from datetime import date, timedelta
+
+import numpy
+import pandas
+import requests
+
+from configs import AGGREGATES_FILE, TREND_HISTORY_DAYS
+from metrics import TIME_FORMAT, compute_metrics
+from punches import PunchBatch
+from roster import load_roster
+from schedule import load_schedule
+from transaction_store import TransactionStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily (
+    pin TEXT NOT NULL,
+    day TEXT NOT NULL,
+    department TEXT NOT NULL,
+    planned_minutes INTEGER NOT NULL,
+    present INTEGER NOT NULL,
+    complete INTEGER NOT NULL,
+    absent INTEGER NOT NULL,
+    late INTEGER NOT NULL,
+    late_min REAL NOT NULL,
+    overwork_min REAL NOT NULL,
+    worked_min REAL NOT NULL,
+    PRIMARY KEY (pin, day)
+);
+CREATE TABLE IF NOT EXISTS rollup (
+    grain TEXT NOT NULL,
+    period TEXT NOT NULL,
+    pin TEXT NOT NULL,
+    department TEXT NOT NULL,
+    planned_days INTEGER NOT NULL,
+    present_days INTEGER NOT NULL,
+    complete_days INTEGER NOT NULL,
+    absent_days INTEGER NOT NULL,
+    late_days INTEGER NOT NULL,
+    late_min REAL NOT NULL,
+    overwork_min REAL NOT NULL,
+    worked_min REAL NOT NULL,
+    PRIMARY KEY (grain, period, pin, department)
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+DAILY_COLUMNS = [
+    "pin", "day", "department", "planned_minutes", "present", "complete", "absent", "late",
+    "late_min", "overwork_min", "worked_min",
+]
+
+# Period (its first day) of a 'YYYY-MM-DD' day in SQL, per rollup grain
+ROLLUP_PERIODS = {
+    "week": "date(day, 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m-01', day)",
+}
+
+# The daily table in the shape of the rollup, so days can be queried like weeks and months
+DAY_ROWS = """
+SELECT 'day' AS grain, day AS period, pin, department, planned_minutes > 0 AS planned_days,
+       present AS present_days, complete AS complete_days, absent AS absent_days, late AS late_days,
+       late_min, overwork_min, worked_min
+FROM daily
+"""
+
+GROUPS = {
+    "organization": "'Organization'",
+    "department": "department",
+    "employee": "pin",
+}
+
+TREND_COLUMNS = [
+    "Group", "Period", "Employees", "Planned days", "Days present", "Absence days", "Absence rate (%)",
+    "Late days", "Total lateness (min)", "Average lateness (min)", "Total overwork (min)", "Worked hours",
+]
+
+# --measure choices: the trend column drawn in the chart
+MEASURES = {
+    "lateness": "Average lateness (min)",
+    "late-days": "Late days",
+    "absence": "Absence rate (%)",
+    "overwork": "Total overwork (min)",
+    "worked": "Worked hours",
+}
+
+
+def period_start(day, grain):
+    """The first day ('YYYY-MM-DD') of the week or month the day belongs to."""
+    day = date.fromisoformat(day)
+    if grain == "week":
+        return (day - timedelta(days=day.weekday())).isoformat()
+    return day.replace(day=1).isoformat()
+
+
+def _present_days(days, departments, schedule):
+    present = pandas.DataFrame(columns=['pin', 'day', 'present', 'complete', 'late', 'late_min', 'overwork_min',
+                                        'worked_min'])
+    if days.empty:
+        return present
+    raw = pandas.DataFrame({
+        'ID': days['pin'].astype(str),
+        'firstInTime': days['first'].dt.strftime(TIME_FORMAT),
+        'lastOutTime': days['last'].dt.strftime(TIME_FORMAT).where(days['count'] > 1),
+    })
+    raw['Department'] = raw['ID'].map(departments).fillna('N/A')
+    metrics = compute_metrics(raw, schedule)
+    complete = metrics['status'] == 'complete'
+
+    def minutes(column):
+        return (metrics[column].dt.total_seconds() / 60).where(complete, 0).fillna(0)
+
+    return pandas.DataFrame({
+        'pin': metrics['ID'].astype(str),
+        'day': metrics['date'].dt.strftime('%Y-%m-%d'),
+        'present': 1,
+        'complete': complete.astype(int),
+        'late': (complete & (metrics['late'] > pandas.Timedelta(0))).astype(int),
+        'late_min': minutes('late'),
+        'overwork_min': minutes('overwork'),
+        'worked_min': minutes('actual'),
+    })
+
+
+def daily_aggregates(punches, people, start, end, schedule=None):
+    """Computes the daily table rows of every employee from start through end ('YYYY-MM-DD').
+
+    `people` are roster entries; employees with punches but not in the roster get the
+    department 'N/A'. A planned workday without any punch counts as absent. Lateness,
+    overwork and worked minutes only count for complete days, like in the report.
+    """
+    schedule = schedule or load_schedule()
+    departments = {str(person['pin']): person.get('deptName', 'N/A') for person in people}
+
+    # 1. The days with punches, through the same metrics as the report
+    present = _present_days(punches.between(start, end).daily(), departments, schedule)
+
+    # 2. Every employee and day of the window, with the planned minutes from the schedule
+    pins = sorted(set(departments) | set(present['pin']))
+    dates = pandas.date_range(start, end)
+    grid = pandas.DataFrame({
+        'pin': numpy.repeat(pins, len(dates)),
+        'date': numpy.tile(dates.to_numpy(), len(pins)),
+    })
+    grid['department'] = grid['pin'].map(departments).fillna('N/A')
+    grid['planned_minutes'] = schedule.plan(grid['pin'], grid['department'], grid['date'])['planned_minutes'] \
+        .fillna(0).astype('int64').to_numpy()
+    grid['day'] = grid['date'].dt.strftime('%Y-%m-%d')
+
+    table = grid.merge(present, on=['pin', 'day'], how='left')
+    for column in ['present', 'complete', 'late']:
+        table[column] = table[column].fillna(0).astype(int)
+    for column in ['late_min', 'overwork_min', 'worked_min']:
+        table[column] = table[column].fillna(0.0)
+    table['absent'] = ((table['planned_minutes'] > 0) & (table['present'] == 0)).astype(int)
+    return table[DAILY_COLUMNS]
+
+
+class AggregateStore:
+    """The materialized daily table and its week and month rollups, in SQLite."""
+
+    def __init__(self, path=AGGREGATES_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _state(self, key):
+        row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def through(self):
+        """The last day aggregated ('YYYY-MM-DD'), or None before the first update."""
+        return self._state('through')
+
+    def store_rowid(self):
+        """The newest transaction store row already aggregated (see TransactionStore.changes_since)."""
+        return int(self._state('store_rowid') or 0)
+
+    def first_day(self):
+        """The oldest day in the daily table, or None when it is empty."""
+        return self.conn.execute("SELECT MIN(day) FROM daily").fetchone()[0]
+
+    def mark(self, through, store_rowid):
+        """Records the last day aggregated and the newest transaction store row seen."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                [('through', through), ('store_rowid', str(store_rowid))],
+            )
+
+    def replace_days(self, table, since, until, pins=None):
+        """Replaces the daily rows from `since` through `until`, of only `pins` when given, and
+        refreshes their rollups of the periods those days touch."""
+        pin_filter, pin_params = "", []
+        if pins is not None:
+            pin_params = [str(pin) for pin in pins]
+            pin_filter = f" AND pin IN ({', '.join('?' * len(pin_params))})"
+        with self.conn:
+            self.conn.execute(f"DELETE FROM daily WHERE day >= ? AND day <= ?{pin_filter}", [since, until] + pin_params)
+            self.conn.executemany(
+                f"INSERT INTO daily ({', '.join(DAILY_COLUMNS)}) VALUES ({', '.join('?' * len(DAILY_COLUMNS))})",
+                table.itertuples(index=False, name=None),
+            )
+            for grain, period in ROLLUP_PERIODS.items():
+                first, last = period_start(since, grain), period_start(until, grain)
+                self.conn.execute(f"DELETE FROM rollup WHERE grain = ? AND period >= ? AND period <= ?{pin_filter}",
+                                  [grain, first, last] + pin_params)
+                self.conn.execute(f"""
+                    INSERT INTO rollup
+                    SELECT ?, {period} AS period, pin, department, SUM(planned_minutes > 0), SUM(present),
+                           SUM(complete), SUM(absent), SUM(late), SUM(late_min), SUM(overwork_min), SUM(worked_min)
+                    FROM daily WHERE day >= ? AND {period} <= ?{pin_filter}
+                    GROUP BY period, pin, department
+                """, [grain, first, last] + pin_params)
+
+    def trend(self, grain="month", by="department", start=None, end=None, dept_names=None, pins=None):
+        """Returns the trend table (TREND_COLUMNS), one row per group and period."""
+        source = DAY_ROWS if grain == "day" else "SELECT * FROM rollup WHERE grain = ?"
+        params = [] if grain == "day" else [grain]
+        conditions, filters = [], []
+        if start:
+            conditions.append("period >= ?")
+            filters.append(period_start(start, grain) if grain != "day" else start)
+        if end:
+            conditions.append("period <= ?")
+            filters.append(end)
+        if dept_names:
+            conditions.append(f"department IN ({', '.join('?' * len(dept_names))})")
+            filters.extend(dept_names)
+        if pins:
+            conditions.append(f"pin IN ({', '.join('?' * len(pins))})")
+            filters.extend(str(pin) for pin in pins)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.conn.execute(f"""
+            SELECT {GROUPS[by]} AS grp, period, COUNT(DISTINCT pin), SUM(planned_days), SUM(present_days),
+                   SUM(absent_days), SUM(complete_days), SUM(late_days), SUM(late_min), SUM(overwork_min),
+                   SUM(worked_min)
+            FROM ({source}) {where}
+            GROUP BY grp, period ORDER BY grp, period
+        """, params + filters).fetchall()
+        df = pandas.DataFrame(rows, columns=[
+            "Group", "Period", "Employees", "Planned days", "Days present", "Absence days", "complete_days",
+            "Late days", "Total lateness (min)", "Total overwork (min)", "worked_min",
+        ])
+        df["Group"] = df["Group"].astype(str)
+        df["Absence rate (%)"] = (100 * df["Absence days"] / df["Planned days"].replace(0, numpy.nan)).round(1)
+        df["Average lateness (min)"] = (df["Total lateness (min)"] / df["complete_days"].replace(0, numpy.nan)).round(1)
+        df["Total lateness (min)"] = df["Total lateness (min)"].round().astype('int64')
+        df["Total overwork (min)"] = df["Total overwork (min)"].round().astype('int64')
+        df["Worked hours"] = (df["worked_min"] / 60).round(1)
+        return df[TREND_COLUMNS]
+
+
+def _aggregate(aggregates, store, people, pins, since, until, schedule):
+    punches = PunchBatch.concat([
+        PunchBatch.from_transactions(store.get_transactions(pin, since, until), pin=pin) for pin in pins
+    ])
+    aggregates.replace_days(daily_aggregates(punches, people, since, until, schedule), since, until)
+
+
+def update_aggregates(aggregates, store, people, days=TREND_HISTORY_DAYS, today=None, schedule=None):
+    """Aggregates the days since the last update for everybody, and the older days again for
+    the employees with punches that reached the store since then.
+
+    Such an employee is aggregated again from the day before their oldest new punch on
+    (a new OUT may end a night shift that began that day). The first update covers
+    `days` days. Returns (since, until, {pin: first day aggregated again}).
+    """
+    until = (today or date.today()).isoformat()
+    through = aggregates.through()
+    changed, newest = store.changes_since(aggregates.store_rowid())
+    if through is None or newest < aggregates.store_rowid():
+        # The first update, or a different or rebuilt store: aggregate the whole history
+        since = (date.fromisoformat(until) - timedelta(days=days - 1)).isoformat()
+        changed, through = {}, None
+    else:
+        since = (date.fromisoformat(through) + timedelta(days=1)).isoformat()
+
+    # Older days of the employees with late punches; the new days are aggregated for everybody below
+    first_day = aggregates.first_day() or since
+    late = {}
+    for pin, event_time in changed.items():
+        day = (date.fromisoformat(event_time.split(' ')[0]) - timedelta(days=1)).isoformat()
+        if pin.isdigit() and day <= through:
+            late[pin] = max(day, first_day)
+    if late:
+        late_since = min(late.values())
+        late_people = [person for person in people if str(person['pin']) in late]
+        _aggregate(aggregates, store, late_people, sorted(late), late_since, through, schedule)
+
+    if since <= until:
+        _aggregate(aggregates, store, people, [pin for pin in store.pins() if pin.isdigit()], since, until, schedule)
+    aggregates.mark(max(until, through or until), newest)
+    return since, until, late
+
+
+def trend_chart_frame(trend, measure):
+    """The measure as a Period x Group table, ready to be drawn as one line per group."""
+    return trend.pivot(index="Period", columns="Group", values=MEASURES[measure]).sort_index()
+
+
+def write_xlsx(trend, chart, measure, path):
+    """Writes the trend table and a sheet with the chart data and a native Excel line chart."""
+    from openpyxl import Workbook
+    from openpyxl.chart import LineChart, Reference
+
+    workbook = Workbook()
+    table_sheet = workbook.active
+    table_sheet.title = "Trends"
+    table_sheet.append(TREND_COLUMNS)
+    for row in trend.itertuples(index=False, name=None):
+        table_sheet.append([None if pandas.isna(value) else value for value in row])
+
+    chart_sheet = workbook.create_sheet("Chart")
+    chart_sheet.append(["Period"] + list(chart.columns))
+    for period, values in chart.iterrows():
+        chart_sheet.append([period] + [None if pandas.isna(value) else value for value in values])
+    line_chart = LineChart()
+    line_chart.title = MEASURES[measure]
+    line_chart.y_axis.title = MEASURES[measure]
+    line_chart.x_axis.title = "Period"
+    line_chart.width, line_chart.height = 24, 12
+    rows = len(chart) + 1
+    line_chart.add_data(Reference(chart_sheet, min_col=2, max_col=len(chart.columns) + 1, min_row=1, max_row=rows),
+                        titles_from_data=True)
+    line_chart.set_categories(Reference(chart_sheet, min_col=1, min_row=2, max_row=rows))
+    chart_sheet.add_chart(line_chart, f"{chr(ord('A') + min(len(chart.columns) + 2, 25))}2")
+    workbook.save(path)
+
+
+def write_png(chart, measure, path):
+    """Draws the trend lines as a PNG image. Needs matplotlib."""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib import pyplot
+    except ImportError as e:
+        raise RuntimeError("PNG charts need matplotlib: pip install matplotlib") from e
+    figure, axes = pyplot.subplots(figsize=(12, 6))
+    chart.plot(ax=axes, marker='o')
+    axes.set_ylabel(MEASURES[measure])
+    axes.set_xlabel("Period")
+    axes.grid(True, alpha=0.3)
+    figure.tight_layout()
+    figure.savefig(path)
+    pyplot.close(figure)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintains the attendance aggregates and exports trends from them.")
+    parser.add_argument("--aggregates", default=AGGREGATES_FILE, help="Aggregates database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    update_parser = subparsers.add_parser("update", help="Aggregate the days synced since the last update")
+    update_parser.add_argument("--days", type=int, default=TREND_HISTORY_DAYS,
+                               help="History to aggregate on the first update")
+    export_parser = subparsers.add_parser("export", help="Export a trend table and chart from the aggregates")
+    export_parser.add_argument("--grain", choices=["day", "week", "month"], default="month")
+    export_parser.add_argument("--by", choices=list(GROUPS), default="department", help="One line per ...")
+    export_parser.add_argument("--measure", choices=list(MEASURES), default="lateness", help="What the chart shows")
+    export_parser.add_argument("--from", dest="start", help="First day (YYYY-MM-DD)")
+    export_parser.add_argument("--to", dest="end", help="Last day (YYYY-MM-DD)")
+    export_parser.add_argument("--department", action="append", dest="dept_names",
+                               help="Only this department name (repeatable)")
+    export_parser.add_argument("--pin", action="append", dest="pins", help="Only this PIN (repeatable)")
+    export_parser.add_argument("--output", default="trends.xlsx", help="xlsx (table and chart) or csv (table)")
+    export_parser.add_argument("--png", help="Also draw the chart as a PNG image (needs matplotlib)")
+    args = parser.parse_args(argv)
+
+    with AggregateStore(args.aggregates) as aggregates:
+        if args.command == "update":
+            try:
+                people = load_roster()
+            except (requests.RequestException, ValueError) as e:
+                print(f"Could not load the roster: {e}. Only employees with punches are aggregated.")
+                people = []
+            with TransactionStore() as store:
+                since, until, late = update_aggregates(aggregates, store, people, args.days)
+            if since <= until:
+                print(f"Aggregated {since} through {until}.")
+            if late:
+                print(f"Aggregated {len(late)} employee(s) with late punches again from {min(late.values())} on.")
+            if since > until and not late:
+                print("The aggregates are up to date.")
+            return
+
+        trend = aggregates.trend(args.grain, args.by, args.start, args.end, args.dept_names, args.pins)
+    if trend.empty:
+        print("No aggregates for this selection. Run 'trends.py update' first.")
+        return
+    chart = trend_chart_frame(trend, args.measure)
+    if os.path.splitext(args.output)[1].lower() == '.csv':
+        trend.to_csv(args.output, index=False)
+    else:
+        write_xlsx(trend, chart, args.measure, args.output)
+    print(f"Trend of {trend['Group'].nunique()} group(s) over {len(chart)} period(s) saved as {args.output}")
+    if args.png:
+        write_png(chart, args.measure, args.png)
+        print(f"Chart saved as {args.png}")
+
+
+if __name__ == "__main__":
+    main()